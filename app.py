@@ -1,16 +1,40 @@
+from __future__ import annotations
+
 import os
-import pandas as pd
-import numpy as np
-from flask import Flask, request, render_template, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, request, render_template, jsonify, send_file, flash, redirect, url_for, Response, stream_with_context, session
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
+from lazy_imports import lazy_module, import_modules
 from automl_engine import DataCleaner
+from dataset_cache import DatasetCache, deduplicate_upload, profile_dataframe, release_upload
+from ingest import ResumableUploads, UploadConflict, ingest_file, ingest_shards
+from artifact_store import ArtifactStore
+from session_store import create_session_store
+from job_queue import JobQueue
+from instrumentation import StageProfiler, metrics
+from result_cache import ResultCache
+from janitor import Janitor, release_session_files
+from preview import open_preview
+from preprocessing import run_preprocessing, preprocessing_job, cached_preprocessing, PreprocessingError
+from feature_selection import DEFAULT_CORRELATION_THRESHOLD, DEFAULT_VARIANCE_THRESHOLD
+from output_formats import (OUTPUT_FORMATS, available_formats, convert_output, iter_npy_bundle, iter_zip_bundle,
+                            iter_file_blocks, output_files, output_path, write_output_shards)
+from batch_transform import transform_file
 import json
+import re
+import copy
+import uuid
+import shutil
+import time
+import zipfile
 from datetime import datetime
 
+pd = lazy_module('pandas')
+np = lazy_module('numpy')
+
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 # Create Flask app
@@ -21,90 +45,358 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 PROCESSED_FOLDER = 'processed'
+CACHE_FOLDER = 'cache'
+ARTIFACT_FOLDER = 'artifacts'
+DATASET_CACHE_MB = int(os.environ.get('DATASET_CACHE_MB', 10240))  # profiles and binary copies, LRU evicted
+ARTIFACT_CACHE_SIZE = int(os.environ.get('ARTIFACT_CACHE_SIZE', 8))  # fitted cleaners kept in memory
+# Finished results of identical requests (same content, options and engine version)
+RESULT_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'results')
+RESULT_CACHE_MB = int(os.environ.get('RESULT_CACHE_MB', 2048))  # disk budget, least recently used evicted first
+RESULT_CACHE_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', 32))  # results kept in memory
+# One stored copy per distinct upload body; uploads of the same content are hard links to it
+UPLOAD_BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'blobs')
+# 'memory' for a single worker, 'sqlite:///<path>' to share sessions across worker processes
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite:///sessions.sqlite3')
+SESSION_TTL = int(os.environ.get('SESSION_TTL_HOURS', 24)) * 3600
+# Background preprocessing jobs; their status must be visible to every web worker
+JOB_STORE = os.environ.get('JOB_STORE', 'sqlite:///jobs.sqlite3')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR', 'process')  # 'process' or 'thread'
 ALLOWED_EXTENSIONS = {'csv'}
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+COMPRESSED_EXTENSIONS = {'gz', 'zst'}  # e.g. data.csv.gz, decompressed as it is received
+ARCHIVE_EXTENSIONS = {'zip'}  # zip of CSV shards, loaded as one dataset
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 1024))
+MAX_CONTENT_LENGTH = MAX_UPLOAD_MB * 1024 * 1024
+# Largest CSV accepted after decompression or assembly from chunks (chunked uploads may exceed MAX_UPLOAD_MB)
+MAX_DATASET_MB = int(os.environ.get('MAX_DATASET_MB', 10240))
+# Chunked, resumable uploads: state shared by all workers, bytes under uploads/partial
+UPLOAD_STORE = os.environ.get('UPLOAD_STORE', 'sqlite:///uploads.sqlite3')
+UPLOAD_PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, 'partial')
+UPLOAD_CHUNK_MB = int(os.environ.get('UPLOAD_CHUNK_MB', 8))  # chunk size suggested to clients
+STREAMING_THRESHOLD = int(os.environ.get('STREAMING_THRESHOLD_MB', 64)) * 1024 * 1024  # stream files above this size
+CSV_CHUNK_SIZE = int(os.environ.get('CSV_CHUNK_SIZE', 100000))  # rows per chunk in streaming mode
+# Workers per preprocessing run for column shards and datetime extraction (-1 = all cores)
+PREPROCESS_N_JOBS = int(os.environ.get('PREPROCESS_N_JOBS', 1))
+PREPROCESS_BACKEND = os.environ.get('PREPROCESS_BACKEND', 'loky')  # 'loky' (processes) or 'threading'
+# Workers parsing the CSV files of a multi-file dataset and writing sharded downloads (-1 = all cores)
+SHARD_N_JOBS = int(os.environ.get('SHARD_N_JOBS', -1))
+MAX_OUTPUT_SHARDS = int(os.environ.get('MAX_OUTPUT_SHARDS', 64))  # largest ?shards= on /download
+# Worker processes transforming /transform batches of at least TRANSFORM_PARALLEL_MB by byte range
+# (-1 = all cores, 1 = always stream them through the request thread)
+TRANSFORM_N_JOBS = int(os.environ.get('TRANSFORM_N_JOBS', -1))
+TRANSFORM_PARALLEL_MB = int(os.environ.get('TRANSFORM_PARALLEL_MB', 256))
+# Dtype of the processed features (and of float inputs as they are read); requests may override it
+OUTPUT_DTYPES = ('float32', 'float64')
+OUTPUT_DTYPE = os.environ.get('OUTPUT_DTYPE', 'float32')
+TRANSFORM_ROWS_LIMIT = int(os.environ.get('TRANSFORM_ROWS_LIMIT', 10000))  # records per /transform_rows request
+# Largest svd_components accepted on /preprocess
+MAX_SVD_COMPONENTS = int(os.environ.get('MAX_SVD_COMPONENTS', 1000))
+
+# Largest page of /preview, in rows and columns
+PREVIEW_MAX_ROWS = int(os.environ.get('PREVIEW_MAX_ROWS', 1000))
+PREVIEW_MAX_COLUMNS = int(os.environ.get('PREVIEW_MAX_COLUMNS', 200))
+
+# Disk lifecycle of uploads/, processed/, cache/ and artifacts/: files no live session (or cached result)
+# refers to are deleted after FILE_TTL_HOURS without access, or sooner, least recently used first, while
+# a folder is over its quota (DATASET_CACHE_MB for cache/)
+JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL_SECONDS', 600))  # 0 disables the background janitor
+JANITOR_GRACE = int(os.environ.get('JANITOR_GRACE_SECONDS', 600))  # files accessed this recently are kept
+FILE_TTL = int(os.environ.get('FILE_TTL_HOURS', SESSION_TTL // 3600)) * 3600
+UPLOAD_QUOTA_MB = int(os.environ.get('UPLOAD_QUOTA_MB', 20480))
+PROCESSED_QUOTA_MB = int(os.environ.get('PROCESSED_QUOTA_MB', 20480))
+ARTIFACT_QUOTA_MB = int(os.environ.get('ARTIFACT_QUOTA_MB', 5120))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
+app.config['CACHE_FOLDER'] = CACHE_FOLDER
+app.config['ARTIFACT_FOLDER'] = ARTIFACT_FOLDER
+app.config['DATASET_CACHE_BYTES'] = DATASET_CACHE_MB * 1024 * 1024
+app.config['RESULT_CACHE_FOLDER'] = RESULT_CACHE_FOLDER
+app.config['RESULT_CACHE_BYTES'] = RESULT_CACHE_MB * 1024 * 1024
+app.config['UPLOAD_BLOB_FOLDER'] = UPLOAD_BLOB_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+app.config['MAX_DATASET_BYTES'] = MAX_DATASET_MB * 1024 * 1024
+app.config['UPLOAD_CHUNK_BYTES'] = min(UPLOAD_CHUNK_MB, MAX_UPLOAD_MB) * 1024 * 1024
+app.config['STREAMING_THRESHOLD'] = STREAMING_THRESHOLD
+app.config['CSV_CHUNK_SIZE'] = CSV_CHUNK_SIZE
+app.config['PREPROCESS_N_JOBS'] = PREPROCESS_N_JOBS
+app.config['PREPROCESS_BACKEND'] = PREPROCESS_BACKEND
+app.config['SHARD_N_JOBS'] = SHARD_N_JOBS
+app.config['MAX_OUTPUT_SHARDS'] = MAX_OUTPUT_SHARDS
+app.config['TRANSFORM_N_JOBS'] = TRANSFORM_N_JOBS
+app.config['TRANSFORM_PARALLEL_BYTES'] = TRANSFORM_PARALLEL_MB * 1024 * 1024
+app.config['OUTPUT_DTYPE'] = OUTPUT_DTYPE
+app.config['TRANSFORM_ROWS_LIMIT'] = TRANSFORM_ROWS_LIMIT
+app.config['MAX_SVD_COMPONENTS'] = MAX_SVD_COMPONENTS
+app.config['PREVIEW_MAX_ROWS'] = PREVIEW_MAX_ROWS
+app.config['PREVIEW_MAX_COLUMNS'] = PREVIEW_MAX_COLUMNS
+app.config['JANITOR_INTERVAL'] = JANITOR_INTERVAL
+app.config['FILE_TTL'] = FILE_TTL
+app.config['UPLOAD_QUOTA_BYTES'] = UPLOAD_QUOTA_MB * 1024 * 1024
+app.config['PROCESSED_QUOTA_BYTES'] = PROCESSED_QUOTA_MB * 1024 * 1024
+app.config['ARTIFACT_QUOTA_BYTES'] = ARTIFACT_QUOTA_MB * 1024 * 1024
 
 # Create directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+os.makedirs(UPLOAD_BLOB_FOLDER, exist_ok=True)
+
+# Dataset profiles and binary copies, keyed by content hash
+dataset_cache = DatasetCache(CACHE_FOLDER, max_bytes=app.config['DATASET_CACHE_BYTES'])
+
+# Fitted cleaners, persisted so they survive /reset and restarts
+artifact_store = ArtifactStore(ARTIFACT_FOLDER, cache_size=ARTIFACT_CACHE_SIZE)
+
+# Preprocessing results, so repeating a request skips parsing and fitting
+result_cache = ResultCache(RESULT_CACHE_FOLDER, max_bytes=app.config['RESULT_CACHE_BYTES'],
+                           memory_entries=RESULT_CACHE_ENTRIES)
+
+# Per-session state (upload info, processed file, fitted artifact id) instead of process globals
+session_store = create_session_store(SESSION_STORE, ttl_seconds=SESSION_TTL)
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Uploads sent in chunks, resumable from the last received offset
+resumable_uploads = ResumableUploads(create_session_store(UPLOAD_STORE, ttl_seconds=SESSION_TTL),
+                                     UPLOAD_PARTIAL_FOLDER, max_bytes=app.config['MAX_DATASET_BYTES'])
+
+# Preprocessing runs in background workers; clients poll /jobs/<job_id>
+job_queue = JobQueue(create_session_store(JOB_STORE, ttl_seconds=SESSION_TTL), max_workers=JOB_WORKERS,
+                     use_processes=JOB_EXECUTOR == 'process')
+
+# Deletes expired and least recently used files in the background; started per worker on its first request
+janitor = Janitor(session_store, UPLOAD_FOLDER, PROCESSED_FOLDER, UPLOAD_BLOB_FOLDER, ttl_seconds=app.config['FILE_TTL'],
+                  upload_quota_bytes=app.config['UPLOAD_QUOTA_BYTES'],
+                  processed_quota_bytes=app.config['PROCESSED_QUOTA_BYTES'], grace_seconds=JANITOR_GRACE,
+                  interval=app.config['JANITOR_INTERVAL'], exclude=[UPLOAD_PARTIAL_FOLDER],
+                  expire_stores=[job_queue.store], resumable_uploads=resumable_uploads,
+                  dataset_cache=dataset_cache, artifact_store=artifact_store, result_cache=result_cache,
+                  cache_quota_bytes=app.config['DATASET_CACHE_BYTES'],
+                  artifact_quota_bytes=app.config['ARTIFACT_QUOTA_BYTES'])
+
+def preprocessing_settings():
+    """Settings a preprocessing job needs, passed explicitly since workers have no app context."""
+    return {
+        'processed_folder': app.config['PROCESSED_FOLDER'],
+        'cache_folder': app.config['CACHE_FOLDER'],
+        'dataset_cache_bytes': app.config['DATASET_CACHE_BYTES'],
+        'artifact_folder': app.config['ARTIFACT_FOLDER'],
+        'result_cache_folder': app.config['RESULT_CACHE_FOLDER'],
+        'result_cache_bytes': app.config['RESULT_CACHE_BYTES'],
+        'streaming_threshold': app.config['STREAMING_THRESHOLD'],
+        'csv_chunk_size': app.config['CSV_CHUNK_SIZE'],
+        'n_jobs': app.config['PREPROCESS_N_JOBS'],
+        'parallel_backend': app.config['PREPROCESS_BACKEND'],
+        'shard_n_jobs': app.config['SHARD_N_JOBS']
+    }
 
-# Global variable to store the data cleaner instance
-data_cleaner = None
-current_file_info = {}
+def warm_up():
+    """
+    Import the deferred dependencies and run the engine once on a tiny frame.
+
+    pandas, NumPy and scikit-learn are imported on first use, so the app
+    itself starts fast; calling this in a pre-fork server's master process
+    (see gunicorn.conf.py) moves that cost out of the first requests, and
+    forked workers share the imported modules. It starts no threads or
+    processes, so it is safe to call before forking.
+
+    Returns:
+        Seconds spent per imported module, plus 'engine' for the sample run
+    """
+    timings = import_modules()
+    start = time.perf_counter()
+    frame = pd.DataFrame({'number': [1.5, 2.5, None, 4.0], 'category': ['a', 'b', 'a', None],
+                          'date': ['2024-01-01', '2024-02-01', None, '2024-03-01']})
+    profile = profile_dataframe(frame)
+    cleaner = DataCleaner(n_jobs=1)
+    cleaner.fit_transform(frame, profile=profile)
+    cleaner.transform_records(frame.head(1).astype(object).where(frame.head(1).notna(), None).to_dict('records'))
+    timings['engine'] = round(time.perf_counter() - start, 6)
+    logger.info(f"Warm-up done in {sum(timings.values()):.2f}s")
+    return timings
 
 def allowed_file(filename):
-    """Check if file has allowed extension."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    """Check if file has allowed extension, optionally followed by a compression extension."""
+    parts = filename.lower().rsplit('.', 2)
+    if len(parts) == 3 and parts[2] in COMPRESSED_EXTENSIONS:
+        return parts[1] in ALLOWED_EXTENSIONS
+    return len(parts) > 1 and parts[-1] in ALLOWED_EXTENSIONS
+
+def is_archive(filename):
+    """Check if a file is a zip archive of CSV files."""
+    return filename.lower().rsplit('.', 1)[-1] in ARCHIVE_EXTENSIONS
+
+def upload_filename(original_name):
+    """Unique name to store an upload under; compressed uploads are stored decompressed."""
+    filename = secure_filename(original_name)
+    base, _, extension = filename.rpartition('.')
+    if extension.lower() in COMPRESSED_EXTENSIONS:
+        filename = base
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # The random part keeps concurrent uploads of the same name from colliding
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}_{filename}"
+
+def get_session_id():
+    """Return the caller's session id: an X-Session-ID header for API clients, else the session cookie."""
+    sid = request.headers.get('X-Session-ID')
+    if sid and SESSION_ID_PATTERN.match(sid):
+        return sid
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
 
 @app.route('/')
 def index():
     """Main page with file upload interface."""
-    return render_template('index.html')
+    output_formats = [(fmt, OUTPUT_FORMATS[fmt]['label']) for fmt in available_formats()]
+    return render_template('index.html', max_upload_mb=MAX_UPLOAD_MB, max_dataset_mb=MAX_DATASET_MB,
+                           chunk_mb=app.config['UPLOAD_CHUNK_BYTES'] // (1024 * 1024), output_formats=output_formats)
+
+def register_upload(sid, filepath, original_name, ingested, profiler):
+    """
+    Profile, deduplicate and record a received upload as the session's dataset.
+
+    Args:
+        sid: Session id
+        filepath: Path of the received CSV
+        original_name: Client file name
+        ingested: IngestStream.finish result of the upload
+        profiler: StageProfiler of the request
+
+    Returns:
+        (JSON response, status code)
+    """
+    filename = os.path.basename(filepath)
+    content_hash = ingested['content_hash']
+    # Parse the CSV once into a cached profile; identical uploads reuse it without parsing
+    stats = dataset_cache.get_profile(content_hash)
+    if stats is None:
+        large = ingested['bytes'] > app.config['STREAMING_THRESHOLD']
+        if large and ingested['profile'] is not None:
+            # Profiled while the bytes arrived
+            stats = dataset_cache.put_profile(content_hash, ingested['profile'])
+        else:
+            with profiler.stage('upload_parse') as stage:
+                stats = dataset_cache.build(content_hash, filepath,
+                                            chunksize=app.config['CSV_CHUNK_SIZE'] if large else None,
+                                            n_jobs=app.config['SHARD_N_JOBS'], backend=app.config['PREPROCESS_BACKEND'])
+                stage['rows'] = stats['rows']
+        metrics.record_stages(profiler.summary())
+    else:
+        logger.info(f"Reusing cached profile for dataset {content_hash[:12]}")
+    if stats['rows'] == 0:
+        release_upload(filepath, None, app.config['UPLOAD_BLOB_FOLDER'])
+        return jsonify({'error': 'Uploaded CSV file is empty'}), 400
+    
+    duplicate = deduplicate_upload(filepath, content_hash, app.config['UPLOAD_BLOB_FOLDER'])
+    if duplicate:
+        metrics.inc('uploads_deduplicated_total')
+        logger.info(f"Upload {filename} has the same content as an earlier upload, stored once")
+    
+    # Store file information
+    current_file_info = {
+        'filename': filename,
+        'filepath': filepath,
+        'original_name': original_name,
+        'content_hash': content_hash,
+        'rows': stats['rows'],
+        'columns': stats['columns'],
+        'column_names': stats['column_names'],
+        'total_nan': stats['total_nan'],
+        'rows_with_nan': stats['rows_with_nan'],
+        'shards': stats.get('shards', 1)
+    }
+    session_store.set(sid, current_file_info)
+    
+    logger.info(f"File uploaded successfully: {filename}, Shape: ({stats['rows']}, {stats['columns']})")
+    
+    uploaded = f"Dataset of {stats['shards']} files" if stats.get('shards', 1) > 1 else 'File'
+    return jsonify({
+        'success': True,
+        'message': f"{uploaded} uploaded successfully! Found {stats['rows']} rows and {stats['columns']} columns.",
+        'session_id': sid,
+        'duplicate': duplicate,
+        'file_info': {
+            'rows': stats['rows'],
+            'columns': stats['columns'],
+            'column_names': stats['column_names'][:10],  # Show first 10 column names
+            'total_nan': stats['total_nan'],
+            'rows_with_nan': stats['rows_with_nan'],
+            'shards': stats.get('shards', 1),
+            'schema_warnings': stats.get('schema_warnings', [])
+        },
+        'stage_metrics': profiler.summary()
+    }), 200
+
+def shard_sources(files):
+    """Yield (name, stream) for each CSV of a multi-file or zip upload; zip members in name order."""
+    for file in files:
+        if is_archive(file.filename):
+            with zipfile.ZipFile(file.stream) as archive:
+                for member in sorted(archive.infolist(), key=lambda member: member.filename):
+                    name = member.filename
+                    if member.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                        continue
+                    if not allowed_file(name):
+                        logger.info(f"Skipping {name} in {file.filename}: not a CSV file")
+                        continue
+                    with archive.open(member) as stream:
+                        yield name, stream
+        elif allowed_file(file.filename):
+            yield file.filename, file.stream
+        else:
+            raise ValueError(f"{file.filename} is not a CSV or zip file")
+
+def upload_dataset(sid, files):
+    """Store several CSV files, or a zip of them, as one sharded dataset and load it like /upload."""
+    original_name = files[0].filename
+    dirpath = os.path.join(app.config['UPLOAD_FOLDER'], os.path.splitext(upload_filename(original_name))[0])
+    profiler = StageProfiler()
+    try:
+        with profiler.stage('upload_ingest'):
+            manifest = ingest_shards(shard_sources(files), dirpath, max_bytes=app.config['MAX_DATASET_BYTES'])
+        logger.info(f"Received {len(manifest['shards'])} CSV files as dataset {os.path.basename(dirpath)}")
+        ingested = {'content_hash': manifest['content_hash'], 'bytes': manifest['bytes'], 'profile': None}
+        return register_upload(sid, dirpath, original_name, ingested, profiler)
+        
+    except Exception as e:
+        shutil.rmtree(dirpath, ignore_errors=True)
+        logger.error(f"Error reading CSV files: {e}")
+        return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Handle file upload and return basic file information."""
-    global current_file_info
-    
     try:
+        sid = get_session_id()
+        
         # Check if file was uploaded
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
         
-        file = request.files['file']
+        files = request.files.getlist('file')
+        file = files[0]
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
+        # Several files, or a zip of them, make up one dataset of the same schema
+        if len(files) > 1 or is_archive(file.filename):
+            return upload_dataset(sid, files)
+        
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
+        filename = upload_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Try to read and validate the CSV
+        profiler = StageProfiler()
         try:
-            df = pd.read_csv(filepath)
-            if df.empty:
-                os.remove(filepath)
-                return jsonify({'error': 'Uploaded CSV file is empty'}), 400
-            
-            # Count NaN stats
-            total_nan = int(df.isna().sum().sum())
-            rows_with_nan = int(df.isna().any(axis=1).sum())
-            
-            # Store file information
-            current_file_info = {
-                'filename': filename,
-                'filepath': filepath,
-                'original_name': file.filename,
-                'rows': len(df),
-                'columns': len(df.columns),
-                'column_names': df.columns.tolist(),
-                'total_nan': total_nan,
-                'rows_with_nan': rows_with_nan
-            }
-            
-            logger.info(f"File uploaded successfully: {filename}, Shape: {df.shape}")
-            
-            return jsonify({
-                'success': True,
-                'message': f'File uploaded successfully! Found {len(df)} rows and {len(df.columns)} columns.',
-                'file_info': {
-                    'rows': len(df),
-                    'columns': len(df.columns),
-                    'column_names': df.columns.tolist()[:10],  # Show first 10 column names
-                    'total_nan': total_nan,
-                    'rows_with_nan': rows_with_nan
-                }
-            })
+            # Save (decompressing if needed) and hash in one pass; large files are profiled on the way too
+            large = (request.content_length or 0) > app.config['STREAMING_THRESHOLD']
+            with profiler.stage('upload_ingest') as stage:
+                ingested = ingest_file(file.stream, filepath, profile=large,
+                                       max_bytes=app.config['MAX_DATASET_BYTES'])
+                if ingested['profile'] is not None:
+                    stage['rows'] = ingested['profile']['rows']
+            return register_upload(sid, filepath, file.filename, ingested, profiler)
             
         except Exception as e:
             # Remove file if CSV reading failed
@@ -117,168 +409,706 @@ def upload_file():
         logger.error(f"Error in upload_file: {e}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+def upload_state(state):
+    """Client view of a resumable upload."""
+    return {
+        'upload_id': state['upload_id'],
+        'filename': state['filename'],
+        'offset': state['received'],
+        'size': state['size'],
+        'chunk_size': app.config['UPLOAD_CHUNK_BYTES'],
+        'upload_url': url_for('upload_chunk', upload_id=state['upload_id'])
+    }
+
+@app.route('/uploads', methods=['POST'])
+def start_upload():
+    """Start a chunked upload; JSON body with 'filename' and optionally 'size' and 'sha256'."""
+    try:
+        params = request.get_json(silent=True) or request.form
+        filename = params.get('filename') or ''
+        if not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
+        size = params.get('size')
+        if size is not None:
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                return jsonify({'error': "'size' must be an integer"}), 400
+            if size < 0:
+                return jsonify({'error': "'size' must not be negative"}), 400
+            if size > app.config['MAX_DATASET_BYTES']:
+                return jsonify({'error': f'File too large. Maximum size is {MAX_DATASET_MB}MB.'}), 413
+        checksum = params.get('sha256')
+        if checksum is not None and not re.match(r'^[0-9a-fA-F]{64}$', str(checksum)):
+            return jsonify({'error': "'sha256' must be a hex SHA-256 digest"}), 400
+        
+        state = resumable_uploads.create(get_session_id(), filename, size=size, checksum=checksum)
+        logger.info(f"Started chunked upload {state['upload_id']} of {filename}")
+        return jsonify(upload_state(state)), 201
+        
+    except Exception as e:
+        logger.error(f"Error in start_upload: {e}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Return the offset to resume a chunked upload from."""
+    state = resumable_uploads.get(upload_id, get_session_id())
+    if not state:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload_state(state))
+
+@app.route('/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def upload_chunk(upload_id):
+    """
+    Append the request body to a chunked upload.
+    
+    The body must start at the upload's current offset, given as the
+    'Upload-Offset' header or 'offset' argument; otherwise the response is a
+    409 carrying the offset to continue from.
+    """
+    try:
+        if not resumable_uploads.get(upload_id, get_session_id()):
+            return jsonify({'error': 'Upload not found'}), 404
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+        except ValueError:
+            return jsonify({'error': "Missing or invalid 'Upload-Offset' header"}), 400
+        try:
+            state = resumable_uploads.append(upload_id, offset, request.stream)
+        except UploadConflict as e:
+            return jsonify({'error': str(e), 'offset': e.offset}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(upload_state(state))
+        
+    except Exception as e:
+        logger.error(f"Error in upload_chunk: {e}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finish a chunked upload (verifying the optional 'sha256') and load it like /upload."""
+    try:
+        sid = get_session_id()
+        state = resumable_uploads.get(upload_id, sid)
+        if not state:
+            return jsonify({'error': 'Upload not found'}), 404
+        params = request.get_json(silent=True) or request.form
+        
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], upload_filename(state['filename']))
+        profiler = StageProfiler()
+        try:
+            with profiler.stage('upload_ingest') as stage:
+                ingested = resumable_uploads.complete(upload_id, filepath, checksum=params.get('sha256'))
+                if ingested['profile'] is not None:
+                    stage['rows'] = ingested['profile']['rows']
+            return register_upload(sid, filepath, state['filename'], ingested, profiler)
+            
+        except Exception as e:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            logger.error(f"Error completing upload {upload_id}: {e}")
+            return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
+            
+    except Exception as e:
+        logger.error(f"Error in complete_upload: {e}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Discard a chunked upload."""
+    if not resumable_uploads.get(upload_id, get_session_id()):
+        return jsonify({'error': 'Upload not found'}), 404
+    resumable_uploads.abort(upload_id)
+    return jsonify({'success': True})
+
 @app.route('/preprocess', methods=['POST'])
 def preprocess_data():
-    """Process the uploaded data and return preview with metadata."""
-    global data_cleaner, current_file_info
-    
+    """Queue preprocessing of the uploaded data and return a job id to poll (or run inline with async=false)."""
     try:
+        sid = get_session_id()
+        current_file_info = session_store.get(sid)
+        
         # Check if file was uploaded
         if not current_file_info or not os.path.exists(current_file_info['filepath']):
             return jsonify({'error': 'No file uploaded or file not found'}), 400
         
-        # Read the uploaded CSV
-        df = pd.read_csv(current_file_info['filepath'])
-        logger.info(f"Starting preprocessing for file: {current_file_info['filename']}")
+        column_names = current_file_info['column_names']
+        params = request.json if request.is_json else request.form
         
         # Get NaN handling strategy and column selections from request
-        nan_strategy = request.json.get('nan_strategy') if request.is_json else request.form.get('nan_strategy')
+        nan_strategy = params.get('nan_strategy')
         if nan_strategy not in ['impute', 'delete']:
             nan_strategy = 'impute'
-        target_column = request.json.get('target_column') if request.is_json else request.form.get('target_column')
-        serial_column = request.json.get('serial_column') if request.is_json else request.form.get('serial_column')
-        if not target_column or target_column not in df.columns:
+        target_column = params.get('target_column')
+        serial_column = params.get('serial_column')
+        if not target_column or target_column not in column_names:
             target_column = None
-        if not serial_column or serial_column not in df.columns:
+        if not serial_column or serial_column not in column_names:
             serial_column = None
+        output_format, error = requested_output_format(params.get('output_format'))
+        if error:
+            return jsonify({'error': error}), 400
+        output_dtype = params.get('output_dtype') or app.config['OUTPUT_DTYPE']
+        if output_dtype not in OUTPUT_DTYPES:
+            return jsonify({'error': f"Unsupported output dtype '{output_dtype}'. "
+                                     f"Choose one of: {', '.join(OUTPUT_DTYPES)}"}), 400
+        selection, error = requested_feature_selection(params)
+        if error:
+            return jsonify({'error': error}), 400
+        options = {
+            'nan_strategy': nan_strategy,
+            'target_column': target_column,
+            'serial_column': serial_column,
+            'output_format': output_format or 'csv',
+            'output_dtype': output_dtype,
+            **selection
+        }
+        run_async = str(params.get('async', 'true')).lower() not in ('false', '0', 'no')
         
-        # Remove target and serial columns from features to preprocess
-        feature_cols = df.columns.tolist()
-        exclude_cols = []
-        if target_column:
-            exclude_cols.append(target_column)
-        if serial_column:
-            exclude_cols.append(serial_column)
-        feature_cols = [col for col in feature_cols if col not in exclude_cols]
-        df_features = df[feature_cols]
-
-        # If deleting NaN rows, drop from features, target, and serial columns, and keep all aligned
-        if nan_strategy == 'delete':
-            # Build a DataFrame with all relevant columns for row alignment
-            cols_to_check = feature_cols[:]
-            if target_column:
-                cols_to_check.append(target_column)
-            if serial_column:
-                cols_to_check.append(serial_column)
-            df_all = df[cols_to_check]
-            # Drop rows with any NaN in any relevant column
-            df_all = df_all.dropna()
-            # Split back into features, target, serial
-            df_features = df_all[feature_cols]
-            df_target = df_all[target_column] if target_column else None
-            df_serial = df_all[serial_column] if serial_column else None
-            # After dropping, if no rows remain, return error
-            if len(df_features) == 0:
-                return jsonify({'error': 'All rows were dropped because every row had at least one missing value. Please choose imputation or upload a dataset with fewer missing values.'}), 400
-            # Set nan_strategy to 'impute' for DataCleaner (since we've already deleted NaNs)
-            nan_strategy_for_cleaner = 'impute'
-        else:
-            df_target = df[target_column] if target_column else None
-            df_serial = df[serial_column] if serial_column else None
-            nan_strategy_for_cleaner = nan_strategy
-        
-        # Initialize data cleaner and process the data
-        data_cleaner = DataCleaner(nan_strategy=nan_strategy_for_cleaner)
-        X_transformed, feature_names, nan_stats = data_cleaner.fit_transform(df_features, return_nan_stats=True)
+        # The session id is recorded as the owner of the fitted cleaner
+        current_file_info = dict(current_file_info, session_id=sid)
         
-        # Convert transformed data back to DataFrame for easier handling
-        processed_df = pd.DataFrame(X_transformed, columns=feature_names)
+        # An identical earlier request is answered right away, without queueing a job
+        result = cached_preprocessing(current_file_info, options, preprocessing_settings(), result_cache, artifact_store)
+        if result is not None:
+            session_store.update(sid, **result['session_updates'])
+            return jsonify(result['response'])
         
-        # Add back serial and target columns as-is (if present)
-        if serial_column and df_serial is not None:
-            processed_df.insert(0, serial_column, df_serial.values)
-        if target_column and df_target is not None:
-            processed_df[target_column] = df_target.values
+        if not run_async:
+            logger.info(f"Starting preprocessing for file: {current_file_info['filename']}")
+            try:
+                result = run_preprocessing(current_file_info, options, preprocessing_settings(),
+                                           dataset_cache, artifact_store, result_cache=result_cache)
+            except PreprocessingError as e:
+                return jsonify({'error': str(e)}), 400
+            session_store.update(sid, **result['session_updates'])
+            metrics.record_stages(result['response']['summary']['stage_metrics'])
+            return jsonify(result['response'])
         
-        # Save processed data
-        processed_filename = f"processed_{current_file_info['filename']}"
-        processed_filepath = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
-        processed_df.to_csv(processed_filepath, index=False)
+        def record_result(result):
+            # Runs in this process before the job is marked done, so /download is ready when clients see 'done'
+            session_store.update(sid, **result['session_updates'])
+            metrics.record_stages(result['response']['summary']['stage_metrics'])
         
-        # Update current file info
-        current_file_info['processed_filename'] = processed_filename
-        current_file_info['processed_filepath'] = processed_filepath
+        job_id = job_queue.submit(preprocessing_job, current_file_info, options, preprocessing_settings(),
+                                  owner=sid, on_done=record_result, total_rows=current_file_info['rows'],
+                                  original_name=current_file_info['original_name'])
+        logger.info(f"Queued preprocessing job {job_id} for file: {current_file_info['filename']}")
         
-        # Get preprocessing summary
-        summary = data_cleaner.get_preprocessing_summary()
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': url_for('job_status', job_id=job_id),
+            'result_url': url_for('job_result', job_id=job_id)
+        }), 202
         
-        # Prepare preview data (first 10 rows)
-        preview_data = processed_df.head(10).round(4)  # Round to 4 decimal places
-        preview_dict = preview_data.to_dict('records')
+    except Exception as e:
+        logger.error(f"Error in preprocess_data: {e}")
+        return jsonify({'error': f'Preprocessing failed: {str(e)}'}), 500
+
+def get_own_job(job_id):
+    """Return the state of a job owned by the caller's session, or None."""
+    job = job_queue.get(job_id)
+    if not job or job.get('owner') != get_session_id():
+        return None
+    return job
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status, stage and progress of a preprocessing job, with its result once done."""
+    try:
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
         
-        # Prepare response
-        response_data = {
-            'success': True,
-            'message': 'Data preprocessing completed successfully!',
-            'preview': {
-                'columns': processed_df.columns.tolist(),
-                'data': preview_dict,
-                'total_rows': len(processed_df)
-            },
-            'summary': {
-                'original_shape': [current_file_info['rows'], current_file_info['columns']],
-                'processed_shape': [len(processed_df), len(processed_df.columns)],
-                'column_types': summary['column_types'],
-                'dropped_columns': summary['dropped_columns'],
-                'preprocessing_stats': summary['preprocessing_summary'],
-                'nan_stats': nan_stats
-            }
-        }
+        status = {key: job.get(key) for key in ('job_id', 'status', 'stage', 'rows_processed', 'total_rows')}
+        if job['status'] == 'done':
+            status['result'] = job['result']['response']
+        elif job['status'] == 'failed':
+            if job.get('error_type') == 'PreprocessingError':
+                status['error'] = job['error']
+            else:
+                status['error'] = f"Preprocessing failed: {job['error']}"
+        return jsonify(status)
         
-        logger.info(f"Preprocessing completed. Original shape: {df.shape}, "
-                   f"Processed shape: {processed_df.shape}")
+    except Exception as e:
+        logger.error(f"Error in job_status: {e}")
+        return jsonify({'error': f'Job status failed: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Stream the processed file of a finished job."""
+    try:
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] == 'failed':
+            return jsonify({'error': job['error']}), 400
+        if job['status'] != 'done':
+            return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
         
-        return jsonify(response_data)
+        fmt, error = requested_output_format(request.args.get('format'))
+        if error:
+            return jsonify({'error': error}), 400
+        state = dict(job['result']['session_updates'], original_name=job.get('original_name', 'data.csv'))
+        if not os.path.exists(state['processed_filepath']):
+            return jsonify({'error': 'Processed file not found'}), 404
+        return send_processed_output(state, fmt)
         
     except Exception as e:
-        logger.error(f"Error in preprocess_data: {e}")
-        return jsonify({'error': f'Preprocessing failed: {str(e)}'}), 500
+        logger.error(f"Error in job_result: {e}")
+        return jsonify({'error': f'Download failed: {str(e)}'}), 500
+
+def send_processed_output(state, fmt=None):
+    """
+    Send the processed output of a session as an attachment, streamed from disk.
+    
+    Outputs are converted chunk by chunk to the requested format on first request,
+    and the converted file is kept for later downloads.
+    """
+    processed_filepath = state['processed_filepath']
+    # Sessions from before output formats were selectable only stored CSV or sparse NPZ
+    stored_format = state.get('processed_format') or ('npz' if processed_filepath.endswith('.npz') else 'csv')
+    fmt = fmt or stored_format
+    if fmt != stored_format:
+        exports = state.get('processed_exports') or {}
+        export_path = exports.get(fmt)
+        if not export_path or not os.path.exists(export_path):
+            export_path = output_path(processed_filepath, fmt)
+            logger.info(f"Converting {processed_filepath} from {stored_format} to {fmt}")
+            convert_output(processed_filepath, stored_format, export_path, fmt, state['processed_feature_names'],
+                           app.config['CSV_CHUNK_SIZE'],
+                           prepend_columns=[state['serial_column']] if state.get('serial_column') else [],
+                           append_columns=[state['target_column']] if state.get('target_column') else [],
+                           dtype=state.get('processed_dtype'))
+            exports[fmt] = export_path
+            if state.get('session_id'):
+                session_store.update(state['session_id'], processed_exports=exports)
+        processed_filepath = export_path
+    
+    download_stem = os.path.splitext(f"processed_{state['original_name']}")[0]
+    if fmt == 'npy':
+        # The matrix and its JSON sidecar go out together as a zip built on the fly
+        return Response(
+            stream_with_context(iter_npy_bundle(processed_filepath, download_stem)),
+            mimetype=OUTPUT_FORMATS['npy']['mimetype'],
+            headers={'Content-Disposition': f"attachment; filename={download_stem}.zip"}
+        )
+    return send_file(
+        os.path.abspath(processed_filepath),
+        as_attachment=True,
+        download_name=download_stem + OUTPUT_FORMATS[fmt]['extension'],
+        mimetype=OUTPUT_FORMATS[fmt]['mimetype']
+    )
+
+def send_output_shards(state, fmt, shards):
+    """
+    Send the processed output of a session split into row shards, as a zip streamed from disk.
+    
+    The shards are written concurrently on first request and kept for later downloads.
+    """
+    processed_filepath = state['processed_filepath']
+    stored_format = state.get('processed_format') or ('npz' if processed_filepath.endswith('.npz') else 'csv')
+    # Sparse results have no sharded form of their own
+    fmt = fmt or (stored_format if stored_format != 'npz' else 'csv')
+    key = f"{fmt}:{shards}"
+    exports = state.get('processed_shards') or {}
+    paths = exports.get(key)
+    if not paths or not all(os.path.exists(path) for path in paths):
+        paths = write_output_shards(processed_filepath, stored_format, fmt, state['processed_feature_names'], shards,
+                                    app.config['CSV_CHUNK_SIZE'],
+                                    prepend_columns=[state['serial_column']] if state.get('serial_column') else [],
+                                    append_columns=[state['target_column']] if state.get('target_column') else [],
+                                    n_jobs=app.config['SHARD_N_JOBS'], backend=app.config['PREPROCESS_BACKEND'],
+                                    dtype=state.get('processed_dtype'))
+        exports[key] = paths
+        if state.get('session_id'):
+            session_store.update(state['session_id'], processed_shards=exports)
+    
+    download_stem = os.path.splitext(f"processed_{state['original_name']}")[0]
+    base_length = len(os.path.splitext(processed_filepath)[0])
+    entries = []
+    for path in paths:
+        for source in output_files(path, fmt):
+            entries.append((source, download_stem + source[base_length:]))
+    return Response(
+        stream_with_context(iter_zip_bundle(entries)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f"attachment; filename={download_stem}.{fmt}.zip"}
+    )
+
+def requested_output_format(value):
+    """Validate an output format parameter; returns (format, error message)."""
+    if not value:
+        return None, None
+    if value not in OUTPUT_FORMATS or value == 'npz':
+        return None, f"Unknown output format '{value}'. Choose one of: {', '.join(available_formats())}"
+    if value not in available_formats():
+        return None, f"Output format '{value}' requires pyarrow, which is not installed on the server"
+    return value, None
+
+def requested_feature_selection(params):
+    """
+    Validate the feature selection parameters of /preprocess; returns (options, error message).
+
+    'feature_selection': true enables the variance and correlation filters with their
+    default thresholds; 'variance_threshold', 'correlation_threshold' and
+    'svd_components' set them individually.
+    """
+    selection = {'variance_threshold': None, 'correlation_threshold': None, 'svd_components': None}
+    if str(params.get('feature_selection', '')).lower() in ('true', '1', 'yes'):
+        selection.update(variance_threshold=DEFAULT_VARIANCE_THRESHOLD,
+                         correlation_threshold=DEFAULT_CORRELATION_THRESHOLD)
+    try:
+        if params.get('variance_threshold') not in (None, ''):
+            selection['variance_threshold'] = float(params['variance_threshold'])
+        if params.get('correlation_threshold') not in (None, ''):
+            selection['correlation_threshold'] = float(params['correlation_threshold'])
+        if params.get('svd_components') not in (None, ''):
+            selection['svd_components'] = int(params['svd_components'])
+    except (TypeError, ValueError):
+        return None, 'variance_threshold and correlation_threshold must be numbers and svd_components an integer'
+    if selection['variance_threshold'] is not None and not selection['variance_threshold'] >= 0:
+        return None, 'variance_threshold must not be negative'
+    if selection['correlation_threshold'] is not None and not 0 < selection['correlation_threshold'] <= 1:
+        return None, 'correlation_threshold must be in (0, 1]'
+    max_components = app.config['MAX_SVD_COMPONENTS']
+    if selection['svd_components'] is not None and not 1 <= selection['svd_components'] <= max_components:
+        return None, f"svd_components must be between 1 and {max_components}"
+    return selection, None
 
 @app.route('/download')
 def download_processed():
-    """Download the processed CSV file."""
+    """Download the processed file, in its stored format or the one given as ?format=, optionally as ?shards=N files."""
     try:
+        current_file_info = session_store.get(get_session_id())
         if not current_file_info or 'processed_filepath' not in current_file_info:
             return jsonify({'error': 'No processed file available'}), 400
         
-        processed_filepath = current_file_info['processed_filepath']
+        if not os.path.exists(current_file_info['processed_filepath']):
+            return jsonify({'error': 'Processed file not found'}), 404
         
+        fmt, error = requested_output_format(request.args.get('format'))
+        if error:
+            return jsonify({'error': error}), 400
+        shards = request.args.get('shards', 1, type=int)
+        if not 1 <= shards <= app.config['MAX_OUTPUT_SHARDS']:
+            return jsonify({'error': f"shards must be between 1 and {app.config['MAX_OUTPUT_SHARDS']}"}), 400
+        if shards > 1:
+            return send_output_shards(dict(current_file_info, session_id=get_session_id()), fmt, shards)
+        
+        # Return the file as attachment, converted if another format was requested
+        return send_processed_output(dict(current_file_info, session_id=get_session_id()), fmt)
+        
+    except Exception as e:
+        logger.error(f"Error in download_processed: {e}")
+        return jsonify({'error': f'Download failed: {str(e)}'}), 500
+
+@app.route('/preview')
+def preview_processed():
+    """
+    Return a page of the processed output: ?offset=&limit= rows, ?columns= (repeated) or
+    ?col_offset=&col_limit= columns, and ?sort=<column>&order=asc|desc.
+    """
+    try:
+        current_file_info = session_store.get(get_session_id())
+        if not current_file_info or 'processed_filepath' not in current_file_info:
+            return jsonify({'error': 'No processed file available'}), 400
+        processed_filepath = current_file_info['processed_filepath']
         if not os.path.exists(processed_filepath):
             return jsonify({'error': 'Processed file not found'}), 404
         
-        # Return the file as attachment
-        return send_file(
-            processed_filepath,
-            as_attachment=True,
-            download_name=f"processed_{current_file_info['original_name']}",
-            mimetype='text/csv'
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', 100, type=int)
+        col_offset = request.args.get('col_offset', 0, type=int)
+        col_limit = request.args.get('col_limit', app.config['PREVIEW_MAX_COLUMNS'], type=int)
+        columns = request.args.getlist('columns') or None
+        sort = request.args.get('sort') or None
+        order = request.args.get('order', 'asc')
+        if min(offset, limit, col_offset, col_limit) < 0:
+            return jsonify({'error': 'offset, limit, col_offset and col_limit must not be negative'}), 400
+        if limit > app.config['PREVIEW_MAX_ROWS']:
+            return jsonify({'error': f"limit must be at most {app.config['PREVIEW_MAX_ROWS']}"}), 400
+        if col_limit > app.config['PREVIEW_MAX_COLUMNS'] or (columns and len(columns) > app.config['PREVIEW_MAX_COLUMNS']):
+            return jsonify({'error': f"At most {app.config['PREVIEW_MAX_COLUMNS']} columns per page"}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': "order must be 'asc' or 'desc'"}), 400
+        
+        profiler = StageProfiler()
+        with profiler.stage('preview_index'):
+            index = open_preview(
+                processed_filepath, current_file_info.get('processed_format') or 'csv',
+                current_file_info['processed_feature_names'], app.config['CSV_CHUNK_SIZE'],
+                prepend_columns=[current_file_info['serial_column']] if current_file_info.get('serial_column') else [],
+                append_columns=[current_file_info['target_column']] if current_file_info.get('target_column') else [])
+        if columns is None:
+            columns = index.columns[col_offset:col_offset + col_limit]
+        try:
+            with profiler.stage('preview_page') as stage:
+                page = index.page(offset, limit, columns=columns, sort=sort, descending=order == 'desc')
+                stage['rows'] = len(page['rows'])
+        except KeyError as e:
+            return jsonify({'error': e.args[0]}), 400
+        metrics.record_stages(profiler.summary())
+        
+        page.update(success=True, limit=limit, col_offset=col_offset if 'columns' not in request.args else None,
+                    sort=sort, order=order)
+        return jsonify(page)
+        
+    except Exception as e:
+        logger.error(f"Error in preview_processed: {e}")
+        return jsonify({'error': f'Preview failed: {str(e)}'}), 500
+
+@app.route('/artifacts')
+def list_artifacts():
+    """List the stored fitted cleaners of this session (latest version of each)."""
+    try:
+        return jsonify({'success': True, 'artifacts': artifact_store.list_artifacts(owner=get_session_id())})
+    except Exception as e:
+        logger.error(f"Error in list_artifacts: {e}")
+        return jsonify({'error': f'Listing artifacts failed: {str(e)}'}), 500
+
+metrics.describe('transform_drift_total', 'Transformed batches by drift status against the fitted data')
+
+def record_drift(session_id, artifact_id, version, report):
+    """Count and log the drift report of a transformed batch and keep it as the session's last one for /drift."""
+    if report is None:
+        return
+    metrics.inc('transform_drift_total', status='drift' if report['drifted_columns'] else 'stable')
+    if report['drifted_columns']:
+        logger.warning(f"Batch for artifact {artifact_id} v{version} drifted in {report['drifted_columns']} "
+                       f"(max PSI {report['max_psi']})")
+    session_store.update(session_id, last_drift={'artifact_id': artifact_id, 'version': version,
+                                                 'checked_at': time.time(), **report})
+
+@app.route('/transform', methods=['POST'])
+def transform_batch():
+    """Apply a stored, fitted cleaner to a new CSV batch and stream back the processed CSV."""
+    try:
+        session_id = get_session_id()
+        current_file_info = session_store.get(session_id)
+        artifact_id = request.form.get('artifact_id') or current_file_info.get('artifact_id')
+        version = request.form.get('version', type=int)
+        if not artifact_id:
+            return jsonify({'error': 'No artifact_id given and no cleaner fitted in this session'}), 400
+        
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'error': 'No file uploaded'}), 400
+        file = request.files['file']
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
+        
+        try:
+            metadata = artifact_store.get_metadata(artifact_id, version, owner=session_id)
+            cleaner = artifact_store.load(artifact_id, metadata['version'])
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': str(e)}), 404
+        
+        filename = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{secure_filename(file.filename)}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file.save(filepath)
+        
+        try:
+            columns = pd.read_csv(filepath, nrows=0).columns.tolist()
+        except Exception as e:
+            os.remove(filepath)
+            return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
+        missing = [col for col in cleaner.original_columns if col not in columns]
+        if missing:
+            os.remove(filepath)
+            return jsonify({'error': f'Batch is missing columns the cleaner was fitted on: {missing}'}), 400
+        
+        # Serial/target columns are passed through when the batch has them
+        prepend = [col for col in [metadata.get('serial_column')] if col and col in columns]
+        append = [col for col in [metadata.get('target_column')] if col and col in columns]
+        headers = {'Content-Disposition': f"attachment; filename=processed_{secure_filename(file.filename)}"}
+        
+        # Large uncompressed batches are split by byte range and transformed on every core
+        compressed = filename.lower().rsplit('.', 1)[-1] in COMPRESSED_EXTENSIONS
+        if (app.config['TRANSFORM_N_JOBS'] != 1 and not compressed
+                and os.path.getsize(filepath) >= app.config['TRANSFORM_PARALLEL_BYTES']):
+            processed_path = os.path.join(app.config['PROCESSED_FOLDER'], f"processed_{os.path.splitext(filename)[0]}.csv")
+            logger.info(f"Transforming batch {file.filename} with artifact {artifact_id} v{metadata['version']} "
+                        f"in parallel")
+            try:
+                result = transform_file(cleaner, filepath, processed_path, n_jobs=app.config['TRANSFORM_N_JOBS'],
+                                        chunksize=app.config['CSV_CHUNK_SIZE'], prepend_columns=prepend,
+                                        append_columns=append)
+            finally:
+                os.remove(filepath)
+            record_drift(session_id, artifact_id, metadata['version'], result['drift'])
+            if result['drift'] is not None:
+                # Known before the first byte is sent, so a summary fits in a header
+                headers['X-Drift-Summary'] = json.dumps({key: result['drift'][key]
+                                                         for key in ('max_psi', 'drifted_columns')})
+            
+            def stream_processed():
+                try:
+                    yield from iter_file_blocks(processed_path)
+                finally:
+                    if os.path.exists(processed_path):
+                        os.remove(processed_path)
+            
+            return Response(stream_with_context(stream_processed()), mimetype='text/csv', headers=headers)
+        
+        def generate():
+            try:
+                header = True
+                drift = cleaner.new_drift_batch()
+                # Each chunk infers its own dtypes; read the fitted string columns as strings
+                chunks = pd.read_csv(filepath, chunksize=app.config['CSV_CHUNK_SIZE'], dtype=cleaner.input_dtypes())
+                for out in cleaner.transform_chunks(chunks, prepend, append, drift=drift):
+                    yield out.to_csv(index=False, header=header)
+                    header = False
+                if header:
+                    # Same quoting as the to_csv header of a non-empty batch
+                    yield pd.DataFrame(columns=prepend + list(cleaner.feature_names_out) + append).to_csv(index=False)
+                record_drift(session_id, artifact_id, metadata['version'], drift.report() if drift is not None else None)
+            finally:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+        
+        logger.info(f"Transforming batch {file.filename} with artifact {artifact_id} v{metadata['version']}")
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/csv',
+            headers=headers
         )
         
     except Exception as e:
-        logger.error(f"Error in download_processed: {e}")
-        return jsonify({'error': f'Download failed: {str(e)}'}), 500
+        logger.error(f"Error in transform_batch: {e}")
+        return jsonify({'error': f'Transform failed: {str(e)}'}), 500
+
+@app.route('/drift')
+def last_drift():
+    """Drift metrics of the last batch this session sent to /transform, against the data its cleaner was fitted on."""
+    report = session_store.get(get_session_id()).get('last_drift')
+    if report is None:
+        return jsonify({'error': 'No batch with a drift reference was transformed in this session'}), 404
+    return jsonify({'success': True, 'drift': report})
+
+@app.route('/transform_rows', methods=['POST'])
+def transform_rows():
+    """Transform JSON records with a stored cleaner's compiled fast path, for low-latency inference."""
+    try:
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'Expected a JSON object with "records" (or a single "record")'}), 400
+        records = payload.get('records')
+        if records is None and 'record' in payload:
+            records = [payload['record']]
+        if not isinstance(records, list) or not records:
+            return jsonify({'error': 'No records given'}), 400
+        if len(records) > app.config['TRANSFORM_ROWS_LIMIT']:
+            return jsonify({'error': f"At most {app.config['TRANSFORM_ROWS_LIMIT']} records per request; "
+                                     f"use /transform for larger batches"}), 400
+        
+        session_id = get_session_id()
+        artifact_id = payload.get('artifact_id') or session_store.get(session_id).get('artifact_id')
+        if not artifact_id:
+            return jsonify({'error': 'No artifact_id given and no cleaner fitted in this session'}), 400
+        try:
+            version = int(payload['version']) if payload.get('version') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'version must be an integer'}), 400
+        try:
+            metadata = artifact_store.get_metadata(artifact_id, version, owner=session_id)
+            cleaner = artifact_store.load(artifact_id, metadata['version'])
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': str(e)}), 404
+        
+        profiler = StageProfiler()
+        try:
+            with profiler.stage('transform_rows', len(records)):
+                X = cleaner.transform_records(records)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        metrics.record_stages(profiler.summary())
+        
+        # NaN and infinity are not valid JSON
+        rows = np.where(np.isfinite(X), X, None).tolist() if not np.isfinite(X).all() else X.tolist()
+        return jsonify({
+            'success': True,
+            'artifact_id': artifact_id,
+            'version': metadata['version'],
+            'feature_names': metadata['feature_names_out'],
+            'rows': rows
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in transform_rows: {e}")
+        return jsonify({'error': f'Transform failed: {str(e)}'}), 500
+
+@app.route('/artifacts/<artifact_id>/partial_fit', methods=['POST'])
+def update_artifact(artifact_id):
+    """Update a stored cleaner with a new CSV batch and save the result as the artifact's next version."""
+    try:
+        version = request.form.get('version', type=int)
+        new_categories = request.form.get('new_categories', 'freeze')
+        if new_categories not in ('freeze', 'extend'):
+            return jsonify({'error': "new_categories must be 'freeze' or 'extend'"}), 400
+        
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'error': 'No file uploaded'}), 400
+        file = request.files['file']
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
+        
+        try:
+            metadata = artifact_store.get_metadata(artifact_id, version, owner=get_session_id())
+            # Loaded cleaners are shared between requests, so update a private copy
+            cleaner = copy.deepcopy(artifact_store.load(artifact_id, metadata['version']))
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': str(e)}), 404
+        
+        filename = f"update_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{secure_filename(file.filename)}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file.save(filepath)
+        try:
+            try:
+                pd.read_csv(filepath, nrows=0)
+            except Exception as e:
+                return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
+            try:
+                chunks = pd.read_csv(filepath, chunksize=app.config['CSV_CHUNK_SIZE'], dtype=cleaner.input_dtypes())
+                nan_stats = cleaner.partial_fit(chunks, new_categories=new_categories)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        
+        metrics.record_stages(cleaner.profiler.summary())
+        updated = artifact_store.save(cleaner, artifact_id=artifact_id, extra_metadata={
+            'source_file': file.filename,
+            'serial_column': metadata.get('serial_column'),
+            'target_column': metadata.get('target_column'),
+            'parent_version': metadata['version'],
+            'rows_seen': cleaner.running_stats['n_rows']
+        }, owner=metadata['owner'])
+        logger.info(f"Updated artifact {artifact_id} v{metadata['version']} -> v{updated['version']} "
+                    f"with {file.filename}")
+        return jsonify({'success': True, 'artifact': updated, 'nan_stats': nan_stats})
+        
+    except Exception as e:
+        logger.error(f"Error in update_artifact: {e}")
+        return jsonify({'error': f'Artifact update failed: {str(e)}'}), 500
 
 @app.route('/reset', methods=['POST'])
 def reset_session():
     """Reset the current session and clean up temporary files."""
-    global current_file_info, data_cleaner
-    
     try:
-        # Clean up uploaded file
-        if current_file_info and 'filepath' in current_file_info:
-            if os.path.exists(current_file_info['filepath']):
-                os.remove(current_file_info['filepath'])
-                logger.info(f"Removed uploaded file: {current_file_info['filepath']}")
-        
-        # Clean up processed file
-        if current_file_info and 'processed_filepath' in current_file_info:
-            if os.path.exists(current_file_info['processed_filepath']):
-                os.remove(current_file_info['processed_filepath'])
-                logger.info(f"Removed processed file: {current_file_info['processed_filepath']}")
-        
-        # Reset global variables
-        current_file_info = {}
-        data_cleaner = None
+        sid = get_session_id()
+        current_file_info = session_store.get(sid)
+        
+        # Clean up the uploaded file, processed file and any converted copies
+        if current_file_info:
+            release_session_files(current_file_info, app.config['UPLOAD_BLOB_FOLDER'])
+        
+        # Forget the session state (stored artifacts are kept for /transform)
+        session_store.delete(sid)
         
         return jsonify({'success': True, 'message': 'Session reset successfully'})
         
@@ -286,10 +1116,26 @@ def reset_session():
         logger.error(f"Error in reset_session: {e}")
         return jsonify({'error': f'Reset failed: {str(e)}'}), 500
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Expose stage timings, request and job counters of this worker in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def start_janitor():
+    """Start the disk janitor in this worker process (a no-op once it runs)."""
+    janitor.start()
+
+@app.after_request
+def count_request(response):
+    """Count handled requests by endpoint and status code."""
+    metrics.inc('requests_total', endpoint=request.endpoint or 'unmatched', status=response.status_code)
+    return response
+
 @app.errorhandler(413)
 def too_large(e):
     """Handle file too large error."""
-    return jsonify({'error': 'File too large. Maximum size is 16MB.'}), 413
+    return jsonify({'error': f'File too large. Maximum size is {MAX_UPLOAD_MB}MB.'}), 413
 
 @app.errorhandler(404)
 def not_found(e):
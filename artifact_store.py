@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import uuid
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from lazy_imports import lazy_module
+
+from automl_engine import DataCleaner, ENGINE_VERSION
+
+joblib = lazy_module('joblib')
+sklearn = lazy_module('sklearn')
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the on-disk layout of an artifact changes
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class ArtifactStore:
+    """
+    Versioned on-disk store of fitted DataCleaner instances.
+
+    Layout: '<root>/<artifact_id>/v<N>/cleaner.joblib' plus 'metadata.json'
+    describing the fitted column types, dropped columns and output feature
+    names. Saving under an existing id adds a new version. Loaded cleaners are
+    kept in a small thread-safe LRU cache so repeated transforms skip disk.
+
+    Every version records the session that owns it; lookups given an owner
+    treat artifacts of other owners as missing.
+    """
+
+    def __init__(self, root_dir: str, cache_size: int = 8):
+        self.root_dir = root_dir
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _artifact_dir(self, artifact_id: str) -> str:
+        if not artifact_id or not ARTIFACT_ID_PATTERN.match(artifact_id):
+            raise ValueError(f"Invalid artifact id: {artifact_id!r}")
+        return os.path.join(self.root_dir, artifact_id)
+
+    def _versions(self, artifact_id: str, complete_only: bool = True) -> List[int]:
+        artifact_dir = self._artifact_dir(artifact_id)
+        if not os.path.isdir(artifact_dir):
+            return []
+        versions = [int(name[1:]) for name in os.listdir(artifact_dir)
+                    if name.startswith('v') and name[1:].isdigit()]
+        if complete_only:
+            # metadata.json is written last, so its presence marks a finished save
+            versions = [v for v in versions
+                        if os.path.exists(os.path.join(artifact_dir, f"v{v}", 'metadata.json'))]
+        return sorted(versions)
+
+    def _resolve(self, artifact_id: str, version: Optional[int]) -> str:
+        versions = self._versions(artifact_id)
+        if not versions:
+            raise KeyError(f"Artifact not found: {artifact_id}")
+        if version is None:
+            version = versions[-1]
+        elif version not in versions:
+            raise KeyError(f"Artifact {artifact_id} has no version {version}")
+        return os.path.join(self._artifact_dir(artifact_id), f"v{version}")
+
+    def _new_version_dir(self, artifact_id: str) -> Tuple[int, str]:
+        # Creating the version directory claims the version number; another process
+        # saving concurrently gets FileExistsError and moves on to the next number
+        while True:
+            versions = self._versions(artifact_id, complete_only=False)
+            version = versions[-1] + 1 if versions else 1
+            version_dir = os.path.join(self._artifact_dir(artifact_id), f"v{version}")
+            try:
+                os.makedirs(version_dir)
+                return version, version_dir
+            except FileExistsError:
+                continue
+
+    @staticmethod
+    def _write_metadata(version_dir: str, metadata: Dict[str, Any]) -> None:
+        metadata_path = os.path.join(version_dir, 'metadata.json')
+        with open(metadata_path + '.tmp', 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(metadata_path + '.tmp', metadata_path)
+
+    def save(self, cleaner: DataCleaner, artifact_id: Optional[str] = None,
+             extra_metadata: Optional[Dict[str, Any]] = None, owner: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Persist a fitted cleaner as a new artifact version.
+
+        Args:
+            cleaner: Fitted DataCleaner
+            artifact_id: Existing id to add a version to; a new id is generated if omitted
+            extra_metadata: Additional JSON-serializable metadata (e.g. passthrough columns)
+            owner: Session id allowed to list, load and update the artifact
+
+        Returns:
+            Metadata dictionary of the saved version
+        """
+        if cleaner.preprocessor is None:
+            raise ValueError("Only fitted cleaners can be saved")
+
+        artifact_id = artifact_id or uuid.uuid4().hex[:16]
+        version, version_dir = self._new_version_dir(artifact_id)
+
+        metadata = {
+            'artifact_id': artifact_id,
+            'version': version,
+            'owner': owner,
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'engine_version': ENGINE_VERSION,
+            'sklearn_version': sklearn.__version__,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'nan_strategy': cleaner.nan_strategy,
+            'input_columns': list(cleaner.original_columns),
+            'column_types': cleaner.column_types,
+            'dropped_columns': cleaner.dropped_columns,
+            'feature_names_out': [str(name) for name in cleaner.feature_names_out],
+            **(extra_metadata or {})
+        }
+
+        # Write to temporary names first so a half-written artifact is never loaded
+        model_path = os.path.join(version_dir, 'cleaner.joblib')
+        joblib.dump(cleaner, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+        self._write_metadata(version_dir, metadata)
+
+        with self._lock:
+            self._remember((artifact_id, version), cleaner)
+        logger.info(f"Saved artifact {artifact_id} v{version}")
+        return metadata
+
+    def clone(self, artifact_id: str, owner: Optional[str], version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Copy an artifact version to a new artifact owned by another session.
+
+        Used when a cached preprocessing result fitted for one session is
+        reused by another, so each session updates only its own copy.
+
+        Returns:
+            Metadata dictionary of the new artifact (version 1)
+        """
+        metadata = self.get_metadata(artifact_id, version)
+        new_id = uuid.uuid4().hex[:16]
+        new_version, version_dir = self._new_version_dir(new_id)
+        model_path = os.path.join(version_dir, 'cleaner.joblib')
+        shutil.copyfile(os.path.join(self._resolve(artifact_id, metadata['version']), 'cleaner.joblib'),
+                        model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+        metadata = {**metadata, 'artifact_id': new_id, 'version': new_version, 'owner': owner,
+                    'cloned_from': {'artifact_id': artifact_id, 'version': metadata['version']}}
+        self._write_metadata(version_dir, metadata)
+        logger.info(f"Cloned artifact {artifact_id} v{metadata['cloned_from']['version']} to {new_id}")
+        return metadata
+
+    def get_metadata(self, artifact_id: str, version: Optional[int] = None,
+                     owner: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Return the metadata of an artifact version (latest by default).
+
+        Raises:
+            KeyError: the version does not exist, or owner is given and does not own it
+        """
+        with open(os.path.join(self._resolve(artifact_id, version), 'metadata.json')) as f:
+            metadata = json.load(f)
+        if owner is not None and metadata.get('owner') != owner:
+            # Reported like a missing artifact, so ids of other sessions cannot be probed
+            raise KeyError(f"Artifact not found: {artifact_id}")
+        return metadata
+
+    def load(self, artifact_id: str, version: Optional[int] = None) -> DataCleaner:
+        """
+        Return a fitted cleaner, loading it from disk on first use.
+
+        Args:
+            artifact_id: Artifact id
+            version: Version number; latest if omitted
+
+        Returns:
+            The fitted DataCleaner (shared; treat as read-only)
+        """
+        version_dir = self._resolve(artifact_id, version)
+        key = (artifact_id, int(os.path.basename(version_dir)[1:]))
+        try:
+            # Bump the artifact's recency for the janitor
+            os.utime(os.path.join(version_dir, 'metadata.json'))
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        metadata = self.get_metadata(*key)
+        if metadata.get('sklearn_version') != sklearn.__version__:
+            logger.warning(f"Artifact {artifact_id} was saved with scikit-learn "
+                           f"{metadata.get('sklearn_version')}, running {sklearn.__version__}")
+        cleaner = joblib.load(os.path.join(version_dir, 'cleaner.joblib'))
+        with self._lock:
+            self._remember(key, cleaner)
+        return cleaner
+
+    def list_artifacts(self, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return the metadata of the latest version of every artifact (of one owner, if given)."""
+        artifacts = []
+        for artifact_id in sorted(os.listdir(self.root_dir)):
+            if not ARTIFACT_ID_PATTERN.match(artifact_id):
+                continue
+            try:
+                artifacts.append(self.get_metadata(artifact_id, owner=owner))
+            except (KeyError, OSError, ValueError):
+                continue
+        return artifacts
+
+    def delete(self, artifact_id: str) -> None:
+        """Delete every version of an artifact, on disk and in memory."""
+        shutil.rmtree(self._artifact_dir(artifact_id), ignore_errors=True)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == artifact_id]:
+                del self._cache[key]
+
+    def _remember(self, key, cleaner: DataCleaner) -> None:
+        # Caller holds self._lock
+        self._cache[key] = cleaner
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -1,15 +1,228 @@
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.impute import SimpleImputer
+from __future__ import annotations
+
 import logging
-from typing import List, Dict, Tuple, Any
+import time
+import warnings
+import threading
+from collections import Counter
+from typing import List, Dict, Tuple, Any, Callable, Iterable, Iterator, Optional, Sequence, Union
+import os
+from contextlib import contextmanager
+from lazy_imports import lazy_module
+from instrumentation import StageProfiler, column_logger
+from fast_transform import FastTransformer, DATETIME_PARTS
+from column_stats import ColumnStats
+from feature_selection import FeatureSelector
+from drift import DriftMonitor, DriftBatch
+
+pd = lazy_module('pandas')
+np = lazy_module('numpy')
+sparse = lazy_module('scipy.sparse')
+joblib = lazy_module('joblib')
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
+# Bumped whenever fitted output for the same input and options may change
+ENGINE_VERSION = '1.2'
+
+def sniff_datetime_format(series: pd.Series, sample_size: int = 100, confidence: float = 0.95,
+                          max_format_guesses: int = 5) -> Tuple[bool, Optional[str]]:
+    """
+    Check whether a string/object column holds datetimes, inferring its format on a sample.
+    
+    The format is guessed from the first few distinct values (so one malformed
+    leading value does not hide it) and verified by an explicit, vectorized
+    parse of the sample; only if that fails is the slow per-element parser tried.
+    
+    Args:
+        series: Column values (or a sample of them)
+        sample_size: Maximum number of non-null values to try
+        confidence: Minimum fraction of sampled values that must parse
+        max_format_guesses: Number of distinct values to guess a format from
+        
+    Returns:
+        Tuple of (is_datetime, format); format is None when it could not be inferred
+    """
+    from pandas.tseries.api import guess_datetime_format
+    
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False, None
+    sample = series.dropna().head(sample_size)
+    if sample.empty:
+        return False, None
+    
+    tried = set()
+    for value in sample.drop_duplicates().head(max_format_guesses):
+        fmt = guess_datetime_format(value) if isinstance(value, str) else None
+        if fmt is None or fmt in tried:
+            continue
+        tried.add(fmt)
+        parsed = pd.to_datetime(sample, format=fmt, errors='coerce')
+        if parsed.notna().mean() >= confidence:
+            return True, fmt
+    
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            parsed = pd.to_datetime(sample, errors='coerce')
+    except (ValueError, TypeError, OverflowError):
+        return False, None
+    return bool(parsed.notna().mean() >= confidence), None
+
+def _varying_columns(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Flag columns holding more than one distinct non-null value, without hashing.
+    
+    Each column is compared to its first non-null value in one vectorized pass
+    per dtype block (numeric as float64, everything else as object).
+    
+    Args:
+        frame: Input DataFrame
+        
+    Returns:
+        Boolean array aligned with frame.columns
+    """
+    result = np.zeros(len(frame.columns), dtype=bool)
+    numeric = np.array([pd.api.types.is_numeric_dtype(dtype) for dtype in frame.dtypes], dtype=bool)
+    for block, dtype in ((numeric, np.float64), (~numeric, object)):
+        positions = np.flatnonzero(block)
+        if not len(positions) or not len(frame):
+            continue
+        values = frame.iloc[:, positions].to_numpy(dtype=dtype)
+        present = ~pd.isna(values)
+        first = values[present.argmax(axis=0), np.arange(values.shape[1])]
+        same = (values == first) | ~present
+        result[positions] = present.any(axis=0) & ~same.all(axis=0)
+    return result
+
+def _holds_strings(series: pd.Series) -> bool:
+    """Whether every non-null value of a column (or of its categories) is a string."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.api.types.infer_dtype(series.cat.categories) in ('string', 'empty')
+    if pd.api.types.is_object_dtype(series.dtype):
+        return pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')
+    return pd.api.types.is_string_dtype(series.dtype)
+
+
+def _level_key(value: Any) -> Tuple[str, Any]:
+    """Sort key for categorical levels that never compares values of different types."""
+    return type(value).__name__, value
+
+
+def save_sparse_output(path: str, X: sparse.spmatrix, feature_names: List[str],
+                       extra_columns: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Save a sparse result as a compressed NPZ archive instead of a dense CSV.
+    
+    The archive holds the CSR components ('data', 'indices', 'indptr', 'shape'),
+    'feature_names', and one 'column:<name>' array per passthrough column. Nothing
+    is pickled, so it loads with np.load(path) or load_sparse_output.
+    
+    Args:
+        path: Destination .npz path
+        X: Sparse feature matrix
+        feature_names: Names of the columns of X
+        extra_columns: Passthrough columns (e.g. serial/target) aligned with the rows of X
+    """
+    X = sparse.csr_matrix(X)
+    arrays = {
+        'data': X.data,
+        'indices': X.indices,
+        'indptr': X.indptr,
+        'shape': np.array(X.shape),
+        'feature_names': np.array(feature_names, dtype=str)
+    }
+    for name, values in (extra_columns or {}).items():
+        values = np.asarray(values)
+        arrays[f'column:{name}'] = values.astype(str) if values.dtype == object else values
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_sparse_output(path: str) -> Tuple[sparse.csr_matrix, List[str], Dict[str, np.ndarray]]:
+    """
+    Load an archive written by save_sparse_output.
+    
+    Args:
+        path: Path of the .npz archive
+        
+    Returns:
+        Tuple of (CSR matrix, feature names, passthrough columns)
+    """
+    with np.load(path) as archive:
+        X = sparse.csr_matrix((archive['data'], archive['indices'], archive['indptr']),
+                              shape=tuple(archive['shape']))
+        extra = {key.split(':', 1)[1]: archive[key] for key in archive.files if key.startswith('column:')}
+        return X, archive['feature_names'].tolist(), extra
+
+def _datetime_part_table(values: np.ndarray) -> np.ndarray:
+    """
+    Year, month, day and day of week of datetime64 values, computed in one vectorized pass.
+    
+    Returns:
+        float64 array of shape (len(values), 4) in DATETIME_PARTS order, NaN where values are NaT
+    """
+    days = values.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    day_numbers = days.astype(np.int64)
+    table = np.empty((len(values), len(DATETIME_PARTS)), dtype=np.float64)
+    table[:, 0] = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    table[:, 1] = months.astype(np.int64) % 12 + 1
+    table[:, 2] = (days - months).astype(np.int64) + 1
+    # 1970-01-01 was a Thursday (Monday=0)
+    table[:, 3] = (day_numbers + 3) % 7
+    table[np.isnat(values)] = np.nan
+    return table
+
+def _parse_datetimes(values: Union[pd.Series, pd.Index], fmt: Optional[str]) -> np.ndarray:
+    """Parse values to naive datetime64 (local wall time for timezone-aware input)."""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        with warnings.catch_warnings():
+            # Without a format every value is parsed individually, which pandas warns about
+            warnings.simplefilter('ignore', UserWarning)
+            values = pd.to_datetime(values, format=fmt, errors='coerce')
+    if isinstance(values, pd.Series):
+        values = pd.DatetimeIndex(values)
+    if values.tz is not None:
+        values = values.tz_localize(None)
+    return values.to_numpy()
+
+def _datetime_features(series: pd.Series, fmt: Optional[str],
+                       dtype: Optional[np.dtype] = None) -> Union[pd.DataFrame, Exception]:
+    """
+    Expand a datetime column into year, month, day and day-of-week features.
+    
+    String columns are parsed through a unique-value cache: each distinct
+    value is parsed once with the format inferred while fitting, and the
+    features of the distinct values are gathered back onto the rows. Dates
+    repeat heavily in practice, so this parses a fraction of the rows. The
+    features are created directly in dtype (if given), so they do not need
+    converting again before the pipeline. Exceptions are returned rather
+    than raised, so a failing column does not abort the other columns
+    extracted in the same parallel batch.
+    """
+    try:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            table = _datetime_part_table(_parse_datetimes(series, fmt))
+        else:
+            codes, uniques = pd.factorize(series)
+            unique_table = _datetime_part_table(_parse_datetimes(pd.Index(uniques, dtype=object), fmt))
+            # Missing values (code -1) take the trailing all-NaN row
+            table = np.vstack([unique_table, np.full((1, len(DATETIME_PARTS)), np.nan)])[codes]
+        if dtype is not None:
+            table = table.astype(dtype, copy=False)
+        col = series.name
+        return pd.DataFrame(table, index=series.index, columns=[f'{col}_{part}' for part in DATETIME_PARTS])
+    except Exception as e:
+        return e
+
+
 class DataCleaner:
     """
     A comprehensive data preprocessing class that handles:
@@ -20,7 +233,14 @@ class DataCleaner:
     - Constant column removal
     """
     
-    def __init__(self, nan_strategy: str = 'impute'):
+    def __init__(self, nan_strategy: str = 'impute', sample_size: int = 1000,
+                 datetime_confidence: float = 0.95, sparse_output: Union[bool, str] = 'auto',
+                 max_categories: Optional[int] = 1000, dense_cell_limit: int = 10_000_000,
+                 progress_callback: Optional[Callable[[str, int], None]] = None,
+                 n_jobs: Optional[int] = None, parallel_backend: str = 'loky', min_shard_columns: int = 8,
+                 output_dtype: Optional[str] = 'float32', variance_threshold: Optional[float] = None,
+                 correlation_threshold: Optional[float] = None, svd_components: Optional[int] = None,
+                 monitor_drift: bool = True):
         self.preprocessor = None
         self.feature_names_out = None
         self.column_types = {}
@@ -28,13 +248,218 @@ class DataCleaner:
         self.preprocessing_summary = {}
         self.original_columns = []
         self.nan_strategy = nan_strategy
+        # Rows sampled for type inference, and the fraction of sampled values that must parse as dates
+        self.sample_size = sample_size
+        self.datetime_confidence = datetime_confidence
+        self.datetime_formats = {}
+        self.detection_times = {}
+        # Output layout: True always returns CSR, False always dense, 'auto' returns CSR only
+        # when the result is both sparse (density < 0.3) and larger than dense_cell_limit cells
+        self.sparse_output = sparse_output
+        self.dense_cell_limit = dense_cell_limit
+        # Categorical columns with more levels keep the most frequent ones and bucket the rest
+        self.max_categories = max_categories
+        # Called as progress_callback(stage, rows_processed) while fitting and streaming
+        self.progress_callback = progress_callback
+        # Wall time, rows and peak RSS per stage of the last fit (and of transforms since)
+        self.profiler = StageProfiler()
+        # Parallel mode (n_jobs > 1 or -1 for all cores): columns are split into shards of at least
+        # min_shard_columns, fitted and transformed concurrently by joblib ('loky' processes or 'threading')
+        self.n_jobs = n_jobs
+        self.parallel_backend = parallel_backend
+        self.min_shard_columns = min_shard_columns
+        # Dtype of the transformed features; numerical inputs are cast to it before the pipeline,
+        # so imputation, scaling and encoding never materialise float64 copies (None keeps float64)
+        self.output_dtype = output_dtype
+        # Optional stage after encoding (see FeatureSelector): drop features with at most variance_threshold
+        # variance or an absolute correlation above correlation_threshold with an earlier feature, then
+        # project onto svd_components randomized SVD components; all None skips it
+        self.variance_threshold = variance_threshold
+        self.correlation_threshold = correlation_threshold
+        self.svd_components = svd_components
+        self.feature_selector = None
+        # Reference sketches of the fitted columns (see DriftMonitor), so transforms can report drift
+        self.monitor_drift = monitor_drift
+        self.drift_monitor = None
+        # Sufficient statistics of every row fitted so far (counts, moments, value counts), for partial_fit
+        self.running_stats = None
+        # Compiled single-row path (see transform_records), rebuilt lazily after every fit
+        self._fast_path = None
+    
+    def __getstate__(self):
+        # Progress callbacks belong to a single run (and are often closures), so never pickle them
+        state = self.__dict__.copy()
+        state['progress_callback'] = None
+        state['profiler'] = None
+        state['_fast_path'] = None
+        return state
+    
+    def _report_progress(self, stage: str, rows_processed: int = 0) -> None:
+        callback = getattr(self, 'progress_callback', None)
+        if callback is not None:
+            callback(stage, rows_processed)
+    
+    def _get_profiler(self) -> StageProfiler:
+        if getattr(self, 'profiler', None) is None:
+            # Unpickled cleaners start without a profiler
+            self.profiler = StageProfiler()
+        return self.profiler
+    
+    @contextmanager
+    def _stage(self, name: str, rows: Optional[int] = None, report: bool = True):
+        """Time a block in the stage profiler, reporting it as progress first unless report is False."""
+        if report:
+            self._report_progress(name, rows or 0)
+        with self._get_profiler().stage(name, rows) as info:
+            yield info
+    
+    def _timed_chunks(self, chunks: Iterable[pd.DataFrame], read_stage: str,
+                      work_stage: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """Yield chunks, timing how long each takes to produce and, optionally, to consume."""
+        profiler = self._get_profiler()
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            profiler.record(read_stage, time.perf_counter() - start, rows=len(chunk))
+            start = time.perf_counter()
+            yield chunk
+            if work_stage:
+                profiler.record(work_stage, time.perf_counter() - start, rows=len(chunk))
+    
+    def input_dtypes(self) -> Dict[str, str]:
+        """
+        Dtypes to read new data with, so chunked reads see the values the cleaner was fitted on.
+        
+        Categorical and datetime columns are read as strings; otherwise a chunk
+        holding only numeric-looking levels would be inferred as numbers.
+        
+        Returns:
+            Mapping of column to dtype, usable as pd.read_csv(dtype=...)
+        """
+        return {col: 'str' for key in ('categorical', 'datetime') for col in self.column_types.get(key, [])}
+    
+    def _output_dtype(self) -> np.dtype:
+        # Cleaners saved before output_dtype existed produce float64
+        return np.dtype(getattr(self, 'output_dtype', None) or np.float64)
+    
+    def _cast_numerical(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Cast the numeric-typed numerical columns to the output dtype, leaving every other column untouched."""
+        dtype = self._output_dtype()
+        casts = {col: dtype for col in self.column_types.get('numerical', [])
+                 if col in df.columns and pd.api.types.is_numeric_dtype(df[col]) and df[col].dtype != dtype}
+        return df.astype(casts) if casts else df
+    
+    def _fit_feature_selection(self, X: Union[np.ndarray, sparse.spmatrix],
+                               feature_names: List[str]) -> Tuple[Union[np.ndarray, sparse.spmatrix], List[str]]:
+        """Fit the optional feature selection stage on encoded rows and return them selected, with their names."""
+        self.feature_selector = None
+        if (getattr(self, 'variance_threshold', None) is None and getattr(self, 'correlation_threshold', None) is None
+                and not getattr(self, 'svd_components', None)):
+            return X, feature_names
+        with self._stage('feature_selection', X.shape[0]):
+            self.feature_selector = FeatureSelector(self.variance_threshold, self.correlation_threshold,
+                                                    self.svd_components)
+            X = self.feature_selector.fit_transform(X, feature_names)
+        return X, self.feature_selector.feature_names_out
+    
+    def _fit_drift_reference(self, df: pd.DataFrame) -> None:
+        """Take the drift reference sketches of the pipeline's input columns, when drift monitoring is on."""
+        self.drift_monitor = None
+        if not getattr(self, 'monitor_drift', False):
+            return
+        with self._stage('drift_reference', len(df)):
+            self.drift_monitor = DriftMonitor().fit(df, self.column_types['numerical'],
+                                                    self.column_types['categorical'])
+    
+    def new_drift_batch(self) -> Optional[DriftBatch]:
+        """
+        Empty drift counts to pass to transform_chunks, or None if the cleaner has no drift reference.
+        
+        Counts from several batches (or worker processes) can be combined with
+        DriftBatch.merge; DriftBatch.report() returns the metrics.
+        """
+        monitor = getattr(self, 'drift_monitor', None)
+        return DriftBatch(monitor) if monitor is not None else None
+    
+    def _n_workers(self) -> int:
+        # Cleaners saved before parallel mode existed have no n_jobs attribute
+        n_jobs = getattr(self, 'n_jobs', None)
+        if n_jobs in (None, 0, 1):
+            return 1
+        # More workers than cores only adds dispatch overhead for this CPU-bound work
+        return min(joblib.effective_n_jobs(n_jobs), joblib.cpu_count())
+    
+    def _parallel(self):
+        """Context selecting the joblib backend used by the pipeline and datetime extraction."""
+        return joblib.parallel_config(backend=getattr(self, 'parallel_backend', 'loky'))
+    
+    def _column_shards(self, columns: List[str]) -> List[List[str]]:
+        """Split columns into contiguous shards, one per worker, keeping their order."""
+        n_shards = min(self._n_workers(), max(1, len(columns) // max(1, self.min_shard_columns)))
+        if n_shards <= 1:
+            return [list(columns)]
+        bounds = np.linspace(0, len(columns), n_shards + 1).astype(int)
+        return [list(columns[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+    
+    def _expand_datetime_columns(self, df: pd.DataFrame, columns: List[str]) -> List[Union[pd.DataFrame, Exception]]:
+        """
+        Extract datetime features of several columns, in parallel when more than one worker is configured.
         
-    def detect_column_types(self, df: pd.DataFrame) -> Dict[str, List[str]]:
+        Args:
+            df: Frame holding the datetime columns
+            columns: Datetime columns to expand
+            
+        Returns:
+            Per column, in the same order, the frame of derived features or the exception raised
+        """
+        dtype = self._output_dtype()
+        jobs = [(df[col], self.datetime_formats.get(col)) for col in columns]
+        if self._n_workers() > 1 and len(columns) > 1:
+            with self._parallel():
+                return joblib.Parallel(n_jobs=min(self._n_workers(), len(columns)))(
+                    joblib.delayed(_datetime_features)(series, fmt, dtype) for series, fmt in jobs)
+        return [_datetime_features(series, fmt, dtype) for series, fmt in jobs]
+    
+    def _apply_datetime_features(self, df: pd.DataFrame,
+                                 columns: List[str]) -> Tuple[pd.DataFrame, List[str], List[str]]:
+        """
+        Replace datetime columns by their derived features; shared by fitting and transforming.
+        
+        Args:
+            df: Frame holding the datetime columns
+            columns: Datetime columns to expand
+            
+        Returns:
+            Tuple of (frame with the expanded columns replaced by their features,
+            expanded columns, columns whose parsing failed and were left in place)
+        """
+        expanded, failed = [], []
+        for col, features in zip(columns, self._expand_datetime_columns(df, columns)):
+            if isinstance(features, Exception):
+                logger.warning(f"Failed to process datetime column '{col}': {features}")
+                failed.append(col)
+                continue
+            expanded.append((col, features))
+            column_logger.debug("Processed datetime column %r into features: %s", col, features.columns.tolist())
+        
+        if expanded:
+            df = pd.concat([df.drop(columns=[col for col, _ in expanded])]
+                           + [features for _, features in expanded], axis=1)
+        return df, [col for col, _ in expanded], failed
+        
+    def detect_column_types(self, df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
         """
         Detect and classify columns as numerical, categorical, datetime, or constant.
         
         Args:
             df: Input DataFrame
+            profile: Optional cached dataset profile (see dataset_cache.profile_dataframe).
+                Its distinct counts and datetime sniffing results are reused instead of
+                being recomputed; it must describe the same rows as df.
             
         Returns:
             Dictionary with column types as keys and column lists as values
@@ -49,38 +474,43 @@ class DataCleaner:
         }
         
         self.original_columns = df.columns.tolist()
+        self.datetime_formats = {}
+        self.detection_times = {}
+        
+        profiled = profile.get('nunique', {}) if profile else {}
+        sample_idx = self._sample_rows(len(df))
+        
+        # Constant columns: batched vectorized check, first on the row sample, then
+        # on full columns only for the candidates that did not vary in the sample
+        unprofiled = [col for col in df.columns if col not in profiled]
+        batch_start = time.perf_counter()
+        constant = set()
+        if unprofiled:
+            sample = df[unprofiled] if sample_idx is None else df.iloc[sample_idx][unprofiled]
+            candidates = [col for col, varies in zip(unprofiled, _varying_columns(sample)) if not varies]
+            if candidates and sample_idx is not None:
+                candidates = [col for col, varies in zip(candidates, _varying_columns(df[candidates])) if not varies]
+            constant.update(candidates)
+        batch_share = (time.perf_counter() - batch_start) / len(unprofiled) if unprofiled else 0.0
+        constant.update(col for col in df.columns if col in profiled and profiled[col] <= 1)
         
         for col in df.columns:
-            # Check if column is constant (all values are the same)
-            if df[col].nunique() <= 1:
-                column_types['constant'].append(col)
-                logger.debug(f"Column '{col}' identified as constant")
-                continue
-            
-            # Check for datetime columns
-            if df[col].dtype == 'datetime64[ns]' or pd.api.types.is_datetime64_any_dtype(df[col]):
-                column_types['datetime'].append(col)
-                logger.debug(f"Column '{col}' identified as datetime")
-                continue
-            
-            # Try to convert to datetime if it looks like a date
-            if df[col].dtype == 'object':
-                try:
-                    pd.to_datetime(df[col].dropna().head(100), errors='raise')
-                    column_types['datetime'].append(col)
-                    logger.debug(f"Column '{col}' identified as datetime (converted)")
-                    continue
-                except:
-                    pass
-            
-            # Check for numerical columns
-            if pd.api.types.is_numeric_dtype(df[col]):
-                column_types['numerical'].append(col)
-                logger.debug(f"Column '{col}' identified as numerical")
+            col_start = time.perf_counter()
+            if col in constant:
+                col_type = 'constant'
+            elif col in profiled and not pd.api.types.is_datetime64_any_dtype(df[col]):
+                # Reuse the datetime sniffing done when the dataset was profiled
+                if col in profile.get('datetime_columns', []):
+                    col_type = 'datetime'
+                    self.datetime_formats[col] = profile.get('datetime_formats', {}).get(col)
+                else:
+                    col_type = 'numerical' if pd.api.types.is_numeric_dtype(df[col]) else 'categorical'
             else:
-                # Everything else is categorical
-                column_types['categorical'].append(col)
-                logger.debug(f"Column '{col}' identified as categorical")
+                col_type = self._classify_column(df[col], sample_idx)
+            column_types[col_type].append(col)
+            self.detection_times[col] = time.perf_counter() - col_start + (batch_share if col not in profiled else 0.0)
+            if column_logger.isEnabledFor(logging.DEBUG):
+                column_logger.debug("Column %r identified as %s", col, col_type)
         
         self.column_types = column_types
         logger.info(f"Column type detection complete: {len(column_types['numerical'])} numerical, "
@@ -90,6 +520,55 @@ class DataCleaner:
         
         return column_types
     
+    def _sample_rows(self, n_rows: int) -> Optional[np.ndarray]:
+        """
+        Pick evenly spaced row positions for sampling-based type inference.
+        
+        Args:
+            n_rows: Number of rows in the DataFrame
+            
+        Returns:
+            Array of row positions, or None when all rows fit in the sample
+        """
+        if n_rows <= self.sample_size:
+            return None
+        return np.unique(np.linspace(0, n_rows - 1, self.sample_size).astype(np.int64))
+    
+    def _classify_column(self, series: pd.Series, sample_idx: Optional[np.ndarray] = None) -> str:
+        """
+        Classify a single non-constant column as numerical, categorical or datetime.
+        
+        Datetime sniffing runs on the sampled rows and records the inferred format
+        in self.datetime_formats so parsing the full column later is fast.
+        
+        Args:
+            series: Column values
+            sample_idx: Optional row positions to sniff datetimes on
+            
+        Returns:
+            One of 'numerical', 'categorical' or 'datetime'
+        """
+        # Check for datetime columns
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return 'datetime'
+        
+        # Try to convert to datetime if it looks like a date
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            sample = series if sample_idx is None else series.iloc[sample_idx]
+            if sample.isna().all():
+                sample = series
+            is_datetime, fmt = sniff_datetime_format(sample, self.sample_size, self.datetime_confidence)
+            if is_datetime:
+                self.datetime_formats[series.name] = fmt
+                return 'datetime'
+        
+        # Check for numerical columns
+        if pd.api.types.is_numeric_dtype(series):
+            return 'numerical'
+        
+        # Everything else is categorical
+        return 'categorical'
+    
     def drop_constant_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Drop constant columns from the DataFrame.
@@ -102,7 +581,8 @@ class DataCleaner:
         """
         constant_cols = self.column_types.get('constant', [])
         if constant_cols:
-            logger.info(f"Dropping {len(constant_cols)} constant columns: {constant_cols}")
+            logger.info(f"Dropping {len(constant_cols)} constant columns")
+            column_logger.debug("Constant columns: %s", constant_cols)
             df = df.drop(columns=constant_cols)
             self.dropped_columns.extend(constant_cols)
         
@@ -118,37 +598,20 @@ class DataCleaner:
         Returns:
             DataFrame with datetime columns processed
         """
-        datetime_cols = self.column_types.get('datetime', [])
+        df, expanded, failed = self._apply_datetime_features(df, list(self.column_types.get('datetime', [])))
         
-        for col in datetime_cols:
-            try:
-                # Convert to datetime if not already
-                if not pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-                
-                # Extract datetime features
-                df[f'{col}_year'] = df[col].dt.year
-                df[f'{col}_month'] = df[col].dt.month
-                df[f'{col}_day'] = df[col].dt.day
-                df[f'{col}_dayofweek'] = df[col].dt.dayofweek
-                
-                # Add new columns to numerical type
-                new_cols = [f'{col}_year', f'{col}_month', f'{col}_day', f'{col}_dayofweek']
-                self.column_types['numerical'].extend(new_cols)
-                
-                # Remove original datetime column
-                df = df.drop(columns=[col])
-                self.dropped_columns.append(col)
-                
-                logger.info(f"Processed datetime column '{col}' into features: {new_cols}")
-                
-            except Exception as e:
-                logger.warning(f"Failed to process datetime column '{col}': {e}")
-                # Treat as categorical if datetime processing fails
-                self.column_types['categorical'].append(col)
-                if col in self.column_types['datetime']:
-                    self.column_types['datetime'].remove(col)
+        # Treat as categorical if datetime processing fails
+        for col in failed:
+            self.column_types['categorical'].append(col)
+            self.column_types['datetime'].remove(col)
         
+        # Add new columns to numerical type, and remove the original datetime column
+        for col in expanded:
+            self.column_types['numerical'].extend(f'{col}_{part}' for part in DATETIME_PARTS)
+            self.dropped_columns.append(col)
+        
+        if expanded:
+            logger.info(f"Expanded {len(expanded)} datetime columns into {len(DATETIME_PARTS) * len(expanded)} features")
         return df
     
     def create_preprocessing_pipeline(self) -> ColumnTransformer:
@@ -158,34 +621,56 @@ class DataCleaner:
         Returns:
             ColumnTransformer with appropriate preprocessing steps
         """
+        # scikit-learn takes over a second to import, so the web app only loads it once a pipeline is built
+        from sklearn.compose import ColumnTransformer
+        from sklearn.impute import SimpleImputer
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+        
         logger.info("Creating preprocessing pipeline...")
         
         transformers = []
         
+        # In parallel mode each column type is split into shards ('numerical_0', ...); the
+        # ColumnTransformer concatenates their outputs in order, so the feature order is unchanged
+        
         # Numerical pipeline: impute with mean, then scale
         if self.column_types['numerical']:
-            numerical_pipeline = Pipeline([
-                ('imputer', SimpleImputer(strategy='mean')),
-                ('scaler', StandardScaler())
-            ])
-            transformers.append(('numerical', numerical_pipeline, self.column_types['numerical']))
-            logger.debug(f"Added numerical pipeline for columns: {self.column_types['numerical']}")
+            shards = self._column_shards(self.column_types['numerical'])
+            for i, columns in enumerate(shards):
+                numerical_pipeline = Pipeline([
+                    ('imputer', SimpleImputer(strategy='mean')),
+                    ('scaler', StandardScaler())
+                ])
+                name = 'numerical' if len(shards) == 1 else f'numerical_{i}'
+                transformers.append((name, numerical_pipeline, columns))
+            column_logger.debug("Added numerical pipeline (%d shards) for columns: %s", len(shards),
+                                self.column_types['numerical'])
         
         # Categorical pipeline: impute with most frequent, then one-hot encode
         if self.column_types['categorical']:
-            categorical_pipeline = Pipeline([
-                ('imputer', SimpleImputer(strategy='most_frequent')),
-                ('encoder', OneHotEncoder(drop='first', sparse_output=False, handle_unknown='ignore'))
-            ])
-            transformers.append(('categorical', categorical_pipeline, self.column_types['categorical']))
-            logger.debug(f"Added categorical pipeline for columns: {self.column_types['categorical']}")
+            shards = self._column_shards(self.column_types['categorical'])
+            for i, columns in enumerate(shards):
+                categorical_pipeline = Pipeline([
+                    ('imputer', SimpleImputer(strategy='most_frequent')),
+                    ('encoder', OneHotEncoder(drop='first', sparse_output=self.sparse_output is not False,
+                                              handle_unknown='ignore', max_categories=self.max_categories,
+                                              dtype=self._output_dtype()))
+                ])
+                name = 'categorical' if len(shards) == 1 else f'categorical_{i}'
+                transformers.append((name, categorical_pipeline, columns))
+            column_logger.debug("Added categorical pipeline (%d shards) for columns: %s", len(shards),
+                                self.column_types['categorical'])
         
         if not transformers:
             raise ValueError("No valid columns found for preprocessing")
         
+        sparse_threshold = {True: 1.0, False: 0.0}.get(self.sparse_output, 0.3)
         preprocessor = ColumnTransformer(
             transformers=transformers,
-            remainder='drop'
+            remainder='drop',
+            sparse_threshold=sparse_threshold,
+            n_jobs=self.n_jobs if len(transformers) > 1 and self._n_workers() > 1 else None
         )
         
         self.preprocessor = preprocessor
@@ -201,21 +686,31 @@ class DataCleaner:
         logger.info(f"New shape after dropping NaNs: {df.shape}")
         return df
     
-    def fit_transform(self, df: pd.DataFrame, return_nan_stats: bool = False) -> Tuple[np.ndarray, List[str], dict]:
+    def fit_transform(self, df: pd.DataFrame, return_nan_stats: bool = False,
+                      profile: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[str], dict]:
         """
         Fit the preprocessing pipeline and transform the data.
         
         Args:
             df: Input DataFrame
             return_nan_stats: If True, return NaN stats (for UI feedback)
+            profile: Optional cached dataset profile passed to detect_column_types.
+                Ignored when nan_strategy is 'delete', since dropping rows changes the stats.
         Returns:
             Tuple of (transformed_data, feature_names, nan_stats) if return_nan_stats else (transformed_data, feature_names)
         """
         logger.info("Starting fit_transform process...")
+        self.profiler = StageProfiler()
+        self._fast_path = None
         
-        # NaN stats before
-        total_nan = int(df.isna().sum().sum())
-        rows_with_nan = int(df.isna().any(axis=1).sum())
+        # NaN stats before, from the profile when it describes exactly these rows and columns
+        with self._stage('nan_stats', len(df)):
+            if profile and profile.get('rows') == len(df) and profile.get('column_names') == df.columns.tolist():
+                nan_before = {'total_nan': profile['total_nan'], 'rows_with_nan': profile['rows_with_nan']}
+            else:
+                nan_counter = ColumnStats(distinct=False, moments=False)
+                nan_counter.update(df)
+                nan_before = nan_counter.nan_stats()
         orig_rows = len(df)
         rows_dropped = 0
         
@@ -225,29 +720,43 @@ class DataCleaner:
         # else: impute (default) - do nothing, imputation handled in pipeline
         
         # Detect column types
-        self.detect_column_types(df)
+        with self._stage('detect', len(df)):
+            self.detect_column_types(df, profile=profile if self.nan_strategy != 'delete' else None)
         
         # Drop constant columns
-        df_processed = self.drop_constant_columns(df)
+        with self._stage('drop_constant', len(df)):
+            df_processed = self.drop_constant_columns(df)
         
         # Handle datetime columns
-        df_processed = self.handle_datetime_columns(df_processed)
+        with self._stage('datetime', len(df)):
+            df_processed = self.handle_datetime_columns(df_processed)
         
         # Update column types after datetime processing
         remaining_cols = df_processed.columns.tolist()
         for col_type in ['numerical', 'categorical']:
             self.column_types[col_type] = [col for col in self.column_types[col_type] 
                                          if col in remaining_cols]
+        df_processed = self._cast_numerical(self._coerce_categorical(df_processed))
+        self._fit_drift_reference(df_processed)
         
         # Create and fit the preprocessing pipeline
         preprocessor = self.create_preprocessing_pipeline()
         
-        # Fit and transform the data
-        X_transformed = preprocessor.fit_transform(df_processed)
+        # Fit and transform the data (imputation, scaling and encoding run in one pass)
+        with self._stage('impute_encode', len(df_processed)), self._parallel():
+            X_transformed = preprocessor.fit_transform(df_processed)
+        self.running_stats = self._running_stats_from_fit(df_processed)
+        del df_processed
+        X_transformed = X_transformed.astype(self._output_dtype(), copy=False)
         
-        # Get feature names
-        feature_names = self._get_feature_names()
+        # Get feature names, then drop or project features if selection is enabled
+        X_transformed, feature_names = self._fit_feature_selection(X_transformed, self._get_feature_names())
         self.feature_names_out = feature_names
+        if (sparse.issparse(X_transformed) and self.sparse_output == 'auto'
+                and X_transformed.shape[0] * X_transformed.shape[1] <= self.dense_cell_limit):
+            # Small enough to keep the dense layout; later transforms follow suit
+            X_transformed = X_transformed.toarray()
+            preprocessor.sparse_output_ = False
         
         # Create preprocessing summary
         self.preprocessing_summary = {
@@ -256,13 +765,18 @@ class DataCleaner:
             'numerical_features': len(self.column_types['numerical']),
             'categorical_features': len(self.column_types['categorical']),
             'features_dropped': len(self.dropped_columns),
-            'dropped_features': self.dropped_columns
+            'dropped_features': self.dropped_columns,
+            'detection_time_seconds': round(sum(self.detection_times.values()), 6),
+            'sparse_output': bool(sparse.issparse(X_transformed))
         }
+        if self.feature_selector is not None:
+            self.preprocessing_summary['feature_selection'] = self.feature_selector.summary()
+        if self.drift_monitor is not None:
+            self.preprocessing_summary['drift_reference'] = self.drift_monitor.summary()
         
         logger.info(f"Preprocessing complete. Shape: {X_transformed.shape}")
         nan_stats = {
-            'total_nan': total_nan,
-            'rows_with_nan': rows_with_nan,
+            **nan_before,
             'rows_dropped': rows_dropped,
             'nan_strategy': self.nan_strategy
         }
@@ -271,44 +785,602 @@ class DataCleaner:
         else:
             return X_transformed, feature_names
     
-    def transform(self, df: pd.DataFrame) -> np.ndarray:
+    def fit_stream(self, chunks: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+        """
+        Fit the preprocessing pipeline in a single pass over a chunk iterator.
+        
+        Column types are inferred from the first chunk. Constant columns, running
+        mean/variance for the scaler, value counts for the most-frequent imputer
+        and the one-hot vocabularies are accumulated across all chunks, so memory
+        is bounded by the chunk size rather than by the dataset size. The
+        accumulated statistics are kept in running_stats for partial_fit.
+        
+        Args:
+            chunks: Iterable of DataFrames, e.g. pd.read_csv(..., chunksize=...)
+            
+        Returns:
+            NaN stats dictionary, in the same format as fit_transform
+        """
+        logger.info("Starting streaming fit...")
+        self.profiler = StageProfiler()
+        self._fast_path = None
+        
+        nan_counter = ColumnStats(distinct=False, moments=False)
+        rows_dropped = 0
+        base_types = None
+        first_values = {}
+        varying = set()
+        stats = None
+        first_prepared = None
+        monitor = DriftMonitor() if getattr(self, 'monitor_drift', False) else None
+        
+        for chunk in self._timed_chunks(chunks, 'read', 'fit'):
+            _, nan_rows = nan_counter.update(chunk)
+            if self.nan_strategy == 'delete':
+                chunk = chunk[~nan_rows]
+                rows_dropped += int(nan_rows.sum())
+            if chunk.empty:
+                continue
+            
+            if base_types is None:
+                # Types come from the first chunk; constants are decided after the full pass
+                self.original_columns = chunk.columns.tolist()
+                base_types = {'numerical': [], 'categorical': [], 'datetime': [], 'constant': []}
+                self.datetime_formats = {}
+                sample_idx = self._sample_rows(len(chunk))
+                for col in chunk.columns:
+                    base_types[self._classify_column(chunk[col], sample_idx)].append(col)
+                self.column_types = {key: list(cols) for key, cols in base_types.items()}
+                self.dropped_columns = []
+            
+            chunk = self._coerce_categorical(self._coerce_numeric(chunk, base_types['numerical']))
+            
+            # Track which columns have more than one distinct non-null value
+            for col in chunk.columns:
+                if col in varying:
+                    continue
+                values = chunk[col].dropna()
+                if values.empty:
+                    continue
+                if col not in first_values:
+                    first_values[col] = values.iloc[0]
+                if (values != first_values[col]).any():
+                    varying.add(col)
+            
+            prepared = self._prepare_frame(chunk)
+            if first_prepared is None:
+                # Feature selection is fitted on the encoded first chunk
+                first_prepared = prepared
+            if stats is None:
+                categorical_cols = [col for col in prepared.columns if col in base_types['categorical']]
+                stats = self._new_running_stats([col for col in prepared.columns if col not in categorical_cols],
+                                                categorical_cols)
+            self._update_running_stats(stats, prepared)
+            if monitor is not None:
+                # Bin edges come from the first chunk, counts from every chunk
+                monitor.partial_fit(prepared, stats['numeric_cols'], stats['categorical_cols'])
+            self._report_progress('fit', stats['n_rows'])
+        
+        if base_types is None or stats is None or stats['n_rows'] == 0:
+            raise ValueError("No rows available for preprocessing")
+        
+        build_start = time.perf_counter()
+        # Finalise column types the same way fit_transform does
+        constant = [col for col in self.original_columns if col not in varying]
+        if column_logger.isEnabledFor(logging.DEBUG):
+            for col in constant:
+                column_logger.debug("Column %r identified as constant", col)
+        self.column_types = {
+            'numerical': [col for col in base_types['numerical'] if col not in constant],
+            'categorical': [col for col in base_types['categorical'] if col not in constant],
+            'datetime': [col for col in base_types['datetime'] if col not in constant],
+            'constant': constant
+        }
+        self.dropped_columns = list(constant) + list(self.column_types['datetime'])
+        derived = [f'{col}_{part}' for col in self.column_types['datetime']
+                   for part in DATETIME_PARTS]
+        self.column_types['numerical'].extend(derived)
+        
+        # Keep the statistics of the final columns, then build the pipeline from them
+        self.running_stats = self._select_running_stats(stats, self.column_types['numerical'],
+                                                        self.column_types['categorical'])
+        preprocessor = self._fit_from_running_stats()
+        if monitor is not None:
+            monitor.select(self.column_types['numerical'], self.column_types['categorical'])
+        self.drift_monitor = monitor
+        # Chunks are written densely, so only force CSR when explicitly requested
+        preprocessor.sparse_output_ = self.sparse_output is True
+        
+        self.feature_names_out = self._get_feature_names()
+        self.profiler.record('pipeline_build', time.perf_counter() - build_start)
+        if first_prepared is not None:
+            with self._parallel():
+                sample = preprocessor.transform(first_prepared).astype(self._output_dtype(), copy=False)
+            _, self.feature_names_out = self._fit_feature_selection(sample, self.feature_names_out)
+            del sample, first_prepared
+        self.preprocessing_summary = {
+            'total_features_before': len(self.original_columns),
+            'total_features_after': len(self.feature_names_out),
+            'numerical_features': len(self.column_types['numerical']),
+            'categorical_features': len(self.column_types['categorical']),
+            'features_dropped': len(self.dropped_columns),
+            'dropped_features': self.dropped_columns,
+            'sparse_output': bool(preprocessor.sparse_output_)
+        }
+        if self.feature_selector is not None:
+            self.preprocessing_summary['feature_selection'] = self.feature_selector.summary()
+        if self.drift_monitor is not None:
+            self.preprocessing_summary['drift_reference'] = self.drift_monitor.summary()
+        
+        logger.info(f"Streaming fit complete. Rows seen: {stats['n_rows']}, "
+                    f"features out: {len(self.feature_names_out)}")
+        return {
+            **nan_counter.nan_stats(),
+            'rows_dropped': rows_dropped,
+            'nan_strategy': self.nan_strategy
+        }
+    
+    def partial_fit(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                    new_categories: str = 'freeze') -> Dict[str, Any]:
+        """
+        Update a fitted cleaner with new rows only, continuing from its running statistics.
+        
+        Imputer means and modes, scaler moments and categorical value counts are
+        merged with those of the new rows, so the cost scales with the increment
+        rather than with every row seen so far. Column types and dropped columns
+        stay as the first fit decided them. An unfitted cleaner is fitted with
+        fit_stream instead.
+        
+        Args:
+            data: DataFrame or iterable of DataFrames with the fitted input columns
+            new_categories: Policy for categorical levels not seen before. 'freeze' keeps
+                the fitted vocabularies, so feature_names_out is unchanged and new levels
+                encode as all zeros; 'extend' adds them as new output columns (and
+                re-applies max_categories to the merged counts)
+                
+        Returns:
+            NaN stats of the new rows, in the same format as fit_stream
+        """
+        if new_categories not in ('freeze', 'extend'):
+            raise ValueError(f"new_categories must be 'freeze' or 'extend', got {new_categories!r}")
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        if self.preprocessor is None:
+            return self.fit_stream(chunks)
+        stats = getattr(self, 'running_stats', None)
+        if stats is None:
+            raise ValueError("This cleaner has no running statistics to update (it was saved before "
+                             "partial_fit existed, or its imputer dropped all-missing columns); fit it again")
+        
+        logger.info("Starting partial fit...")
+        self.profiler = StageProfiler()
+        self._fast_path = None
+        nan_counter = ColumnStats(distinct=False, moments=False)
+        rows_dropped = 0
+        rows_before = stats['n_rows']
+        
+        for chunk in self._timed_chunks(chunks, 'read', 'partial_fit'):
+            missing = [col for col in self.original_columns if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Batch is missing columns the cleaner was fitted on: {missing}")
+            chunk = chunk[self.original_columns]
+            _, nan_rows = nan_counter.update(chunk)
+            if self.nan_strategy == 'delete':
+                chunk = chunk[~nan_rows]
+                rows_dropped += int(nan_rows.sum())
+            if chunk.empty:
+                continue
+            chunk = self._coerce_numeric(chunk, self.column_types.get('numerical', []))
+            prepared = self._prepare_frame(chunk)
+            self._update_running_stats(stats, prepared)
+            if getattr(self, 'drift_monitor', None) is not None:
+                self.drift_monitor.update(prepared)
+            self._report_progress('partial_fit', stats['n_rows'] - rows_before)
+        
+        new_levels = 0
+        if new_categories == 'extend':
+            for name, pipeline, columns in self.preprocessor.transformers_:
+                if name.startswith('categorical'):
+                    for col, known in zip(columns, pipeline.named_steps['encoder'].categories_):
+                        new_levels += len(set(stats['value_counts'][col]).difference(known))
+        
+        selector = getattr(self, 'feature_selector', None)
+        if new_levels and selector is not None and selector.svd is not None:
+            raise ValueError("This cleaner projects its features onto SVD components fitted on the original "
+                             "categories; use new_categories='freeze' or fit it again")
+        with self._stage('pipeline_build', report=False):
+            if new_levels:
+                sparse_output = self.preprocessor.sparse_output_
+                self.preprocessor = self._fit_from_running_stats()
+                self.preprocessor.sparse_output_ = sparse_output
+                self.feature_names_out = self._get_feature_names()
+                if selector is not None:
+                    # Dropped features stay dropped; the new one-hot columns are kept
+                    selector.realign(self.feature_names_out)
+                    self.feature_names_out = selector.feature_names_out
+                    self.preprocessing_summary['feature_selection'] = selector.summary()
+            else:
+                self._load_running_stats(self.preprocessor)
+        self.preprocessing_summary['total_features_after'] = len(self.feature_names_out)
+        self.preprocessing_summary['rows_seen'] = stats['n_rows']
+        
+        logger.info(f"Partial fit complete. New rows: {stats['n_rows'] - rows_before}, "
+                    f"rows seen: {stats['n_rows']}, new categories: {new_levels}")
+        return {
+            **nan_counter.nan_stats(),
+            'rows_dropped': rows_dropped,
+            'nan_strategy': self.nan_strategy
+        }
+    
+    @staticmethod
+    def _new_running_stats(numeric_cols: List[str], categorical_cols: List[str]) -> Dict[str, Any]:
+        """Empty sufficient statistics for the given prepared columns."""
+        return {
+            'n_rows': 0,
+            'numeric_cols': list(numeric_cols),
+            'counts': np.zeros(len(numeric_cols)),
+            'means': np.zeros(len(numeric_cols)),
+            'm2': np.zeros(len(numeric_cols)),
+            'categorical_cols': list(categorical_cols),
+            'value_counts': {col: Counter() for col in categorical_cols}
+        }
+    
+    @staticmethod
+    def _update_running_stats(stats: Dict[str, Any], prepared: pd.DataFrame) -> None:
+        """
+        Merge a prepared chunk into running statistics.
+        
+        Numerical columns keep non-null counts, means and sums of squared
+        deviations (merged with the Chan et al. parallel update); categorical
+        columns keep value counts.
+        """
+        numeric_cols = stats['numeric_cols']
+        if numeric_cols:
+            values = prepared[numeric_cols].to_numpy(dtype=np.float64)
+            mask = ~np.isnan(values)
+            batch_counts = mask.sum(axis=0)
+            batch_sums = np.where(mask, values, 0.0).sum(axis=0)
+            batch_means = np.divide(batch_sums, batch_counts, out=np.zeros_like(batch_sums),
+                                    where=batch_counts > 0)
+            batch_m2 = np.where(mask, (values - batch_means) ** 2, 0.0).sum(axis=0)
+            counts, means = stats['counts'], stats['means']
+            new_counts = counts + batch_counts
+            delta = batch_means - means
+            safe_counts = np.where(new_counts > 0, new_counts, 1)
+            stats['means'] = means + delta * batch_counts / safe_counts
+            stats['m2'] = stats['m2'] + batch_m2 + delta ** 2 * counts * batch_counts / safe_counts
+            stats['counts'] = new_counts
+        
+        for col in stats['categorical_cols']:
+            # Categorical dtypes also report unused categories, with a count of zero
+            level_counts = prepared[col].value_counts()
+            stats['value_counts'][col].update(level_counts[level_counts > 0].to_dict())
+        stats['n_rows'] += len(prepared)
+    
+    @staticmethod
+    def _select_running_stats(stats: Dict[str, Any], numeric_cols: List[str],
+                              categorical_cols: List[str]) -> Dict[str, Any]:
+        """Restrict running statistics to the given columns, in their order."""
+        position = {col: i for i, col in enumerate(stats['numeric_cols'])}
+        index = [position[col] for col in numeric_cols]
+        return {
+            'n_rows': stats['n_rows'],
+            'numeric_cols': list(numeric_cols),
+            'counts': stats['counts'][index],
+            'means': stats['means'][index],
+            'm2': stats['m2'][index],
+            'categorical_cols': list(categorical_cols),
+            'value_counts': {col: stats['value_counts'][col] for col in categorical_cols}
+        }
+    
+    def _running_stats_from_fit(self, df_processed: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """
+        Derive running statistics from a pipeline just fitted in memory, so partial_fit can follow fit_transform.
+        
+        The scalers already hold the means and the variances over all rows (mean
+        imputation spreads M2 over every row); only the non-null counts and the
+        categorical value counts are taken from the frame.
+        
+        Returns:
+            Running statistics, or None when the imputer dropped all-missing columns
+        """
+        numerical = self.column_types['numerical']
+        categorical = self.column_types['categorical']
+        stats = self._new_running_stats(numerical, categorical)
+        position = {col: i for i, col in enumerate(numerical)}
+        variances = np.zeros(len(numerical))
+        for name, pipeline, columns in self.preprocessor.transformers_:
+            if name.startswith('numerical'):
+                scaler = pipeline.named_steps['scaler']
+                if len(scaler.mean_) != len(columns):
+                    return None
+                index = [position[col] for col in columns]
+                stats['means'][index] = scaler.mean_
+                variances[index] = scaler.var_
+        
+        n_rows = len(df_processed)
+        stats['n_rows'] = n_rows
+        stats['m2'] = variances * n_rows
+        if numerical:
+            stats['counts'] = df_processed[numerical].notna().sum().to_numpy(dtype=np.float64)
+        for col in categorical:
+            level_counts = df_processed[col].value_counts()
+            stats['value_counts'][col].update(level_counts[level_counts > 0].to_dict())
+        return stats
+    
+    def _running_mode(self, col: str, allowed: Optional[Iterable[Any]] = None) -> Any:
+        """Most frequent level of a categorical column (ties broken by value), optionally among allowed levels."""
+        counts = self.running_stats['value_counts'][col]
+        items = counts.items()
+        if allowed is not None:
+            allowed = set(allowed)
+            items = [(value, count) for value, count in items if value in allowed] or list(counts.items())
+        return min(items, key=lambda item: (-item[1], _level_key(item[0])))[0]
+    
+    def _fit_from_running_stats(self) -> ColumnTransformer:
+        """
+        Build the pipeline from self.running_stats, without revisiting any rows.
+        
+        The encoders are fitted on a small seed frame holding every level, so
+        vocabularies and max_categories bucketing match a fit on all rows; the
+        imputer and scaler statistics are then loaded from the running moments.
+        
+        Returns:
+            The fitted ColumnTransformer, also stored as self.preprocessor
+        """
+        stats = self.running_stats
+        value_counts = stats['value_counts']
+        categorical = self.column_types['categorical']
+        vocabularies = {col: sorted(value_counts[col], key=_level_key) for col in categorical}
+        modes = {col: self._running_mode(col) for col in categorical}
+        
+        preprocessor = self.create_preprocessing_pipeline()
+        for name, pipeline, columns in preprocessor.transformers:
+            if name.startswith('categorical'):
+                pipeline.named_steps['encoder'].set_params(
+                    categories=[np.array(vocabularies[col], dtype=object) for col in columns])
+        
+        # Seed frame: every category once, plus the ones kept under max_categories a second
+        # time, so the encoder buckets the same infrequent levels a full fit would
+        seed_values = {}
+        for col in categorical:
+            vocab = vocabularies[col]
+            keep = vocab
+            if self.max_categories and len(vocab) > self.max_categories:
+                # Same tie-breaking as OneHotEncoder: stable ascending sort by count, keep the tail
+                by_count = sorted(vocab, key=lambda value: value_counts[col][value])
+                keep = by_count[len(vocab) - self.max_categories + 1:]
+            seed_values[col] = list(vocab) + list(keep)
+        n_seed = max([2] + [len(values) for values in seed_values.values()])
+        seed = {col: np.full(n_seed, mean) for col, mean in zip(stats['numeric_cols'], stats['means'])}
+        for col, values in seed_values.items():
+            seed[col] = np.array(values + [modes[col]] * (n_seed - len(values)), dtype=object)
+        with self._parallel():
+            preprocessor.fit(pd.DataFrame(seed, columns=self.column_types['numerical'] + categorical))
+        
+        self._load_running_stats(preprocessor)
+        return preprocessor
+    
+    def _load_running_stats(self, preprocessor: ColumnTransformer) -> None:
+        """Set the imputer and scaler statistics of a fitted pipeline from self.running_stats."""
+        stats = self.running_stats
+        n_rows = stats['n_rows']
+        # Mean imputation leaves the mean unchanged and spreads M2 over every row
+        variances = stats['m2'] / n_rows
+        numerical_index = {col: i for i, col in enumerate(stats['numeric_cols'])}
+        for name, pipeline, columns in preprocessor.transformers_:
+            if name.startswith('numerical'):
+                shard = [numerical_index[col] for col in columns]
+                scale = np.sqrt(variances[shard])
+                scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+                pipeline.named_steps['imputer'].statistics_ = stats['means'][shard]
+                scaler = pipeline.named_steps['scaler']
+                scaler.mean_ = stats['means'][shard]
+                scaler.var_ = variances[shard]
+                scaler.scale_ = scale
+                scaler.n_samples_seen_ = n_rows
+            elif name.startswith('categorical'):
+                # Under a frozen vocabulary the mode must be a level the encoder knows
+                encoder = pipeline.named_steps['encoder']
+                pipeline.named_steps['imputer'].statistics_ = np.array(
+                    [self._running_mode(col, known) for col, known in zip(columns, encoder.categories_)],
+                    dtype=object)
+    
+    def transform_chunks(self, chunks: Iterable[pd.DataFrame],
+                         prepend_columns: Sequence[str] = (),
+                         append_columns: Sequence[str] = (),
+                         drift: Optional[DriftBatch] = None) -> Iterator[pd.DataFrame]:
+        """
+        Transform a chunk iterator with the fitted pipeline, yielding output frames.
+        
+        Only the columns seen at fit time are transformed; any other columns in the
+        chunks are ignored unless listed as passthrough columns.
+        
+        Args:
+            chunks: Iterable of DataFrames with the columns seen at fit time
+            prepend_columns: Columns copied as-is before the transformed features
+            append_columns: Columns copied as-is after the transformed features
+            drift: Counts from new_drift_batch(), updated with every chunk in the same pass
+            
+        Yields:
+            One transformed DataFrame per non-empty chunk
+        """
+        if self.preprocessor is None:
+            raise ValueError("Preprocessor has not been fitted. Call fit_transform or fit_stream first.")
+        
+        for chunk in self._timed_chunks(chunks, 'read'):
+            if chunk.empty:
+                continue
+            features = self._coerce_numeric(chunk[self.original_columns],
+                                            self.column_types.get('numerical', []))
+            X = self._transform(features, drift)
+            # Wrap the transformed block without copying it; passthrough columns are added as separate blocks
+            out = pd.DataFrame(X.toarray() if sparse.issparse(X) else X, columns=self.feature_names_out, copy=False)
+            for col in reversed(list(prepend_columns)):
+                out.insert(0, col, chunk[col].values)
+            for col in append_columns:
+                out[col] = chunk[col].values
+            yield out
+    
+    def transform_stream(self, chunks: Iterable[pd.DataFrame], output_path: str,
+                         prepend_columns: Sequence[str] = (),
+                         append_columns: Sequence[str] = ()) -> int:
+        """
+        Transform a chunk iterator with the fitted pipeline and write the result to CSV.
+        
+        Args:
+            chunks: Iterable of DataFrames with the columns seen at fit time
+            output_path: Destination CSV path, overwritten if it exists
+            prepend_columns: Columns copied as-is before the transformed features
+            append_columns: Columns copied as-is after the transformed features
+            
+        Returns:
+            Number of rows written
+        """
+        rows_written = 0
+        write_header = True
+        # Written under a temporary name and renamed when complete, so readers never see a partial file
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        
+        try:
+            for out in self.transform_chunks(chunks, prepend_columns, append_columns):
+                out.to_csv(tmp_path, mode='w' if write_header else 'a', header=write_header, index=False)
+                write_header = False
+                rows_written += len(out)
+                self._report_progress('transform', rows_written)
+            
+            if write_header:
+                pd.DataFrame(columns=list(prepend_columns) + list(self.feature_names_out) + list(append_columns)) \
+                    .to_csv(tmp_path, index=False)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        logger.info(f"Streaming transform complete. Rows written: {rows_written}")
+        return rows_written
+    
+    def _coerce_numeric(self, df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """
+        Coerce columns typed as numerical to numbers in chunks where pandas inferred otherwise.
+        
+        Args:
+            df: Input chunk
+            columns: Columns that should be numeric
+            
+        Returns:
+            DataFrame with those columns converted (unparseable values become NaN)
+        """
+        bad = [col for col in columns if col in df.columns and not pd.api.types.is_numeric_dtype(df[col])]
+        if bad:
+            df = df.copy()
+            for col in bad:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
+    
+    def _coerce_categorical(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Cast the categorical columns to strings where pandas inferred another dtype.
+        
+        Each chunk (or byte range) of a CSV infers its own dtypes, so a level such
+        as '1' can arrive as the integer 1; casting keeps the levels comparable with
+        the ones seen at fit time. Missing values stay missing.
+        
+        Args:
+            df: Input chunk
+            
+        Returns:
+            DataFrame with the categorical columns holding strings
+        """
+        bad = [col for col in self.column_types.get('categorical', [])
+               if col in df.columns and not _holds_strings(df[col])]
+        if bad:
+            df = df.copy()
+            for col in bad:
+                df[col] = df[col].astype(str).where(df[col].notna())
+        return df
+    
+    def transform(self, df: pd.DataFrame, return_drift: bool = False) -> Union[np.ndarray, sparse.csr_matrix, tuple]:
         """
         Transform new data using the fitted preprocessor.
         
         Args:
             df: Input DataFrame
+            return_drift: If True, also return drift metrics of the batch against the fitted
+                data (see DriftBatch.report), None when the cleaner has no drift reference
             
         Returns:
-            Transformed data array
+            Transformed data array (CSR matrix if the fit produced sparse output), or a tuple
+            of (transformed_data, drift_report) if return_drift
         """
+        drift = self.new_drift_batch() if return_drift else None
+        X_transformed = self._transform(df, drift)
+        if return_drift:
+            return X_transformed, drift.report() if drift is not None else None
+        return X_transformed
+    
+    def _transform(self, df: pd.DataFrame, drift: Optional[DriftBatch] = None) -> Union[np.ndarray, sparse.csr_matrix]:
+        """Transform new data, counting it into drift (when given) from the same prepared frame."""
         if self.preprocessor is None:
             raise ValueError("Preprocessor has not been fitted. Call fit_transform first.")
         
         logger.info("Transforming new data...")
         
         # Apply the same preprocessing steps as during fitting
-        df_processed = df.drop(columns=[col for col in self.dropped_columns if col in df.columns])
-        
-        # Handle datetime columns the same way
-        for col in self.column_types.get('datetime', []):
-            if col in df_processed.columns:
-                try:
-                    if not pd.api.types.is_datetime64_any_dtype(df_processed[col]):
-                        df_processed[col] = pd.to_datetime(df_processed[col], errors='coerce')
-                    
-                    df_processed[f'{col}_year'] = df_processed[col].dt.year
-                    df_processed[f'{col}_month'] = df_processed[col].dt.month
-                    df_processed[f'{col}_day'] = df_processed[col].dt.day
-                    df_processed[f'{col}_dayofweek'] = df_processed[col].dt.dayofweek
-                    
-                    df_processed = df_processed.drop(columns=[col])
-                except Exception as e:
-                    logger.warning(f"Failed to process datetime column '{col}' during transform: {e}")
-        
-        X_transformed = self.preprocessor.transform(df_processed)
+        df_processed = self._prepare_frame(df)
+        if drift is not None:
+            with self._stage('drift', len(df), report=False):
+                drift.monitor.observe(df_processed, drift)
+        
+        with self._stage('transform', len(df), report=False), self._parallel():
+            X_transformed = self.preprocessor.transform(df_processed)
+            if getattr(self, 'feature_selector', None) is not None:
+                X_transformed = self.feature_selector.transform(X_transformed)
+        X_transformed = X_transformed.astype(self._output_dtype(), copy=False)
         logger.info(f"Transform complete. Shape: {X_transformed.shape}")
         return X_transformed
     
+    def transform_records(self, records: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """
+        Transform dict records (single rows or micro-batches) with the compiled fast path.
+        
+        The fitted statistics and encodings are compiled into a FastTransformer on
+        first use, which skips the pandas and ColumnTransformer overhead of
+        transform. This overhead dominates for a handful of rows. Output matches transform, always dense.
+        
+        Args:
+            records: Mappings from input column to raw value (None for missing)
+            
+        Returns:
+            Array of shape (len(records), len(feature_names_out))
+        """
+        fast_path = getattr(self, '_fast_path', None)
+        if fast_path is None:
+            if self.preprocessor is None:
+                raise ValueError("Preprocessor has not been fitted. Call fit_transform first.")
+            fast_path = self._fast_path = FastTransformer(self)
+        return fast_path.transform_records(records)
+    
+    def _prepare_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drop fitted-out columns, expand datetime columns, cast categorical columns
+        to strings and numerical columns to the output dtype ahead of the pipeline.
+        
+        This is stateless with respect to the fitted column types, so it can be
+        applied to any batch or chunk of new data.
+        
+        Args:
+            df: Input DataFrame
+            
+        Returns:
+            DataFrame ready for the fitted ColumnTransformer
+        """
+        df_processed = df.drop(columns=[col for col in self.dropped_columns
+                                        if col in df.columns and col not in self.column_types.get('datetime', [])])
+        
+        datetime_cols = [col for col in self.column_types.get('datetime', []) if col in df_processed.columns]
+        df_processed, _, _ = self._apply_datetime_features(df_processed, datetime_cols)
+        return self._cast_numerical(self._coerce_categorical(df_processed))
+    
     def _get_feature_names(self) -> List[str]:
         """
         Get feature names after preprocessing.
@@ -325,16 +1397,14 @@ class DataCleaner:
         # Add categorical feature names
         if self.column_types['categorical']:
             try:
-                # Get the categorical transformer
-                cat_transformer = None
-                for name, transformer, _ in self.preprocessor.transformers_:
-                    if name == 'categorical':
-                        cat_transformer = transformer
-                        break
+                # Get the categorical transformers (several shards in parallel mode), in output order
+                cat_features = []
+                for name, transformer, columns in self.preprocessor.transformers_:
+                    if name.startswith('categorical'):
+                        encoder = transformer.named_steps['encoder']
+                        cat_features.extend(encoder.get_feature_names_out(columns))
                 
-                if cat_transformer is not None:
-                    encoder = cat_transformer.named_steps['encoder']
-                    cat_features = encoder.get_feature_names_out(self.column_types['categorical'])
+                if cat_features:
                     feature_names.extend(cat_features)
                 else:
                     # Fallback if transformer not found
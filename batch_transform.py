@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Sequence, Tuple
+
+from lazy_imports import lazy_module
+
+from ingest import record_ends, PARSE_BLOCK_SIZE, QUOTE
+from output_formats import OutputWriter, shard_paths, OUTPUT_FORMATS
+from instrumentation import metrics
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+joblib = lazy_module('joblib')
+
+logger = logging.getLogger(__name__)
+
+metrics.describe('batch_transform_rows_total', 'Rows transformed by the parallel batch engine')
+
+# Bytes of input CSV per task: small enough to balance the workers and bound their memory,
+# large enough that the per-task overhead (a read_csv call, one output shard) is negligible
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+# Buffer for concatenating output shards
+COPY_BUFFER_SIZE = 16 * 1024 * 1024
+
+# The fitted cleaner of a worker process: set before the pool forks (inherited copy-on-write,
+# never pickled) or by the initializer of spawned workers (unpickled once per worker)
+_worker_cleaner = None
+
+
+def _init_worker(cleaner, log_level: int) -> None:
+    global _worker_cleaner
+    logging.basicConfig(level=log_level)
+    if cleaner is not None:
+        _worker_cleaner = cleaner
+    # The pool already uses every core; a cleaner fitted in parallel mode must not nest its own workers
+    _worker_cleaner.n_jobs = None
+
+
+def split_csv(path: str, n_chunks: int, quoted_newlines: bool = True) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Split a CSV file into byte ranges of whole records, for parsing in parallel.
+
+    Split points are spread evenly over the data and moved forward to the
+    next record end. With quoted_newlines, a newline inside a quoted field is
+    not a record end: the file is scanned once, counting quote characters
+    (a fast bytes.count per block) so the quote parity is known where each
+    split point falls. Without it, each split point is found by seeking and
+    reading to the next newline, which is exact only for files without
+    newlines in quoted fields but reads just a few blocks.
+
+    Args:
+        path: Uncompressed CSV file with a header row
+        n_chunks: Number of ranges wanted (fewer for small files)
+        quoted_newlines: Whether fields may contain quoted newlines
+
+    Returns:
+        Tuple of (length of the header record in bytes, list of (start, end) byte ranges in file order)
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = b''
+        header_end = 0
+        while not header_end:
+            block = f.read(PARSE_BLOCK_SIZE)
+            if not block:
+                header_end = len(header)
+                break
+            header += block
+            ends = record_ends(header)
+            if len(ends):
+                header_end = int(ends[0])
+        data_size = size - header_end
+        n_chunks = max(min(n_chunks, data_size // 1024 or 1), 1)
+        targets = [header_end + data_size * i // n_chunks for i in range(1, n_chunks)]
+        bounds = [header_end]
+
+        if quoted_newlines:
+            f.seek(0)
+            offset = 0
+            quotes = 0
+            pending = list(reversed(targets))
+            while pending:
+                block = f.read(PARSE_BLOCK_SIZE)
+                if not block:
+                    break
+                block_end = offset + len(block)
+                if pending[-1] < block_end:
+                    # Prefixing a quote flips the parity when the block starts inside a quoted field
+                    ends = record_ends(b'"' + block) - 1 if quotes & 1 else record_ends(block)
+                    ends = ends + offset
+                    while pending and pending[-1] < block_end:
+                        i = int(np.searchsorted(ends, pending[-1]))
+                        if i == len(ends):
+                            # No record ends in the rest of the block: look in the next one
+                            pending[-1] = block_end
+                            break
+                        if ends[i] > bounds[-1]:
+                            bounds.append(int(ends[i]))
+                        pending.pop()
+                quotes += block.count(QUOTE)
+                offset = block_end
+        else:
+            for target in targets:
+                if target < bounds[-1]:
+                    continue
+                f.seek(target)
+                skipped = 0
+                while True:
+                    block = f.read(PARSE_BLOCK_SIZE)
+                    if not block:
+                        break
+                    newline = block.find(b'\n')
+                    if newline >= 0:
+                        bounds.append(target + skipped + newline + 1)
+                        break
+                    skipped += len(block)
+
+    bounds = [bound for bound in bounds if bound < size] + [size]
+    ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    # A file with only a header still gets one (empty) range, so its output has the column layout
+    return header_end, ranges or [(header_end, size)]
+
+
+def _transform_range(src_path: str, header_end: int, start: int, end: int, dst_path: str, fmt: str,
+                     chunksize: int, prepend_columns: Sequence[str], append_columns: Sequence[str],
+                     read_options: Dict[str, Any], drift: bool) -> Dict[str, Any]:
+    """Parse one byte range of the input (with the header row) and write its transformed rows as one shard."""
+    started = time.perf_counter()
+    cleaner = _worker_cleaner
+    with open(src_path, 'rb') as f:
+        header = f.read(header_end)
+        f.seek(start)
+        data = f.read(end - start)
+    chunks = pd.read_csv(io.BytesIO(header + data), chunksize=chunksize, **read_options)
+    del data
+    drift_batch = cleaner.new_drift_batch() if drift else None
+    with OutputWriter(dst_path, fmt, cleaner.feature_names_out, dtype=cleaner._output_dtype()) as writer:
+        for out in cleaner.transform_chunks(chunks, prepend_columns, append_columns, drift=drift_batch):
+            writer.write(out)
+    return {'path': dst_path, 'rows': writer.rows, 'header_bytes': writer.header_bytes, 'bytes': end - start,
+            'seconds': time.perf_counter() - started, 'drift': drift_batch}
+
+
+def _concatenate_csv(paths: Sequence[str], header_bytes: Sequence[int], dst_path: str) -> None:
+    """
+    Join CSV shards in order into one file, keeping only the first shard's header row.
+
+    The other headers are skipped by their written length rather than read
+    as a line, since quoted column names may contain newlines.
+    """
+    tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out:
+            for i, (path, skip) in enumerate(zip(paths, header_bytes)):
+                with open(path, 'rb') as f:
+                    if i > 0:
+                        f.seek(skip)
+                    shutil.copyfileobj(f, out, COPY_BUFFER_SIZE)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    for path in paths:
+        os.remove(path)
+
+
+def default_start_method() -> str:
+    """
+    'fork' when it is available and safe (this process runs a single thread), otherwise 'spawn'.
+
+    Forked workers inherit the fitted cleaner without pickling; forking a
+    multi-threaded process (e.g. a web server with a background janitor) can
+    copy locks held by other threads, so those spawn their workers instead.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods() and threading.active_count() == 1:
+        return 'fork'
+    return 'spawn'
+
+
+def transform_file(cleaner, src_path: str, dst_path: str, fmt: str = 'csv', concatenate: bool = True,
+                   n_jobs: Optional[int] = -1, chunk_bytes: int = DEFAULT_CHUNK_BYTES, chunksize: int = 100000,
+                   prepend_columns: Sequence[str] = (), append_columns: Sequence[str] = (),
+                   quoted_newlines: bool = True, start_method: Optional[str] = None,
+                   read_options: Optional[Dict[str, Any]] = None, drift: bool = True,
+                   progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+    """
+    Transform a CSV file with a fitted cleaner on every core, one byte range per task.
+
+    The input is split into ranges of whole records (see split_csv) and each
+    task parses its own range, so neither the input nor the output passes
+    through this process. The cleaner is shipped to each worker once: forked
+    workers inherit it, spawned ones unpickle it in their initializer; tasks
+    carry only file offsets. Every range is written as one output shard and
+    the shards are concatenated in order (CSV), or returned as files of
+    consecutive rows.
+
+    Args:
+        cleaner: Fitted DataCleaner
+        src_path: Input CSV with the columns the cleaner was fitted on
+        dst_path: Output file; shards are named after it ('out.part-001-of-016.csv')
+        fmt: Output format (see output_formats.OUTPUT_FORMATS, except 'npz')
+        concatenate: Join the shards into dst_path (CSV only) instead of returning them
+        n_jobs: Worker processes (-1 for all cores)
+        chunk_bytes: Approximate input bytes per task
+        chunksize: Rows per transform call within a task
+        prepend_columns: Columns copied as-is before the transformed features
+        append_columns: Columns copied as-is after the transformed features
+        quoted_newlines: Whether fields may contain quoted newlines (see split_csv)
+        start_method: multiprocessing start method (default: default_start_method())
+        read_options: Extra pd.read_csv keyword arguments; a dtype mapping is merged over
+            cleaner.input_dtypes()
+        drift: Count every chunk against the cleaner's drift reference (merged across workers)
+        progress: Optional callback(stage, rows_processed)
+
+    Returns:
+        Dictionary with 'rows', 'chunks', 'workers', 'seconds', 'paths' (the output files, in
+        row order), 'shards' (rows, input bytes and seconds of each task) and 'drift' (the
+        DriftBatch.report() of the whole file, None without a drift reference)
+
+    Raises:
+        ValueError: the cleaner is not fitted, or concatenation was requested for a binary format
+    """
+    if cleaner.preprocessor is None:
+        raise ValueError("Preprocessor has not been fitted. Call fit_transform or fit_stream first.")
+    if fmt not in OUTPUT_FORMATS or fmt == 'npz':
+        raise ValueError(f"Unsupported output format: {fmt!r}")
+    if concatenate and fmt != 'csv':
+        raise ValueError(f"Only CSV shards can be concatenated; write '{fmt}' output as shards")
+    started = time.perf_counter()
+    progress = progress or (lambda stage, rows=0: None)
+    read_options = dict(read_options or {})
+    # Each byte range infers its own dtypes; pin the columns the cleaner fitted as strings
+    dtype = read_options.get('dtype')
+    if dtype is None or isinstance(dtype, dict):
+        read_options['dtype'] = {**cleaner.input_dtypes(), **(dtype or {})}
+
+    n_workers = joblib.effective_n_jobs(n_jobs)
+    size = os.path.getsize(src_path)
+    progress('splitting', 0)
+    header_end, ranges = split_csv(src_path, max(n_workers, -(-size // chunk_bytes)), quoted_newlines)
+    n_workers = min(n_workers, len(ranges))
+    paths = shard_paths(dst_path, fmt, len(ranges))
+    tasks = [(src_path, header_end, start, end, path, fmt, chunksize, tuple(prepend_columns),
+              tuple(append_columns), read_options, drift) for (start, end), path in zip(ranges, paths)]
+    logger.info(f"Transforming {src_path} ({size} bytes) in {len(ranges)} chunks on {n_workers} workers")
+
+    global _worker_cleaner
+    shards = []
+    rows = 0
+    try:
+        if n_workers <= 1:
+            _worker_cleaner = cleaner
+            try:
+                for task in tasks:
+                    shards.append(_transform_range(*task))
+                    rows += shards[-1]['rows']
+                    progress('transforming', rows)
+            finally:
+                _worker_cleaner = None
+        else:
+            start_method = start_method or default_start_method()
+            if start_method == 'fork':
+                # Inherited by the forked workers; nothing is pickled but the task offsets
+                _worker_cleaner, initargs = cleaner, (None, logging.getLogger().level)
+            else:
+                initargs = (cleaner, logging.getLogger().level)
+            try:
+                with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context(start_method),
+                                         initializer=_init_worker, initargs=initargs) as executor:
+                    for shard in executor.map(_transform_range, *zip(*tasks)):
+                        shards.append(shard)
+                        rows += shard['rows']
+                        progress('transforming', rows)
+            finally:
+                _worker_cleaner = None
+    except BaseException:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    drift_batch = None
+    for shard in shards:
+        if shard['drift'] is None:
+            continue
+        if drift_batch is None:
+            drift_batch = shard['drift']
+        else:
+            drift_batch.merge(shard['drift'])
+
+    if concatenate:
+        progress('concatenating', rows)
+        _concatenate_csv(paths, [shard['header_bytes'] for shard in shards], dst_path)
+        paths = [dst_path]
+    seconds = time.perf_counter() - started
+    metrics.inc('batch_transform_rows_total', rows)
+    logger.info(f"Transformed {rows} rows of {src_path} in {seconds:.2f}s "
+                f"({size / max(seconds, 1e-9) / 1e6:.1f} MB/s)")
+    return {'rows': rows, 'chunks': len(ranges), 'workers': n_workers, 'seconds': seconds, 'paths': paths,
+            'shards': [{key: shard[key] for key in ('rows', 'bytes', 'seconds')} for shard in shards],
+            'drift': drift_batch.report() if drift_batch is not None else None}
@@ -0,0 +1,74 @@
+"""
+Scaling benchmark for batch_transform.transform_file.
+
+Fits a cleaner on a sample of a synthetic dataset, writes a larger scoring
+CSV and transforms it with increasing worker counts, reporting wall time,
+input throughput and speedup over one worker, e.g.:
+
+    python -m benchmarks.bench_batch_transform --rows 5000000 --jobs 1 2 4 8 16
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+
+from automl_engine import DataCleaner
+from batch_transform import transform_file
+from benchmarks.datasets import generate_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows of the scoring file')
+    parser.add_argument('--fit-rows', type=int, default=50000)
+    parser.add_argument('--numerical', type=int, default=20)
+    parser.add_argument('--categorical', type=int, default=5)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-mb', type=int, default=64, help='Input megabytes per task')
+    parser.add_argument('--start-method', choices=['fork', 'spawn', 'forkserver'])
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    workdir = tempfile.mkdtemp(prefix='automl-batch-')
+    try:
+        src_path = os.path.join(workdir, 'batch.csv')
+        frame = generate_frame(args.fit_rows, args.numerical, args.categorical, cardinality=20)
+        cleaner = DataCleaner()
+        cleaner.fit_transform(frame.drop(columns=['id', 'target']))
+        # The scoring file is written in slices with fresh ids, so generation stays within memory
+        step = 500000
+        for start in range(0, args.rows, step):
+            part = generate_frame(min(step, args.rows - start), args.numerical, args.categorical, cardinality=20,
+                                  seed=start, id_offset=start)
+            part.to_csv(src_path, mode='a', header=start == 0, index=False)
+        size = os.path.getsize(src_path)
+        print(f"Scoring file: {args.rows} rows, {size / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+
+        results = []
+        baseline = None
+        for n_jobs in args.jobs:
+            start = time.perf_counter()
+            result = transform_file(cleaner, src_path, os.path.join(workdir, 'out.csv'), n_jobs=n_jobs,
+                                    chunk_bytes=args.chunk_mb * 1024 * 1024, prepend_columns=['id'],
+                                    append_columns=['target'], start_method=args.start_method)
+            seconds = time.perf_counter() - start
+            baseline = baseline or seconds
+            results.append({'n_jobs': n_jobs, 'workers': result['workers'], 'chunks': result['chunks'],
+                            'seconds': round(seconds, 4), 'mb_per_second': round(size / seconds / 1e6, 2),
+                            'speedup': round(baseline / seconds, 2)})
+            print(f"n_jobs={n_jobs:<3} chunks={result['chunks']:<4} {seconds:.3f}s  "
+                  f"{size / seconds / 1e6:.1f} MB/s  speedup={baseline / seconds:.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'bytes': size, 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Scaling benchmark for DataCleaner's parallel mode.
+
+Fits and transforms a synthetic wide dataset with increasing n_jobs and
+reports wall time and speedup over the serial run, e.g.:
+
+    python -m benchmarks.bench_parallel --rows 200000 --numerical 400 --categorical 100 --jobs 1 2 4 8 16 32
+"""
+import os
+import json
+import time
+import argparse
+import logging
+
+import pandas as pd
+
+from automl_engine import DataCleaner
+from benchmarks.datasets import generate_frame
+
+
+def run(df: pd.DataFrame, n_jobs: int, backend: str, repeat: int) -> dict:
+    """Time fit_transform and transform for one worker count (best of repeat)."""
+    fit_times, transform_times = [], []
+    for _ in range(repeat):
+        cleaner = DataCleaner(n_jobs=n_jobs, parallel_backend=backend)
+        start = time.perf_counter()
+        X, feature_names = cleaner.fit_transform(df.copy())
+        fit_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        cleaner.transform(df)
+        transform_times.append(time.perf_counter() - start)
+    return {
+        'n_jobs': n_jobs,
+        'backend': backend,
+        'shards': len(cleaner.preprocessor.transformers_),
+        'features_out': len(feature_names),
+        'fit_transform_seconds': round(min(fit_times), 4),
+        'transform_seconds': round(min(transform_times), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--numerical', type=int, default=200)
+    parser.add_argument('--categorical', type=int, default=50)
+    parser.add_argument('--datetimes', type=int, default=8)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--backend', choices=['loky', 'threading'], nargs='+', default=['loky', 'threading'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    df = generate_frame(args.rows, args.numerical, args.categorical, cardinality=20,
+                        datetimes=args.datetimes).drop(columns=['id', 'target'])
+    print(f"Dataset: {df.shape[0]} rows x {df.shape[1]} columns, {os.cpu_count()} CPUs")
+
+    results = []
+    for backend in args.backend:
+        baseline = None
+        for n_jobs in args.jobs:
+            result = run(df, n_jobs, backend, args.repeat)
+            baseline = baseline or result['fit_transform_seconds']
+            result['speedup'] = round(baseline / result['fit_transform_seconds'], 2)
+            results.append(result)
+            print(f"{backend:>9}  n_jobs={n_jobs:<3} shards={result['shards']:<3} "
+                  f"fit_transform={result['fit_transform_seconds']:.3f}s  "
+                  f"transform={result['transform_seconds']:.3f}s  speedup={result['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'columns': df.shape[1], 'cpus': os.cpu_count(), 'results': results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Cold-start benchmark and import-time budget for the web app.
+
+Each run imports the app in a fresh interpreter (in a scratch working
+directory, since the app creates its folders and stores there) and reports
+the import time, the heavy dependencies that the import loaded, the time of
+app.warm_up() and the slowest direct imports (from python -X importtime).
+It exits 1 when the best import time exceeds the budget or a deferred
+dependency is imported eagerly again, so it can run as a check in CI:
+
+    python -m benchmarks.bench_startup --budget 0.5
+    python -m benchmarks.bench_startup --repeat 10 --warm-up --output startup.json
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, Any, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Wall-clock seconds `import app` may take (interpreter startup excluded)
+DEFAULT_IMPORT_BUDGET = 0.5
+# Dependencies the app defers to first use; importing the app must not load them
+DEFERRED_MODULES = ('numpy', 'pandas', 'scipy', 'sklearn', 'joblib', 'pyarrow')
+
+CHILD_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+module = __import__({module!r})
+imported = time.perf_counter() - start
+result = {{'import_seconds': imported,
+           'loaded': [name for name in {deferred!r} if name in sys.modules]}}
+if {warm_up!r}:
+    start = time.perf_counter()
+    module.warm_up()
+    result['warm_up_seconds'] = time.perf_counter() - start
+job_queue = getattr(module, 'job_queue', None)
+if job_queue is not None:
+    job_queue.shutdown()
+print(json.dumps(result))
+"""
+
+
+def _run_child(args: List[str], workdir: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''),
+               LOG_LEVEL='WARNING')
+    return subprocess.run([sys.executable] + args, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+
+
+def measure_startup(module: str = 'app', repeat: int = 5, warm_up: bool = False,
+                    deferred: List[str] = DEFERRED_MODULES) -> Dict[str, Any]:
+    """
+    Import a module in fresh interpreters and time it.
+
+    Args:
+        module: Module to import (it must define warm_up() when warm_up is set)
+        repeat: Number of fresh interpreters
+        warm_up: Also time module.warm_up() after the import
+        deferred: Modules to report if the import loaded them
+
+    Returns:
+        Dictionary with best and median 'import_seconds', the 'loaded' deferred
+        modules and, with warm_up, the best 'warm_up_seconds'
+    """
+    script = CHILD_SCRIPT.format(module=module, deferred=tuple(deferred), warm_up=warm_up)
+    runs = []
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix='automl-startup-')
+        try:
+            runs.append(json.loads(_run_child(['-c', script], workdir).stdout.strip().splitlines()[-1]))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    import_times = [run['import_seconds'] for run in runs]
+    result = {
+        'module': module,
+        'repeat': repeat,
+        'import_seconds': round(min(import_times), 6),
+        'import_seconds_median': round(statistics.median(import_times), 6),
+        'loaded': sorted(set(name for run in runs for name in run['loaded']))
+    }
+    if warm_up:
+        result['warm_up_seconds'] = round(min(run['warm_up_seconds'] for run in runs), 6)
+    return result
+
+
+def slowest_imports(module: str = 'app', top: int = 10) -> List[Dict[str, Any]]:
+    """
+    Return the slowest imports made directly by a module, from python -X importtime.
+
+    Returns:
+        Up to top rows of {'module', 'seconds'} (cumulative), slowest first
+    """
+    workdir = tempfile.mkdtemp(prefix='automl-startup-')
+    try:
+        report = _run_child(['-X', 'importtime', '-c', f'import {module}'], workdir).stderr
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Direct imports of the module are indented by one level (two spaces after the separator's)
+        if not name.startswith('   ') or name.startswith('     ') or not cumulative.strip().isdigit():
+            continue
+        rows.append({'module': name.strip(), 'seconds': int(cumulative) / 1e6})
+    return sorted(rows, key=lambda row: row['seconds'], reverse=True)[:top]
+
+
+def check_budget(result: Dict[str, Any], budget: Optional[float]) -> List[str]:
+    """Return the budget violations of a measure_startup result (empty when within budget)."""
+    problems = []
+    if budget is not None and result['import_seconds'] > budget:
+        problems.append(f"import {result['module']} took {result['import_seconds']:.3f}s, budget {budget:.3f}s")
+    if result['loaded']:
+        problems.append(f"import {result['module']} loaded deferred dependencies: {', '.join(result['loaded'])}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start of the web app against an import budget.')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=DEFAULT_IMPORT_BUDGET,
+                        help='Maximum seconds for the import (best of repeat)')
+    parser.add_argument('--warm-up', action='store_true', help='Also time warm_up() after the import')
+    parser.add_argument('--top', type=int, default=10, help='Slowest direct imports to list')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    result = measure_startup(args.module, args.repeat, args.warm_up)
+    result['slowest_imports'] = slowest_imports(args.module, args.top)
+    print(f"import {args.module}: best {result['import_seconds']:.3f}s, "
+          f"median {result['import_seconds_median']:.3f}s over {args.repeat} runs", file=sys.stderr)
+    if 'warm_up_seconds' in result:
+        print(f"warm_up(): {result['warm_up_seconds']:.3f}s", file=sys.stderr)
+    for row in result['slowest_imports']:
+        print(f"  {row['module']:<28} {row['seconds']:>8.3f}s", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    problems = check_budget(result, args.budget)
+    for problem in problems:
+        print(f"BUDGET EXCEEDED: {problem}", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
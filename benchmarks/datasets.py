@@ -0,0 +1,106 @@
+"""Synthetic datasets for the benchmarks, reproducible from a spec and a seed."""
+import os
+from typing import Dict, Any, Iterator
+
+import numpy as np
+import pandas as pd
+
+# Named dataset shapes; DEFAULT_SCENARIOS run in a few minutes on a laptop
+SCENARIOS = {
+    'small': {'rows': 1_000, 'numerical': 5, 'categorical': 2, 'cardinality': 5, 'datetimes': 1,
+              'nan_density': 0.05},
+    'rows_100k': {'rows': 100_000, 'numerical': 20, 'categorical': 5, 'cardinality': 20, 'datetimes': 1,
+                  'nan_density': 0.05},
+    'wide': {'rows': 20_000, 'numerical': 500, 'categorical': 50, 'cardinality': 10, 'datetimes': 2,
+             'nan_density': 0.02},
+    'high_cardinality': {'rows': 50_000, 'numerical': 10, 'categorical': 5, 'cardinality': 5_000, 'datetimes': 0,
+                         'nan_density': 0.02},
+    'datetime_heavy': {'rows': 50_000, 'numerical': 5, 'categorical': 2, 'cardinality': 10, 'datetimes': 10,
+                       'nan_density': 0.02},
+    'nan_heavy': {'rows': 50_000, 'numerical': 30, 'categorical': 10, 'cardinality': 10, 'datetimes': 1,
+                  'nan_density': 0.4},
+    'rows_1m': {'rows': 1_000_000, 'numerical': 20, 'categorical': 5, 'cardinality': 50, 'datetimes': 1,
+                'nan_density': 0.05},
+    'rows_10m': {'rows': 10_000_000, 'numerical': 10, 'categorical': 3, 'cardinality': 50, 'datetimes': 1,
+                 'nan_density': 0.05}
+}
+DEFAULT_SCENARIOS = ['small', 'rows_100k', 'wide', 'high_cardinality', 'datetime_heavy', 'nan_heavy']
+
+DATETIME_START = np.datetime64('2015-01-01T00:00')
+DATETIME_SPAN_MINUTES = 10 * 365 * 24 * 60
+
+
+def generate_frame(rows: int, numerical: int = 10, categorical: int = 3, cardinality: int = 10,
+                   datetimes: int = 1, nan_density: float = 0.05, seed: int = 0,
+                   id_offset: int = 0) -> pd.DataFrame:
+    """
+    Generate a synthetic dataset.
+
+    Besides the requested columns, every frame has an 'id' serial column, a
+    'constant' column (dropped by the cleaner) and a binary 'target' column.
+
+    Args:
+        rows: Number of rows
+        numerical: Number of float columns
+        categorical: Number of string columns
+        cardinality: Distinct levels per categorical column
+        datetimes: Number of 'YYYY-MM-DD HH:MM' string columns
+        nan_density: Fraction of missing values in every feature column
+        seed: Random seed
+        id_offset: First value of the 'id' column (for chunked generation)
+
+    Returns:
+        DataFrame with rows x (numerical + categorical + datetimes + 3) columns
+    """
+    rng = np.random.default_rng(seed)
+    data = {'id': np.arange(id_offset, id_offset + rows)}
+    for i in range(numerical):
+        data[f'num_{i}'] = rng.normal(loc=i, scale=1 + i % 5, size=rows)
+    levels = np.array([f'level_{j}' for j in range(cardinality)], dtype=object)
+    for i in range(categorical):
+        # Zipf-like frequencies, so high-cardinality columns have a long tail of rare levels
+        weights = 1.0 / np.arange(1, cardinality + 1)
+        data[f'cat_{i}'] = levels[rng.choice(cardinality, size=rows, p=weights / weights.sum())]
+    for i in range(datetimes):
+        minutes = rng.integers(0, DATETIME_SPAN_MINUTES, size=rows).astype('timedelta64[m]')
+        stamps = pd.Series(np.datetime_as_string(DATETIME_START + minutes, unit='m'))
+        data[f'date_{i}'] = stamps.str.replace('T', ' ', regex=False).values
+    data['constant'] = np.ones(rows)
+    data['target'] = rng.integers(0, 2, size=rows)
+    df = pd.DataFrame(data)
+
+    if nan_density > 0:
+        for col in df.columns:
+            if col in ('id', 'constant', 'target'):
+                continue
+            mask = rng.random(rows) < nan_density
+            if mask.any():
+                df.loc[mask, col] = np.nan
+    return df
+
+
+def iter_frames(spec: Dict[str, Any], chunk_rows: int = 1_000_000, seed: int = 0) -> Iterator[pd.DataFrame]:
+    """Generate a dataset spec in chunks of rows, so very large datasets never sit in memory at once."""
+    params = {key: value for key, value in spec.items() if key != 'rows'}
+    for i, start in enumerate(range(0, spec['rows'], chunk_rows)):
+        rows = min(chunk_rows, spec['rows'] - start)
+        yield generate_frame(rows, seed=seed + i, id_offset=start, **params)
+
+
+def write_csv(path: str, spec: Dict[str, Any], chunk_rows: int = 1_000_000, seed: int = 0) -> int:
+    """
+    Write a dataset spec to CSV in chunks.
+
+    Args:
+        path: Destination CSV path
+        spec: Dataset spec (see SCENARIOS)
+        chunk_rows: Rows generated per chunk
+        seed: Random seed
+
+    Returns:
+        Size of the written file in bytes
+    """
+    with open(path, 'w', newline='') as f:
+        for i, chunk in enumerate(iter_frames(spec, chunk_rows, seed)):
+            chunk.to_csv(f, header=i == 0, index=False)
+    return os.path.getsize(path)
@@ -0,0 +1,341 @@
+"""
+Benchmark suite for DataCleaner stages and the Flask endpoints.
+
+For each scenario (see benchmarks/datasets.py) a synthetic CSV is generated,
+then timed and memory-profiled:
+
+- engine stages: detect_column_types, handle_datetime_columns, fit_transform, transform,
+  transform_records (1000 single-row calls of the compiled fast path)
+- end to end via Flask's test client: /upload, /preprocess, /download
+- cold start ('startup'): `import app` and app.warm_up() in fresh interpreters
+  (see benchmarks/bench_startup.py)
+
+Usage (from the repository root):
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json      # exit 1 on regressions
+    python -m benchmarks.suite --scenario rows_1m --rows 5000000 --no-memory
+"""
+import io
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks.bench_startup import measure_startup
+from benchmarks.datasets import SCENARIOS, DEFAULT_SCENARIOS, write_csv
+
+RESULTS_FORMAT_VERSION = 1
+# A metric regresses when it is both this much slower (relative) and slower by at least min_seconds
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_SECONDS = 0.05
+
+
+def measure(func: Callable[[], Any], repeat: int = 1, memory: bool = True) -> Tuple[Dict[str, Any], Any]:
+    """
+    Time a callable (best of repeat) and, in a separate run, record its peak traced memory.
+
+    Memory is measured with tracemalloc, which also sees NumPy buffers; it is
+    done in its own run because tracing slows down allocation-heavy code.
+
+    Returns:
+        ({'seconds', 'peak_mb'}, result of the last call)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    metrics = {'seconds': round(min(times), 6)}
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = func()
+            metrics['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 3)
+        finally:
+            tracemalloc.stop()
+    return metrics, result
+
+
+def bench_engine(csv_path: str, repeat: int, memory: bool) -> Dict[str, Dict[str, Any]]:
+    """Benchmark the DataCleaner stages on a CSV, the way the in-memory /preprocess path uses them."""
+    from automl_engine import DataCleaner
+    from lazy_imports import import_modules
+
+    # scikit-learn is imported on first use; keep that one-off cost (see 'startup') out of the stage timings
+    import_modules()
+    df = pd.read_csv(csv_path)
+    features = df.drop(columns=['id', 'target'])
+    results = {}
+
+    def detect():
+        cleaner = DataCleaner()
+        cleaner.detect_column_types(features)
+        return cleaner
+    results['detect_column_types'], cleaner = measure(detect, repeat, memory)
+
+    without_constants = cleaner.drop_constant_columns(features)
+    # handle_datetime_columns mutates the cleaner's column types, so each run starts from a copy
+    column_types = {key: list(cols) for key, cols in cleaner.column_types.items()}
+    dropped_columns = list(cleaner.dropped_columns)
+
+    def datetimes():
+        cleaner.column_types = {key: list(cols) for key, cols in column_types.items()}
+        cleaner.dropped_columns = list(dropped_columns)
+        return cleaner.handle_datetime_columns(without_constants.copy())
+    results['handle_datetime_columns'], _ = measure(datetimes, repeat, memory)
+
+    def fit():
+        cleaner = DataCleaner()
+        cleaner.fit_transform(features)
+        return cleaner
+    results['fit_transform'], fitted = measure(fit, repeat, memory)
+
+    results['transform'], _ = measure(lambda: fitted.transform(features), repeat, memory)
+
+    # Online inference: one record per call, as /transform_rows serves them
+    head = features.head(1000)
+    records = head.astype(object).where(head.notna(), None).to_dict('records')
+    fitted.transform_records(records[:1])
+
+    def single_rows():
+        for record in records:
+            fitted.transform_records([record])
+    results['transform_records'], _ = measure(single_rows, repeat, memory)
+    results['transform_records']['us_per_row'] = round(results['transform_records']['seconds'] / len(records) * 1e6, 1)
+    return results
+
+
+def bench_endpoints(csv_path: str, repeat: int, workdir: str) -> Dict[str, Dict[str, Any]]:
+    """Benchmark /upload -> /preprocess -> /download through Flask's test client."""
+    with open(csv_path, 'rb') as f:
+        data = f.read()
+
+    # The app keeps its folders and session/job stores relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        client = load_app().app.test_client()
+        timings = {'upload': [], 'preprocess': [], 'download': [], 'end_to_end': []}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.post('/upload', data={'file': (io.BytesIO(data), 'benchmark.csv')},
+                                   content_type='multipart/form-data')
+            uploaded = time.perf_counter()
+            check_response(response, '/upload')
+            response = client.post('/preprocess', json={'nan_strategy': 'impute', 'target_column': 'target',
+                                                        'serial_column': 'id', 'async': False})
+            preprocessed = time.perf_counter()
+            check_response(response, '/preprocess')
+            response = client.get('/download')
+            size = len(response.data)
+            downloaded = time.perf_counter()
+            check_response(response, '/download')
+            client.post('/reset')
+
+            timings['upload'].append(uploaded - start)
+            timings['preprocess'].append(preprocessed - uploaded)
+            timings['download'].append(downloaded - preprocessed)
+            timings['end_to_end'].append(downloaded - start)
+    finally:
+        os.chdir(cwd)
+
+    results = {f'http_{name}': {'seconds': round(min(values), 6)} for name, values in timings.items()}
+    results['http_download']['bytes'] = size
+    return results
+
+
+def check_response(response, endpoint: str) -> None:
+    if response.status_code != 200:
+        raise RuntimeError(f"{endpoint} returned {response.status_code}: {response.get_data(as_text=True)[:500]}")
+
+
+_app_module = None
+
+
+def load_app():
+    """Import the Flask app once (from within the benchmark working directory)."""
+    global _app_module
+    if _app_module is None:
+        import app as app_module
+        _app_module = app_module
+    return _app_module
+
+
+def machine_info() -> Dict[str, Any]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def bench_startup(repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark the cold start of the app: its import and warm-up, each in fresh interpreters."""
+    result = measure_startup('app', repeat=max(repeat, 3), warm_up=True)
+    if result['loaded']:
+        print(f"[startup] import app loaded deferred dependencies: {', '.join(result['loaded'])}", file=sys.stderr)
+    return {'import_app': {'seconds': result['import_seconds']},
+            'warm_up': {'seconds': result['warm_up_seconds']}}
+
+
+def run_suite(scenarios: List[str], rows: Optional[int] = None, repeat: int = 1, memory: bool = True,
+              endpoints: bool = True, seed: int = 0, startup: bool = True) -> Dict[str, Any]:
+    """
+    Run every scenario and return machine-readable results.
+
+    Args:
+        scenarios: Scenario names from SCENARIOS
+        rows: Override the row count of every scenario
+        repeat: Timed repetitions per metric (the best is kept)
+        memory: Also record peak memory of the engine stages
+        endpoints: Also run the end-to-end HTTP benchmarks
+        seed: Dataset seed
+        startup: Also benchmark the cold start, as the 'startup' entry
+
+    Returns:
+        Results dictionary with 'meta' and per-scenario 'results'
+    """
+    results = {}
+    if startup:
+        metrics = bench_startup(repeat)
+        for metric, values in metrics.items():
+            print(f"[startup] {metric:<24} {values['seconds']:>9.3f}s", file=sys.stderr)
+        results['startup'] = {'spec': {'module': 'app'}, 'csv_bytes': 0, 'metrics': metrics}
+    workdir = tempfile.mkdtemp(prefix='automl-bench-')
+    try:
+        for name in scenarios:
+            spec = dict(SCENARIOS[name])
+            if rows:
+                spec['rows'] = rows
+            csv_path = os.path.join(workdir, f"{name}.csv")
+            file_bytes = write_csv(csv_path, spec, seed=seed)
+            print(f"[{name}] {spec['rows']} rows, {file_bytes / 1024 ** 2:.1f}MB CSV", file=sys.stderr)
+
+            metrics = bench_engine(csv_path, repeat, memory)
+            if endpoints:
+                metrics.update(bench_endpoints(csv_path, repeat, workdir))
+            for metric, values in metrics.items():
+                print(f"[{name}] {metric:<24} {values['seconds']:>9.3f}s"
+                      + (f"  peak {values['peak_mb']:.1f}MB" if 'peak_mb' in values else ''), file=sys.stderr)
+            results[name] = {'spec': spec, 'csv_bytes': file_bytes, 'metrics': metrics}
+            os.remove(csv_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': machine_info(),
+            'repeat': repeat,
+            'seed': seed
+        },
+        'results': results
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE,
+            min_seconds: float = DEFAULT_MIN_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Compare results against a baseline.
+
+    Only scenarios run with the same spec in both are compared. Timing metrics
+    regress when slower by more than tolerance (relative) and min_seconds
+    (absolute); peak memory regresses when larger by more than tolerance.
+
+    Returns:
+        One row per compared metric, with 'regression' set on the offending ones
+    """
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None or base['spec'] != result['spec']:
+            continue
+        for metric, values in result['metrics'].items():
+            base_values = base['metrics'].get(metric)
+            if not base_values:
+                continue
+            for key in ('seconds', 'peak_mb'):
+                if key not in values or key not in base_values:
+                    continue
+                old, new = base_values[key], values[key]
+                ratio = new / old if old else float('inf')
+                floor = min_seconds if key == 'seconds' else 0.0
+                rows.append({
+                    'scenario': name,
+                    'metric': metric,
+                    'unit': key,
+                    'baseline': old,
+                    'current': new,
+                    'ratio': round(ratio, 3),
+                    'regression': ratio > 1 + tolerance and new - old > floor
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DataCleaner and the Flask endpoints.')
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=DEFAULT_SCENARIOS)
+    parser.add_argument('--rows', type=int, help='Override the row count of every scenario')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory runs')
+    parser.add_argument('--no-endpoints', action='store_true', help='Skip the Flask end-to-end runs')
+    parser.add_argument('--no-startup', action='store_true', help='Skip the cold start runs')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--baseline', help='Compare against this results file; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = run_suite(args.scenario, rows=args.rows, repeat=args.repeat, memory=not args.no_memory,
+                        endpoints=not args.no_endpoints, seed=args.seed, startup=not args.no_startup)
+    if _app_module is not None:
+        _app_module.job_queue.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta']['machine'] != results['meta']['machine']:
+            print("Warning: baseline was recorded on a different machine or library versions", file=sys.stderr)
+        rows = compare(results, baseline, args.tolerance, args.min_seconds)
+        regressions = [row for row in rows if row['regression']]
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else 'ok'
+            print(f"{flag:>10}  {row['scenario']:<18} {row['metric']:<24} {row['unit']:<8} "
+                  f"{row['baseline']:>10.3f} -> {row['current']:>10.3f}  ({row['ratio']:.2f}x)")
+        print(f"{len(rows)} metrics compared, {len(regressions)} regressions", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
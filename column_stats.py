@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import math
+import logging
+from typing import Dict, Any, List, Tuple
+
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Distinct values counted exactly per column; beyond this the count is a HyperLogLog estimate
+NUNIQUE_CAP = 1000
+# HyperLogLog registers are 2**HLL_PRECISION bytes per column (standard error ~1.04 / sqrt(2**p), 1.6% at 12)
+HLL_PRECISION = 12
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """
+    Hash the non-missing values of a column to uint64, consistently across chunks.
+
+    Numbers are hashed as float64, so a column parsed as integers in one
+    chunk and as floats (integers with gaps) in another hashes alike.
+    """
+    values = values.dropna()
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return pd.util.hash_array(values.to_numpy(dtype=np.float64))
+    # Other objects hash by their string form, like the strings they are read from in other chunks;
+    # categorizing first only pays off for repetitive columns, which are cheap either way
+    return pd.util.hash_array(values.to_numpy(dtype=object), categorize=False)
+
+
+class HyperLogLog:
+    """
+    Approximate distinct counter in constant memory (one byte per register).
+
+    Sketches of disjoint row sets merge by taking the register-wise maximum,
+    so chunks and shards can be counted independently.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray) -> None:
+        """Add uint64 hashes (see hash_values)."""
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Rank = leading zeros of the remaining 64 - p bits, plus one
+        bit_length = np.zeros(len(rest), dtype=np.int64)
+        nonzero = rest > 0
+        bit_length[nonzero] = np.frexp(rest[nonzero].astype(np.float64))[1]
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        """Add the values counted by another sketch of the same precision."""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """Return the estimated number of distinct values added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class ColumnStats:
+    """
+    Single-pass column statistics over a DataFrame or its chunks, in constant memory.
+
+    Per column it keeps the null count and optionally the distinct count
+    (exact up to NUNIQUE_CAP values, then a HyperLogLog estimate) and the
+    count, min, max, mean and variance of finite numeric values (merged with
+    Chan's parallel update, so chunk order does not matter). Rows with any
+    null are counted from one row mask per chunk, never a full boolean frame.
+    Statistics of disjoint row sets (e.g. shards) merge with merge().
+    """
+
+    def __init__(self, distinct: bool = True, moments: bool = True):
+        self.distinct = distinct
+        self.moments = moments
+        self.columns = None
+        self.null_counts = None
+        self.rows = 0
+        self.rows_with_nan = 0
+        self.exact = {}
+        self.sketches = {}
+        # Per numeric column: [count, mean, M2, min, max]
+        self.numeric = {}
+        # Columns with non-numeric values in some chunk have no moments
+        self.non_numeric = set()
+
+    def _start(self, columns: List[str]) -> None:
+        self.columns = list(columns)
+        self.null_counts = np.zeros(len(self.columns), dtype=np.int64)
+        if self.distinct:
+            self.exact = {col: set() for col in self.columns}
+            self.sketches = {col: HyperLogLog() for col in self.columns}
+
+    def update(self, chunk: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add one chunk of rows (with the same columns as the first chunk).
+
+        Returns:
+            Tuple of (null count per column of the chunk, boolean mask of its rows with any null)
+        """
+        if self.columns is None:
+            self._start(chunk.columns)
+        chunk_nulls = np.zeros(len(self.columns), dtype=np.int64)
+        null_rows = np.zeros(len(chunk), dtype=bool)
+        for j, col in enumerate(self.columns):
+            values = chunk[col]
+            mask = values.isna().to_numpy()
+            chunk_nulls[j] = np.count_nonzero(mask)
+            if chunk_nulls[j]:
+                null_rows |= mask
+            if chunk_nulls[j] == len(values):
+                continue
+            if self.distinct:
+                self._update_distinct(col, values)
+            if self.moments and col not in self.non_numeric:
+                self._update_moments(col, values, mask)
+        self.null_counts += chunk_nulls
+        self.rows += len(chunk)
+        self.rows_with_nan += int(np.count_nonzero(null_rows))
+        return chunk_nulls, null_rows
+
+    def _update_distinct(self, col: str, values: pd.Series) -> None:
+        self.sketches[col].add(hash_values(values))
+        seen = self.exact.get(col)
+        if seen is not None:
+            seen.update(values.dropna().unique().tolist())
+            if len(seen) >= NUNIQUE_CAP:
+                # Beyond the cap only the sketch is kept
+                self.exact[col] = None
+
+    def _update_moments(self, col: str, values: pd.Series, mask: np.ndarray) -> None:
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            self.non_numeric.add(col)
+            self.numeric.pop(col, None)
+            return
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)[~mask]
+        array = array[np.isfinite(array)]
+        if len(array):
+            mean = array.mean()
+            self._merge_moments(col, [len(array), mean, float(((array - mean) ** 2).sum()),
+                                      array.min(), array.max()])
+
+    def _merge_moments(self, col: str, other: List[float]) -> None:
+        current = self.numeric.get(col)
+        if current is None:
+            self.numeric[col] = list(other)
+            return
+        count_a, mean_a, m2_a, min_a, max_a = current
+        count_b, mean_b, m2_b, min_b, max_b = other
+        count = count_a + count_b
+        delta = mean_b - mean_a
+        self.numeric[col] = [count, mean_a + delta * count_b / count,
+                             m2_a + m2_b + delta * delta * count_a * count_b / count,
+                             min(min_a, min_b), max(max_a, max_b)]
+
+    def merge(self, other: 'ColumnStats') -> None:
+        """Add the statistics of another ColumnStats over other rows with the same columns (in any order)."""
+        if other.columns is None:
+            return
+        if self.columns is None:
+            self._start(other.columns)
+        positions = {col: j for j, col in enumerate(other.columns)}
+        self.null_counts += other.null_counts[[positions[col] for col in self.columns]]
+        self.rows += other.rows
+        self.rows_with_nan += other.rows_with_nan
+        if self.distinct and other.distinct:
+            for col in self.columns:
+                self.sketches[col].merge(other.sketches[col])
+                seen, theirs = self.exact.get(col), other.exact.get(col)
+                if seen is not None and theirs is not None:
+                    seen.update(theirs)
+                if seen is None or theirs is None or len(seen) >= NUNIQUE_CAP:
+                    self.exact[col] = None
+        if self.moments and other.moments:
+            self.non_numeric |= other.non_numeric
+            for col, moments in other.numeric.items():
+                self._merge_moments(col, moments)
+            for col in self.non_numeric:
+                self.numeric.pop(col, None)
+
+    def nunique(self) -> Dict[str, int]:
+        """Return the distinct count of every column (exact below NUNIQUE_CAP, else estimated)."""
+        counts = {}
+        for col in self.columns or []:
+            seen = self.exact.get(col)
+            # An estimate below the cap would contradict the exact count that overflowed it
+            counts[col] = len(seen) if seen is not None else max(self.sketches[col].estimate(), NUNIQUE_CAP)
+        return counts
+
+    def numeric_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return count, min, max, mean and sample standard deviation of the finite values of numeric columns."""
+        stats = {}
+        for col in self.columns or []:
+            if col not in self.numeric or col in self.non_numeric:
+                continue
+            count, mean, m2, low, high = self.numeric[col]
+            stats[col] = {'count': int(count), 'min': float(low), 'max': float(high),
+                          'mean': float(mean), 'std': math.sqrt(m2 / (count - 1)) if count > 1 else 0.0}
+        return stats
+
+    def nan_stats(self) -> Dict[str, int]:
+        """Return 'total_nan' and 'rows_with_nan' in the format of DataCleaner's NaN stats."""
+        return {'total_nan': int(self.null_counts.sum()) if self.columns is not None else 0,
+                'rows_with_nan': self.rows_with_nan}
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Return the statistics of the rows seen so far.
+
+        Returns:
+            Dictionary with 'rows', 'total_nan', 'rows_with_nan' and 'null_counts', plus
+            'nunique' and 'nunique_exact' when counting distinct values and 'numeric_stats'
+            when tracking moments
+        """
+        columns = self.columns or []
+        null_counts = self.null_counts if self.columns is not None else []
+        result = {'rows': self.rows, **self.nan_stats(),
+                  'null_counts': {col: int(count) for col, count in zip(columns, null_counts)}}
+        if self.distinct:
+            result['nunique'] = self.nunique()
+            result['nunique_exact'] = all(self.exact.get(col) is not None for col in columns)
+        if self.moments:
+            result['numeric_stats'] = self.numeric_stats()
+        return result
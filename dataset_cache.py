@@ -0,0 +1,646 @@
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import importlib.util
+from typing import Dict, Any, List, Optional, Iterable
+
+from lazy_imports import lazy_module
+
+from automl_engine import sniff_datetime_format
+from column_stats import ColumnStats, NUNIQUE_CAP  # noqa: F401 (NUNIQUE_CAP is re-exported)
+
+pd = lazy_module('pandas')
+joblib = lazy_module('joblib')
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+logger = logging.getLogger(__name__)
+
+# String columns with at most this share of distinct values per row are loaded as pandas categoricals
+CATEGORY_MAX_RATIO = 0.5
+# Index of the CSV files of a sharded dataset, stored in its folder
+SHARD_MANIFEST = 'manifest.json'
+NUMERIC_DTYPE_PREFIXES = ('int', 'uint', 'float')
+
+
+def dataset_files(path: str) -> List[str]:
+    """Return the CSV files of a dataset: the file itself, or the shards of a sharded dataset folder in order."""
+    if not os.path.isdir(path):
+        return [path]
+    return [os.path.join(path, shard['file']) for shard in read_manifest(path)['shards']]
+
+
+def dataset_size(path: str) -> int:
+    """Return the bytes on disk of a dataset's CSV files."""
+    return sum(os.path.getsize(name) for name in dataset_files(path))
+
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    """Return the manifest of a sharded dataset folder."""
+    with open(os.path.join(directory, SHARD_MANIFEST)) as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str, shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Record the shards of a dataset folder, in the order their rows make up the dataset.
+
+    Args:
+        directory: Dataset folder
+        shards: One dict per CSV file with 'file' (name in the folder), 'original_name',
+            'content_hash' and 'bytes'
+
+    Returns:
+        Manifest with the shards, their total 'bytes' and the dataset's 'content_hash'
+        (derived from the ordered shard hashes)
+    """
+    digest = hashlib.sha256(b'shards')
+    for shard in shards:
+        digest.update(shard['content_hash'].encode())
+    manifest = {'content_hash': digest.hexdigest(), 'bytes': sum(shard['bytes'] for shard in shards),
+                'shards': shards}
+    tmp_path = os.path.join(directory, f"{SHARD_MANIFEST}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(directory, SHARD_MANIFEST))
+    return manifest
+
+
+def deduplicate_upload(filepath: str, content_hash: str, blob_dir: str) -> bool:
+    """
+    Store an upload's content once, keeping filepath as a hard link to the stored copy.
+
+    The first upload of some content is linked into blob_dir as '<hash>.csv';
+    later identical uploads are replaced by a link to that copy, so repeated
+    uploads of the same file take no extra disk space. Where hard links are
+    unsupported the upload is left as it is.
+
+    Args:
+        filepath: Freshly written upload
+        content_hash: Its SHA-256 hex digest
+        blob_dir: Folder of the stored copies
+
+    Returns:
+        True if identical content had already been stored
+    """
+    if os.path.isdir(filepath):
+        # Sharded dataset: each shard is stored once on its own
+        shards = read_manifest(filepath)['shards']
+        return all([deduplicate_upload(os.path.join(filepath, shard['file']), shard['content_hash'], blob_dir)
+                    for shard in shards])
+    blob_path = os.path.join(blob_dir, f"{content_hash}.csv")
+    try:
+        os.link(filepath, blob_path)
+        return False
+    except FileExistsError:
+        pass
+    except OSError as e:
+        logger.debug(f"Not deduplicating {filepath}: {e}")
+        return False
+
+    # Swap the new copy for a link to the stored one without a window where filepath is missing
+    link_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.link"
+    try:
+        os.link(blob_path, link_path)
+        os.replace(link_path, filepath)
+    except OSError as e:
+        logger.debug(f"Not deduplicating {filepath}: {e}")
+        if os.path.exists(link_path):
+            os.remove(link_path)
+        return False
+    return True
+
+
+def release_upload(filepath: str, content_hash: Optional[str], blob_dir: str) -> None:
+    """Delete an upload, and its stored copy once no other upload links to it."""
+    if os.path.isdir(filepath):
+        try:
+            shards = read_manifest(filepath)['shards']
+        except (OSError, ValueError):
+            shards = []
+        for shard in shards:
+            release_upload(os.path.join(filepath, shard['file']), shard['content_hash'], blob_dir)
+        shutil.rmtree(filepath, ignore_errors=True)
+        return
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    if not content_hash:
+        return
+    blob_path = os.path.join(blob_dir, f"{content_hash}.csv")
+    try:
+        if os.stat(blob_path).st_nlink == 1:
+            os.remove(blob_path)
+    except FileNotFoundError:
+        pass
+
+
+def read_dtypes(profile: Dict[str, Any], columns: Iterable[str], float_dtype: Optional[str] = 'float32',
+                categories: bool = True) -> Dict[str, str]:
+    """
+    Choose compact dtypes to read feature columns with, from their profile.
+
+    Float columns are read as float_dtype, and low-cardinality string columns
+    (not datetimes) as 'category', which stores each distinct value once.
+    When reading in chunks, string columns are pinned to 'str' instead, so a
+    chunk holding only numeric-looking values is not inferred as numbers.
+    The result can be passed as pd.read_csv(dtype=...) or DataFrame.astype.
+
+    Args:
+        profile: Dataset profile (see profile_dataframe)
+        columns: Columns to choose dtypes for (features only; passthrough columns keep theirs)
+        float_dtype: Dtype for float columns; None leaves them as float64
+        categories: Whether to use 'category' for repetitive string columns (only
+            sensible when the whole column is read at once); if False, every string
+            column is read as 'str'
+
+    Returns:
+        Mapping of column to dtype, for the columns that should change
+    """
+    dtypes = {}
+    rows = max(profile.get('rows', 0), 1)
+    datetime_columns = set(profile.get('datetime_columns', []))
+    for col in columns:
+        dtype = profile.get('dtypes', {}).get(col)
+        if dtype == 'float64' and float_dtype and float_dtype != 'float64':
+            dtypes[col] = float_dtype
+        elif dtype in ('object', 'str', 'string'):
+            if not categories:
+                dtypes[col] = 'str'
+            elif (col not in datetime_columns
+                  and profile.get('nunique', {}).get(col, rows) <= CATEGORY_MAX_RATIO * rows):
+                dtypes[col] = 'category'
+    return dtypes
+
+
+def column_summary(profile: Dict[str, Any], columns: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-column statistics of a dataset profile, for the preprocessing summary.
+
+    Args:
+        profile: Dataset profile (see profile_dataframe)
+        columns: Columns to summarise
+
+    Returns:
+        Mapping of column to its 'missing' and 'distinct' counts, plus 'min', 'max',
+        'mean' and 'std' for numeric columns (absent from profiles cached without them)
+    """
+    summary = {}
+    for col in columns:
+        if col not in profile.get('null_counts', {}):
+            continue
+        summary[col] = {'missing': profile['null_counts'][col], 'distinct': profile.get('nunique', {}).get(col),
+                        **{key: round(value, 6) if isinstance(value, float) else value
+                           for key, value in profile.get('numeric_stats', {}).get(col, {}).items() if key != 'count'}}
+    return summary
+
+
+def _sniff_datetimes(df: pd.DataFrame) -> Dict[str, Optional[str]]:
+    """Map each column that parses as datetimes to its inferred format (None if unknown)."""
+    formats = {}
+    for col in df.columns:
+        is_datetime, fmt = sniff_datetime_format(df[col])
+        if is_datetime:
+            formats[col] = fmt
+    return formats
+
+
+def profile_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Build a dataset profile from an in-memory DataFrame.
+
+    Args:
+        df: Parsed dataset
+
+    Returns:
+        Profile dictionary with shape, dtypes, null counts, distinct counts, numeric
+        statistics and datetime columns (see ChunkProfiler)
+    """
+    profiler = ChunkProfiler()
+    profiler.update(df)
+    return profiler.result()
+
+
+def _merged_dtype(old: str, new: str) -> str:
+    """Dtype of a column parsed as old in some chunks and new in others."""
+    if old == new:
+        return old
+    if old.startswith(NUMERIC_DTYPE_PREFIXES) and new.startswith(NUMERIC_DTYPE_PREFIXES):
+        # e.g. integers in one chunk and integers with gaps (floats) in another
+        return 'float64'
+    return 'object'
+
+
+class ChunkProfiler:
+    """
+    Incremental dataset profile, fed one parsed chunk at a time.
+
+    Holds the running shape, dtypes and ColumnStats (null counts, distinct
+    counts and numeric statistics) between chunks, so a profile can be built
+    while a file is still arriving, in memory independent of the row count.
+    Distinct counts are exact up to NUNIQUE_CAP values per column and
+    HyperLogLog estimates beyond (flagged by 'nunique_exact': False). Chunks
+    where a column is entirely missing do not affect its dtype.
+    """
+
+    def __init__(self):
+        self.column_names = None
+        self.dtypes = {}
+        # Columns with a non-missing value so far; the others only have a placeholder dtype
+        self.typed = set()
+        self.stats = ColumnStats()
+        self.datetime_formats = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Add one chunk of rows (with the same columns as the first chunk) to the profile."""
+        if self.column_names is None:
+            self.column_names = chunk.columns.tolist()
+            self.dtypes = {col: str(dtype) for col, dtype in chunk.dtypes.items()}
+            self.datetime_formats = _sniff_datetimes(chunk)
+        chunk_nulls, _ = self.stats.update(chunk)
+        self._merge_dtypes({col: str(dtype) for col, dtype in chunk.dtypes.items()},
+                           [col for col, nulls in zip(self.column_names, chunk_nulls) if nulls < len(chunk)])
+
+    def _merge_dtypes(self, dtypes: Dict[str, str], typed: Iterable[str]) -> None:
+        for col in typed:
+            if col in self.typed:
+                self.dtypes[col] = _merged_dtype(self.dtypes[col], dtypes[col])
+            else:
+                self.dtypes[col] = dtypes[col]
+                self.typed.add(col)
+
+    def merge(self, other: 'ChunkProfiler') -> None:
+        """Add the rows profiled by another ChunkProfiler with the same columns (e.g. of another shard)."""
+        if other.column_names is None:
+            return
+        if self.column_names is None:
+            self.column_names = list(other.column_names)
+            self.dtypes = dict(other.dtypes)
+            self.datetime_formats = dict(other.datetime_formats)
+        else:
+            for col, fmt in other.datetime_formats.items():
+                self.datetime_formats.setdefault(col, fmt)
+        self._merge_dtypes(other.dtypes, other.typed)
+        self.stats.merge(other.stats)
+
+    def result(self) -> Dict[str, Any]:
+        """Return the profile of the rows seen so far, in the same format as profile_dataframe."""
+        column_names = self.column_names if self.column_names is not None else []
+        stats = self.stats.result()
+        return {
+            'rows': stats['rows'],
+            'columns': len(column_names),
+            'column_names': column_names,
+            'total_nan': stats['total_nan'],
+            'rows_with_nan': stats['rows_with_nan'],
+            'dtypes': dict(self.dtypes),
+            'null_counts': stats['null_counts'],
+            'nunique': stats['nunique'],
+            'nunique_exact': stats['nunique_exact'],
+            'numeric_stats': stats['numeric_stats'],
+            'datetime_columns': list(self.datetime_formats),
+            'datetime_formats': dict(self.datetime_formats)
+        }
+
+
+def profile_chunks(chunks: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+    """
+    Build a dataset profile in one pass over CSV chunks, in bounded memory.
+
+    Args:
+        chunks: Iterable of DataFrames, e.g. pd.read_csv(..., chunksize=...)
+
+    Returns:
+        Profile dictionary in the same format as profile_dataframe (see ChunkProfiler)
+    """
+    profiler = ChunkProfiler()
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler.result()
+
+
+def _read_shard(path: str, chunksize: Optional[int], dtype: Optional[Dict[str, str]]):
+    """Parse one CSV shard: a ChunkProfiler of its chunks if chunksize is given, else the whole DataFrame."""
+    if not chunksize:
+        return pd.read_csv(path, dtype=dtype)
+    profiler = ChunkProfiler()
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=dtype):
+        profiler.update(chunk)
+    if profiler.column_names is None:
+        profiler.update(pd.read_csv(path, nrows=0))
+    return profiler
+
+
+def read_shards(paths: List[str], chunksize: Optional[int] = None, dtype: Optional[Dict[str, str]] = None,
+                n_jobs: Optional[int] = -1, backend: str = 'loky') -> List[Any]:
+    """
+    Parse the CSV shards of a dataset concurrently, one shard per task.
+
+    Args:
+        paths: Shard files
+        chunksize: If given, profile each shard in chunks of this many rows instead of loading it
+        dtype: Dtypes to read columns with
+        n_jobs: joblib workers (-1 for all cores; at most one per shard)
+        backend: joblib backend, 'loky' (processes) or 'threading'
+
+    Returns:
+        One DataFrame (or ChunkProfiler with chunksize) per shard, in order
+    """
+    n_workers = min(joblib.effective_n_jobs(n_jobs), len(paths))
+    if n_workers <= 1:
+        return [_read_shard(path, chunksize, dtype) for path in paths]
+    return joblib.Parallel(n_jobs=n_workers, backend=backend)(joblib.delayed(_read_shard)(path, chunksize, dtype)
+                                                       for path in paths)
+
+
+def check_shard_schema(names: List[str], columns: List[List[str]], dtypes: List[Dict[str, str]]) -> List[str]:
+    """
+    Check that the shards of a dataset share one schema.
+
+    Args:
+        names: Shard names for messages
+        columns: Column names of each shard
+        dtypes: Dtypes of each shard's columns that have values (all-missing columns carry no type)
+
+    Raises:
+        ValueError: a shard's columns differ from the first shard's (the order may differ)
+
+    Returns:
+        Warnings for columns that are numeric in some shards and text in others
+    """
+    expected = columns[0]
+    for name, shard_columns in zip(names[1:], columns[1:]):
+        if set(shard_columns) != set(expected):
+            missing = [col for col in expected if col not in shard_columns]
+            unexpected = [col for col in shard_columns if col not in expected]
+            raise ValueError(f"Shard {name} does not have the columns of {names[0]}: "
+                             f"missing {missing}, unexpected {unexpected}")
+    warnings = []
+    for col in expected:
+        first_of_kind = {}
+        for name, shard_dtypes in zip(names, dtypes):
+            if col in shard_dtypes:
+                kind = 'numeric' if shard_dtypes[col].startswith(NUMERIC_DTYPE_PREFIXES) else 'text'
+                first_of_kind.setdefault(kind, name)
+        if len(first_of_kind) > 1:
+            warnings.append(f"Column '{col}' is numeric in {first_of_kind['numeric']} but text in "
+                            f"{first_of_kind['text']}; it is read as text")
+    return warnings
+
+
+def _typed_dtypes(frame: pd.DataFrame) -> Dict[str, str]:
+    counts = frame.count()
+    return {col: str(dtype) for col, dtype in frame.dtypes.items() if counts[col]}
+
+
+def read_dataset(path: str, dtype: Optional[Dict[str, str]] = None, n_jobs: Optional[int] = -1,
+                 backend: str = 'loky') -> pd.DataFrame:
+    """
+    Load a whole dataset, a CSV file or sharded folder, as one frame.
+
+    Shards are parsed concurrently and concatenated in order, with the
+    columns in the order of the first shard.
+
+    Args:
+        path: CSV file or sharded dataset folder
+        dtype: Dtypes to read columns with ('category' is applied after concatenation)
+        n_jobs: joblib workers for the shards
+        backend: joblib backend
+
+    Returns:
+        DataFrame of every row
+    """
+    paths = dataset_files(path)
+    if len(paths) == 1:
+        return pd.read_csv(paths[0], dtype=dtype)
+    dtype = dtype or {}
+    # Per-shard categoricals would have different categories and concatenate as object
+    categories = {col: kind for col, kind in dtype.items() if kind == 'category'}
+    frames = read_shards(paths, dtype={col: kind for col, kind in dtype.items() if kind != 'category'},
+                         n_jobs=n_jobs, backend=backend)
+    names = [shard['original_name'] for shard in read_manifest(path)['shards']]
+    check_shard_schema(names, [frame.columns.tolist() for frame in frames], [_typed_dtypes(frame) for frame in frames])
+    columns = frames[0].columns
+    df = pd.concat([frame[columns] for frame in frames], ignore_index=True)
+    return df.astype(categories) if categories else df
+
+
+class DatasetCache:
+    """
+    On-disk cache of dataset profiles and columnar binary copies, keyed by content hash.
+
+    Each entry holds '<hash>.profile.json' plus, for datasets small enough to be
+    loaded in memory, a binary copy of the parsed frame (Parquet when pyarrow is
+    installed, pickle otherwise) so later requests skip CSV parsing entirely.
+    Entries are evicted least recently used first once their files exceed
+    max_bytes; reading an entry bumps its recency.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.frame_format = 'parquet' if HAS_PYARROW else 'pickle'
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _profile_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.profile.json")
+
+    def _frame_path(self, key: str, frame_format: str) -> str:
+        extension = 'parquet' if frame_format == 'parquet' else 'pkl'
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def get_profile(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached profile for a content hash, or None if absent."""
+        path = self._profile_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                profile = json.load(f)
+            # Bump the entry's recency for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted between the check and the read
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable profile {path}: {e}")
+            return None
+        return profile
+
+    def load_frame(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached binary copy of a dataset, or None if it was not stored."""
+        profile = self.get_profile(key)
+        if not profile or not profile.get('frame_format'):
+            return None
+        path = self._frame_path(key, profile['frame_format'])
+        try:
+            if profile['frame_format'] == 'parquet':
+                return pd.read_parquet(path)
+            return pd.read_pickle(path)
+        except FileNotFoundError:
+            # Not stored, or evicted since the profile was read
+            return None
+
+    def build(self, key: str, filepath: str, chunksize: Optional[int] = None, n_jobs: Optional[int] = -1,
+              backend: str = 'loky') -> Dict[str, Any]:
+        """
+        Parse a CSV once, persist its profile and (unless chunked) a binary copy.
+
+        Args:
+            key: Content hash of the file
+            filepath: Path of the CSV file, or of a sharded dataset folder
+            chunksize: If given, profile in chunks of this many rows and skip the binary copy
+            n_jobs: joblib workers parsing the shards of a sharded dataset
+            backend: joblib backend for the shards
+
+        Returns:
+            Profile dictionary, with 'content_hash' and 'frame_format' set; sharded
+            datasets also get 'shards' and 'schema_warnings'
+        """
+        paths = dataset_files(filepath)
+        if len(paths) > 1:
+            return self._build_sharded(key, filepath, paths, chunksize, n_jobs, backend)
+        filepath = paths[0]
+        if chunksize:
+            profile = profile_chunks(pd.read_csv(filepath, chunksize=chunksize))
+            if not profile['column_names']:
+                profile['column_names'] = pd.read_csv(filepath, nrows=0).columns.tolist()
+                profile['columns'] = len(profile['column_names'])
+            frame_format = None
+        else:
+            df = pd.read_csv(filepath)
+            profile = profile_dataframe(df)
+            frame_format = self._put_frame(key, df)
+
+        return self.put_profile(key, profile, frame_format)
+
+    def _put_frame(self, key: str, df: pd.DataFrame) -> str:
+        """Store the binary copy of a parsed dataset and return its format."""
+        frame_format = self.frame_format
+        if len(df):
+            # Write under a per-writer temporary name, so concurrent workers building
+            # the same entry never expose a half-written file
+            frame_path = self._frame_path(key, frame_format)
+            tmp_path = f"{frame_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if frame_format == 'parquet':
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_pickle(tmp_path)
+            os.replace(tmp_path, frame_path)
+        return frame_format
+
+    def _build_sharded(self, key: str, directory: str, paths: List[str], chunksize: Optional[int],
+                       n_jobs: Optional[int], backend: str) -> Dict[str, Any]:
+        """build for a sharded dataset: shards are parsed in parallel, checked for one schema and combined."""
+        names = [shard['original_name'] for shard in read_manifest(directory)['shards']]
+        parsed = read_shards(paths, chunksize=chunksize, n_jobs=n_jobs, backend=backend)
+        if chunksize:
+            typed_dtypes = [{col: profiler.dtypes[col] for col in profiler.typed} for profiler in parsed]
+            warnings = check_shard_schema(names, [profiler.column_names for profiler in parsed], typed_dtypes)
+            combined = ChunkProfiler()
+            for profiler in parsed:
+                combined.merge(profiler)
+            profile = combined.result()
+            frame_format = None
+        else:
+            warnings = check_shard_schema(names, [frame.columns.tolist() for frame in parsed],
+                                          [_typed_dtypes(frame) for frame in parsed])
+            columns = parsed[0].columns
+            df = pd.concat([frame[columns] for frame in parsed], ignore_index=True)
+            del parsed
+            profile = profile_dataframe(df)
+            frame_format = self._put_frame(key, df)
+        for warning in warnings:
+            logger.warning(f"Dataset {key[:12]}: {warning}")
+        profile['shards'] = len(paths)
+        profile['schema_warnings'] = warnings
+        return self.put_profile(key, profile, frame_format)
+
+    def put_profile(self, key: str, profile: Dict[str, Any], frame_format: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Persist a profile built elsewhere (e.g. while an upload was streamed in).
+
+        Args:
+            key: Content hash of the file
+            profile: Profile dictionary (see profile_dataframe)
+            frame_format: Format of the binary copy stored under key, None if there is none
+
+        Returns:
+            Profile dictionary, with 'content_hash' and 'frame_format' set
+        """
+        profile['content_hash'] = key
+        profile['frame_format'] = frame_format
+
+        # Empty datasets are rejected by the caller, so there is nothing worth caching
+        if profile['rows']:
+            tmp_path = f"{self._profile_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(profile, f)
+            os.replace(tmp_path, self._profile_path(key))
+            logger.info(f"Cached profile for dataset {key[:12]} ({profile['rows']} rows, format={frame_format})")
+            self.evict(keep=key)
+        return profile
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        List the cached datasets.
+
+        Returns:
+            Mapping of content hash to 'paths' (profile and binary copy), 'bytes' and
+            'last_access' (latest modification time; reading the profile bumps it)
+        """
+        entries = {}
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            key, _, extension = entry.name.partition('.')
+            if extension not in ('profile.json', 'parquet', 'pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            info = entries.setdefault(key, {'paths': [], 'bytes': 0, 'last_access': 0.0})
+            info['paths'].append(entry.path)
+            info['bytes'] += stat.st_size
+            info['last_access'] = max(info['last_access'], stat.st_mtime)
+        return entries
+
+    def remove(self, key: str) -> None:
+        """Delete the profile and binary copy of a dataset."""
+        for path in [self._profile_path(key), self._frame_path(key, 'parquet'), self._frame_path(key, 'pickle')]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+
+        Args:
+            keep: Key that is never evicted (the entry just written)
+
+        Returns:
+            Number of entries removed
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = self.entries()
+        total = sum(info['bytes'] for info in entries.values())
+        removed = 0
+        for key, info in sorted(entries.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= info['bytes']
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} cached datasets, {total / 1024 ** 2:.1f}MB remain")
+        return removed
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Quantile bins per numerical column in the reference histogram
+DRIFT_BINS = 10
+# Levels kept per categorical column; rarer ones are counted together as 'other'
+MAX_REFERENCE_LEVELS = 1000
+# Rows sampled to place the quantile bin edges (the counts use every row)
+REFERENCE_SAMPLE_ROWS = 100000
+# Rows of a transformed frame counted for its drift metrics: larger frames are sampled with a fixed
+# stride, which keeps the overhead to a few percent of the transform while PSI sampling noise stays
+# around (bins - 1) / BATCH_SAMPLE_ROWS
+BATCH_SAMPLE_ROWS = 50000
+# Floor for bin proportions in the PSI, so empty bins do not make it infinite
+PSI_EPSILON = 1e-4
+# Conventional PSI bands: below 0.1 stable, 0.1-0.25 moderate shift, above 0.25 significant shift
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+# A column is also reported as drifted above these unseen-category rates and null-rate changes
+UNSEEN_RATE_ALERT = 0.05
+NULL_RATE_CHANGE_ALERT = 0.1
+# Unseen levels listed per column in a report
+UNSEEN_EXAMPLES = 5
+
+
+def psi(reference: np.ndarray, current: np.ndarray, epsilon: float = PSI_EPSILON) -> Optional[float]:
+    """
+    Population stability index between two histograms over the same bins.
+
+    Returns:
+        sum((q - p) * ln(q / p)) over the bin proportions, or None if either histogram is empty
+    """
+    reference_total, current_total = reference.sum(), current.sum()
+    if reference_total == 0 or current_total == 0:
+        return None
+    p = np.maximum(reference / reference_total, epsilon)
+    q = np.maximum(current / current_total, epsilon)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+class DriftMonitor:
+    """
+    Compact reference sketches of the fitted data, for drift checks on every transformed batch.
+
+    Each numerical column keeps a histogram over quantile bins of the fitted
+    rows; each categorical column keeps the counts of its most frequent levels
+    (the rest pooled as 'other'); both keep their null count. The sketches are
+    taken from the frame the pipeline is fitted on and are a few kilobytes per
+    column at most. observe() counts a batch into the same bins with a
+    searchsorted or a hash lookup per column, and DriftBatch.report() turns the
+    counts into PSI, unseen-category rates and null-rate changes.
+    """
+
+    def __init__(self, bins: int = DRIFT_BINS, max_levels: int = MAX_REFERENCE_LEVELS,
+                 sample_rows: int = REFERENCE_SAMPLE_ROWS, batch_sample_rows: Optional[int] = BATCH_SAMPLE_ROWS,
+                 random_state: int = 0):
+        self.bins = bins
+        self.max_levels = max_levels
+        self.sample_rows = sample_rows
+        # None counts every transformed row
+        self.batch_sample_rows = batch_sample_rows
+        self.random_state = random_state
+        self.rows = 0
+        # Numerical column -> {'edges': interior bin edges, 'counts': rows per bin, 'nulls': missing values}
+        self.numerical = {}
+        # Categorical column -> {'counts': pd.Series of rows per level, 'other': pooled rare levels, 'nulls': ...}
+        self.categorical = {}
+        self._levels = {}
+
+    def __getstate__(self):
+        # The level indexes are a lookup cache, rebuilt on first use
+        state = self.__dict__.copy()
+        state['_levels'] = {}
+        return state
+
+    def fit(self, frame: pd.DataFrame, numerical: Sequence[str], categorical: Sequence[str]) -> 'DriftMonitor':
+        """Take the reference sketches of the given columns from a fitted frame."""
+        self.rows = 0
+        self.numerical = {}
+        self.categorical = {}
+        self._levels = {}
+        self.partial_fit(frame, numerical, categorical)
+        return self
+
+    def partial_fit(self, frame: pd.DataFrame, numerical: Sequence[str] = (),
+                    categorical: Sequence[str] = ()) -> None:
+        """
+        Add a chunk of fitted rows to the reference.
+
+        Bin edges are placed on the first chunk a numerical column appears in;
+        later chunks are counted into the same bins.
+        """
+        sample = None
+        if len(frame) > self.sample_rows:
+            rng = np.random.default_rng(self.random_state)
+            sample = np.sort(rng.choice(len(frame), self.sample_rows, replace=False))
+        for col in numerical:
+            if col not in self.numerical:
+                values = frame[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                values = values if sample is None else values[sample]
+                values = values[~np.isnan(values)]
+                quantiles = np.linspace(0, 1, self.bins + 1)[1:-1]
+                edges = np.unique(np.quantile(values, quantiles)) if len(values) else np.array([])
+                self.numerical[col] = {'edges': edges, 'counts': np.zeros(len(edges) + 1, dtype=np.int64),
+                                       'nulls': 0}
+        for col in categorical:
+            if col not in self.categorical:
+                self.categorical[col] = {'counts': pd.Series(dtype=np.int64), 'other': 0, 'nulls': 0}
+        self.update(frame)
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """Count more fitted rows (e.g. from partial_fit) into the reference sketches."""
+        for col, (counts, nulls) in self._count_numerical(frame).items():
+            self.numerical[col]['counts'] += counts
+            self.numerical[col]['nulls'] += nulls
+        for col, sketch in self.categorical.items():
+            values = frame[col]
+            nulls = int(values.isna().sum())
+            level_counts = values.value_counts()
+            merged = sketch['counts'].add(level_counts[level_counts > 0], fill_value=0).astype(np.int64)
+            if len(merged) > self.max_levels:
+                merged = merged.sort_values(ascending=False, kind='stable')
+                sketch['other'] += int(merged.iloc[self.max_levels:].sum())
+                merged = merged.iloc[:self.max_levels]
+            sketch['counts'] = merged
+            sketch['nulls'] += nulls
+            self._levels.pop(col, None)
+        self.rows += len(frame)
+
+    def select(self, numerical: Sequence[str], categorical: Sequence[str]) -> None:
+        """Keep only the sketches of the final columns (e.g. once fit_stream has found the constant ones)."""
+        self.numerical = {col: self.numerical[col] for col in numerical if col in self.numerical}
+        self.categorical = {col: self.categorical[col] for col in categorical if col in self.categorical}
+        self._levels = {}
+
+    def _level_index(self, col: str) -> pd.Index:
+        # Hash index of the reference levels followed by NaN (so missing values need no isna pass),
+        # rebuilt after the counts change
+        index = self._levels.get(col)
+        if index is None:
+            levels = self.categorical[col]['counts'].index.to_numpy(dtype=object)
+            index = self._levels[col] = pd.Index(np.append(levels, np.nan), dtype=object)
+        return index
+
+    def _count_numerical(self, frame: pd.DataFrame) -> Dict[str, Tuple[np.ndarray, int]]:
+        """Count the numerical columns of a frame into the reference bins: (rows per bin, missing values)."""
+        counts = {}
+        for col, sketch in self.numerical.items():
+            series = frame[col]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind == 'f':
+                values = series.to_numpy()
+            else:
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            # Sorting and locating the few edges beats a searchsorted of every value into them; NaNs sort last
+            values = np.sort(values)
+            present = len(values) - int(np.isnan(values).sum())
+            positions = np.searchsorted(values[:present], sketch['edges'], side='left')
+            counts[col] = (np.diff(positions, prepend=0, append=present), len(values) - present)
+        return counts
+
+    def observe(self, frame: pd.DataFrame, batch: Optional['DriftBatch'] = None) -> 'DriftBatch':
+        """
+        Count a batch of prepared rows (the frame the pipeline transforms) against the reference.
+
+        Frames longer than batch_sample_rows are counted from every k-th row.
+
+        Args:
+            frame: Batch with the monitored columns
+            batch: Running counts to add to (a new DriftBatch when None)
+
+        Returns:
+            The updated DriftBatch
+        """
+        batch = batch if batch is not None else DriftBatch(self)
+        batch.rows += len(frame)
+        if self.batch_sample_rows and len(frame) > self.batch_sample_rows:
+            frame = frame.iloc[::-(-len(frame) // self.batch_sample_rows)]
+        batch.observed += len(frame)
+        for col, (counts, nulls) in self._count_numerical(frame).items():
+            batch.numerical[col]['counts'] += counts
+            batch.numerical[col]['nulls'] += nulls
+        for col in self.categorical:
+            values = frame[col]
+            index = self._level_index(col)
+            codes = index.get_indexer(values)
+            # Codes: the reference levels, then NaN; -1 for other values, including other missing markers (None)
+            other = np.flatnonzero(codes == -1)
+            if len(other):
+                codes[other[values.iloc[other].isna().to_numpy()]] = len(index) - 1
+                other = other[codes[other] == -1]
+            # Slot 0 counts the values outside the reference levels, the last slot the missing ones
+            level_counts = np.bincount(codes + 1, minlength=len(index) + 1)
+            batch_counts = batch.categorical[col]
+            batch_counts['counts'] += level_counts[:-1]
+            batch_counts['nulls'] += int(level_counts[-1])
+            examples = batch_counts['unseen_examples']
+            if len(other) and len(examples) < UNSEEN_EXAMPLES:
+                for value in pd.unique(values.iloc[other])[:UNSEEN_EXAMPLES]:
+                    value = value.item() if hasattr(value, 'item') else value
+                    value = value if isinstance(value, (str, int, float, bool)) else str(value)
+                    if value not in examples and len(examples) < UNSEEN_EXAMPLES:
+                        examples.append(value)
+        return batch
+
+    def summary(self) -> Dict[str, Any]:
+        """Size of the reference, for preprocessing_summary."""
+        return {
+            'rows': int(self.rows),
+            'numerical_columns': len(self.numerical),
+            'categorical_columns': len(self.categorical),
+            'bins': self.bins,
+            'truncated_columns': [col for col, sketch in self.categorical.items() if sketch['other']]
+        }
+
+
+class DriftBatch:
+    """
+    Counts of transformed rows in the bins and levels of a DriftMonitor's reference.
+
+    Batches from several chunks or worker processes are combined with merge()
+    before report(), so the metrics of a whole file equal those of one pass.
+    """
+
+    def __init__(self, monitor: DriftMonitor):
+        self.monitor = monitor
+        self.rows = 0
+        # Rows actually counted (fewer than rows when frames are sampled)
+        self.observed = 0
+        self.numerical = {col: {'counts': np.zeros(len(sketch['counts']), dtype=np.int64), 'nulls': 0}
+                          for col, sketch in monitor.numerical.items()}
+        self.categorical = {col: {'counts': np.zeros(len(sketch['counts']) + 1, dtype=np.int64), 'nulls': 0,
+                                  'unseen_examples': []}
+                            for col, sketch in monitor.categorical.items()}
+
+    def merge(self, other: 'DriftBatch') -> None:
+        """Add the counts of another batch observed against the same reference."""
+        for col, counts in other.numerical.items():
+            self.numerical[col]['counts'] += counts['counts']
+            self.numerical[col]['nulls'] += counts['nulls']
+        for col, counts in other.categorical.items():
+            mine = self.categorical[col]
+            mine['counts'] += counts['counts']
+            mine['nulls'] += counts['nulls']
+            for value in counts['unseen_examples']:
+                if value not in mine['unseen_examples'] and len(mine['unseen_examples']) < UNSEEN_EXAMPLES:
+                    mine['unseen_examples'].append(value)
+        self.rows += other.rows
+        self.observed += other.observed
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Drift metrics of the observed rows against the reference.
+
+        Returns:
+            Dictionary with 'rows', 'sampled_rows' (the rows counted), per-column metrics under 'columns' ('psi', 'null_rate',
+            'reference_null_rate', 'null_rate_change' and, for categorical columns,
+            'unseen_rate' and 'unseen_examples'), 'max_psi' and the 'drifted_columns'
+            that exceed PSI_ALERT, UNSEEN_RATE_ALERT or NULL_RATE_CHANGE_ALERT
+        """
+        monitor = self.monitor
+        columns = {}
+        drifted = []
+
+        def null_rates(nulls: int, reference_nulls: int) -> Dict[str, Any]:
+            rate = nulls / self.observed if self.observed else None
+            reference_rate = reference_nulls / monitor.rows if monitor.rows else None
+            change = rate - reference_rate if rate is not None and reference_rate is not None else None
+            return {'null_rate': rate, 'reference_null_rate': reference_rate, 'null_rate_change': change}
+
+        for col, counts in self.numerical.items():
+            reference = monitor.numerical[col]
+            columns[col] = {'type': 'numerical', 'psi': psi(reference['counts'], counts['counts']),
+                            **null_rates(counts['nulls'], reference['nulls'])}
+        for col, counts in self.categorical.items():
+            reference = monitor.categorical[col]
+            reference_counts = np.concatenate([[reference['other']], reference['counts'].to_numpy()])
+            present = counts['counts'].sum()
+            columns[col] = {'type': 'categorical', 'psi': psi(reference_counts, counts['counts']),
+                            'unseen_rate': float(counts['counts'][0] / present) if present else None,
+                            'unseen_examples': list(counts['unseen_examples']),
+                            **null_rates(counts['nulls'], reference['nulls'])}
+
+        for col, metrics in columns.items():
+            for key in ('psi', 'null_rate', 'reference_null_rate', 'null_rate_change', 'unseen_rate'):
+                if metrics.get(key) is not None:
+                    metrics[key] = round(metrics[key], 6)
+            if ((metrics['psi'] or 0) > PSI_ALERT or (metrics.get('unseen_rate') or 0) > UNSEEN_RATE_ALERT
+                    or abs(metrics['null_rate_change'] or 0) > NULL_RATE_CHANGE_ALERT):
+                drifted.append(col)
+        psis = [metrics['psi'] for metrics in columns.values() if metrics['psi'] is not None]
+        return {
+            'rows': int(self.rows),
+            'sampled_rows': int(self.observed),
+            'reference_rows': int(monitor.rows),
+            'max_psi': max(psis) if psis else None,
+            'drifted_columns': drifted,
+            'columns': columns
+        }
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import math
+import logging
+import warnings
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Features derived from each datetime column, in the order the cleaner creates them
+DATETIME_PARTS = ('year', 'month', 'day', 'dayofweek')
+# ISO formats parsed with datetime.fromisoformat (far faster than strptime), by rendered length
+ISO_FORMAT_LENGTHS = {'%Y-%m-%d': 10, '%Y-%m-%d %H:%M': 16, '%Y-%m-%dT%H:%M': 16,
+                      '%Y-%m-%d %H:%M:%S': 19, '%Y-%m-%dT%H:%M:%S': 19}
+
+
+def _to_float(value: Any) -> float:
+    """Convert one raw value to float the way pd.to_numeric(errors='coerce') would (NaN if unparseable)."""
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _datetime_parts(value: Any, fmt: Optional[str]) -> Tuple[float, float, float, float]:
+    """Year, month, day and day of week of one raw value (all NaN if it does not parse)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return (math.nan,) * 4
+    try:
+        if isinstance(value, datetime):
+            parsed = value
+        elif fmt is not None:
+            parsed = None
+            if len(value) == ISO_FORMAT_LENGTHS.get(fmt) and (len(value) == 10 or value[10] == fmt[8]):
+                try:
+                    parsed = datetime.fromisoformat(value)
+                except ValueError:
+                    pass
+            if parsed is None:
+                try:
+                    parsed = datetime.strptime(value, fmt)
+                except ValueError:
+                    # pandas accepts a few variants strptime does not (e.g. missing zero padding)
+                    parsed = pd.to_datetime(value, format=fmt, errors='coerce')
+        else:
+            parsed = pd.to_datetime(value, errors='coerce')
+    except (TypeError, ValueError):
+        return (math.nan,) * 4
+    if parsed is pd.NaT:
+        return (math.nan,) * 4
+    return float(parsed.year), float(parsed.month), float(parsed.day), float(parsed.weekday())
+
+
+class FastTransformer:
+    """
+    A fitted DataCleaner compiled into flat NumPy arrays and lookup dicts.
+
+    Transforms dict records (single rows or micro-batches) without building
+    DataFrames or going through the ColumnTransformer, which dominates the
+    latency of small requests. Per output position it holds the imputer fill
+    value, scaler mean and scale of the numerical features, and per
+    categorical column a dict from category to output position (-1 for
+    levels that encode as all zeros), including how unknown and missing
+    values encode. The output matches DataCleaner.transform, always dense.
+    """
+
+    def __init__(self, cleaner):
+        if cleaner.preprocessor is None:
+            raise ValueError("Preprocessor has not been fitted. Call fit_transform first.")
+        self.feature_names_out = [str(name) for name in cleaner.feature_names_out]
+        # Records are encoded to the full layout first, then the cleaner's feature selection is applied
+        self.selector = getattr(cleaner, 'feature_selector', None)
+        n_encoded = len(self.selector.input_features) if self.selector is not None else len(self.feature_names_out)
+        self.dtype = cleaner._output_dtype()
+        column_types = cleaner.column_types
+        datetime_cols = [col for col in column_types.get('datetime', [])
+                         if col not in column_types.get('constant', [])]
+        numerical = column_types.get('numerical', [])
+        # Datetime columns whose parsing failed while fitting have no derived features
+        derived = {f'{col}_{part}': (col, i) for col in datetime_cols for i, part in enumerate(DATETIME_PARTS)
+                   if f'{col}_{part}' in numerical}
+
+        # Raw numerical inputs and datetime-derived parts are gathered into one float64 matrix
+        self.numeric_inputs = [col for col in numerical if col not in derived]
+        self.datetime_inputs = [col for col in datetime_cols if any(src == col for src, _ in derived.values())]
+        self.datetime_formats = [cleaner.datetime_formats.get(col) for col in self.datetime_inputs]
+        source_index = {col: i for i, col in enumerate(self.numeric_inputs)}
+        datetime_offset = len(self.numeric_inputs)
+        datetime_index = {col: i for i, col in enumerate(self.datetime_inputs)}
+        for name, (col, part) in derived.items():
+            source_index[name] = datetime_offset + 4 * datetime_index[col] + part
+
+        sources, positions, fills, means, scales = [], [], [], [], []
+        self.categorical_inputs = []
+        self.category_positions = []
+        self.missing_positions = []
+        self.unknown_positions = []
+        offset = 0
+        for name, pipeline, columns in cleaner.preprocessor.transformers_:
+            if name.startswith('numerical'):
+                imputer = pipeline.named_steps['imputer']
+                scaler = pipeline.named_steps['scaler']
+                # The mean imputer drops columns that were entirely missing while fitting
+                kept = [col for col, fill in zip(columns, imputer.statistics_) if not np.isnan(fill)]
+                kept_fills = [fill for fill in imputer.statistics_ if not np.isnan(fill)]
+                sources.extend(source_index[col] for col in kept)
+                positions.extend(range(offset, offset + len(kept)))
+                fills.extend(kept_fills)
+                means.extend(scaler.mean_ if scaler.mean_ is not None else np.zeros(len(kept)))
+                scales.extend(scaler.scale_ if scaler.scale_ is not None else np.ones(len(kept)))
+                offset += len(kept)
+            elif name.startswith('categorical'):
+                offset = self._compile_categorical(pipeline, list(columns), offset)
+            elif name != 'remainder':
+                raise ValueError(f"Cannot compile transformer {name!r}")
+
+        if offset != n_encoded:
+            raise ValueError(f"Compiled {offset} features, the cleaner produces {n_encoded}")
+        self.n_sources = datetime_offset + 4 * len(self.datetime_inputs)
+        self.sources = np.asarray(sources, dtype=np.intp)
+        self.positions = np.asarray(positions, dtype=np.intp)
+        self.fills = np.asarray(fills, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.n_features = offset
+
+    def _compile_categorical(self, pipeline, columns: List[str], offset: int) -> int:
+        """
+        Record, per column of a categorical shard, the output position of every category.
+
+        The encoder is probed with every category of one column while the others
+        hold a fixed level, so dropped, infrequent and unknown levels encode
+        exactly as OneHotEncoder.transform does.
+
+        Returns:
+            Offset of the first output position after this shard
+        """
+        imputer = pipeline.named_steps['imputer']
+        encoder = pipeline.named_steps['encoder']
+        unknown = object()
+        base = [categories[0] for categories in encoder.categories_]
+        probes = []
+        for j, categories in enumerate(encoder.categories_):
+            for value in list(categories) + [unknown]:
+                row = list(base)
+                row[j] = value
+                probes.append(row)
+        with warnings.catch_warnings():
+            # The unknown probes are expected to warn
+            warnings.simplefilter('ignore', UserWarning)
+            encoded = encoder.transform(pd.DataFrame(probes, columns=columns, dtype=object))
+        encoded = encoded.toarray() if hasattr(encoded, 'toarray') else np.asarray(encoded)
+        width = encoded.shape[1]
+
+        start = 0
+        for j, (col, categories) in enumerate(zip(columns, encoder.categories_)):
+            block = encoded[start:start + len(categories) + 1]
+            start += len(categories) + 1
+            # Only this column's output positions change between its probes
+            owned = np.flatnonzero((block != block[:1]).any(axis=0))
+            position_of_row = np.full(len(block), -1, dtype=np.intp)
+            if len(owned):
+                rows, cols = np.nonzero(block[:, owned])
+                position_of_row[rows] = offset + owned[cols]
+            lookup = {value: int(position) for value, position in zip(categories, position_of_row[:-1])}
+            self.categorical_inputs.append(col)
+            self.category_positions.append(lookup)
+            self.unknown_positions.append(int(position_of_row[-1]))
+            self.missing_positions.append(lookup.get(imputer.statistics_[j], int(position_of_row[-1])))
+        return offset + width
+
+    def _lookup(self, j: int, value: Any) -> int:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return self.missing_positions[j]
+        lookup = self.category_positions[j]
+        try:
+            position = lookup.get(value)
+        except TypeError:
+            # Unhashable values (nested JSON) are never a fitted level
+            return self.unknown_positions[j]
+        if position is None:
+            # JSON numbers for levels that were read from CSV as strings
+            if isinstance(value, str):
+                return self.unknown_positions[j]
+            position = lookup.get(str(value), self.unknown_positions[j])
+        return position
+
+    def transform_records(self, records: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """
+        Transform dict records, one output row per record.
+
+        Args:
+            records: Mappings from input column to raw value (None for missing);
+                columns the cleaner dropped may be omitted
+
+        Returns:
+            Dense array of shape (len(records), len(feature_names_out)) in the cleaner's output dtype
+        """
+        try:
+            raw = [[record[col] for col in self.numeric_inputs] for record in records]
+            dates = [[record[col] for col in self.datetime_inputs] for record in records]
+            labels = [[record[col] for col in self.categorical_inputs] for record in records]
+        except KeyError:
+            required = self.numeric_inputs + self.datetime_inputs + self.categorical_inputs
+            incomplete = next(record for record in records if any(col not in record for col in required))
+            missing = [col for col in required if col not in incomplete]
+            raise ValueError(f"Record is missing columns the cleaner was fitted on: {missing}") from None
+        except TypeError:
+            raise ValueError("Records must be objects mapping column names to values") from None
+
+        n_rows = len(records)
+        values = np.empty((n_rows, self.n_sources), dtype=np.float64)
+        n_numeric = len(self.numeric_inputs)
+        if n_numeric:
+            try:
+                values[:, :n_numeric] = np.array(raw, dtype=np.float64).reshape(n_rows, n_numeric)
+            except (TypeError, ValueError):
+                values[:, :n_numeric] = [[_to_float(value) for value in row] for row in raw]
+        if self.datetime_inputs:
+            # Dates repeat heavily within a batch, so each distinct value is parsed once
+            parsed = [{} for _ in self.datetime_inputs]
+            rows = []
+            for row in dates:
+                parts = []
+                for value, fmt, cache in zip(row, self.datetime_formats, parsed):
+                    try:
+                        value_parts = cache.get(value)
+                    except TypeError:
+                        value_parts = None
+                    if value_parts is None:
+                        value_parts = _datetime_parts(value, fmt)
+                        if isinstance(value, str):
+                            cache[value] = value_parts
+                    parts.extend(value_parts)
+                rows.append(parts)
+            values[:, n_numeric:] = rows
+
+        out = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        numeric = values[:, self.sources]
+        missing = np.isnan(numeric)
+        if missing.any():
+            numeric = np.where(missing, self.fills, numeric)
+        out[:, self.positions] = (numeric - self.means) / self.scales
+
+        if self.categorical_inputs:
+            lookups = self.category_positions
+            hot_rows, hot_positions = [], []
+            for i, row in enumerate(labels):
+                for j, value in enumerate(row):
+                    # Fitted string levels are by far the common case
+                    position = lookups[j].get(value) if type(value) is str else None
+                    if position is None:
+                        position = self._lookup(j, value)
+                    if position >= 0:
+                        hot_rows.append(i)
+                        hot_positions.append(position)
+            out[hot_rows, hot_positions] = 1.0
+        out = out.astype(self.dtype, copy=False)
+        if self.selector is not None:
+            out = self.selector.transform(out)
+        return out
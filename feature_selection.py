@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, Any, Optional, Sequence, Tuple, Union
+
+from lazy_imports import lazy_module
+
+np = lazy_module('numpy')
+sparse = lazy_module('scipy.sparse')
+
+logger = logging.getLogger(__name__)
+
+# Defaults for requests that enable a filter without a threshold: one-hot levels in fewer than
+# ~0.01% of rows have a variance below 1e-4, and |r| > 0.95 marks a feature as redundant
+DEFAULT_VARIANCE_THRESHOLD = 1e-4
+DEFAULT_CORRELATION_THRESHOLD = 0.95
+# Correlations are computed for this many features at a time, against every earlier feature
+CORRELATION_BLOCK_SIZE = 256
+# Rows sampled for the correlations (variances and the SVD use every row)
+CORRELATION_SAMPLE_ROWS = 20000
+# Dense rows summed per block while computing variances, so no float64 copy of the matrix is made
+VARIANCE_BLOCK_ROWS = 65536
+
+
+def column_moments(X: Union[np.ndarray, sparse.spmatrix]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the mean and population variance of every column, accumulated in float64.
+
+    Sparse matrices are reduced without densifying; dense ones in row blocks.
+    """
+    n_rows = X.shape[0]
+    if n_rows == 0:
+        return np.zeros(X.shape[1]), np.zeros(X.shape[1])
+    if sparse.issparse(X):
+        X = sparse.csr_matrix(X)
+        sums = np.asarray(X.sum(axis=0, dtype=np.float64)).ravel()
+        squares = np.asarray(X.multiply(X).sum(axis=0, dtype=np.float64)).ravel()
+    else:
+        sums = np.zeros(X.shape[1])
+        squares = np.zeros(X.shape[1])
+        for start in range(0, n_rows, VARIANCE_BLOCK_ROWS):
+            block = np.asarray(X[start:start + VARIANCE_BLOCK_ROWS], dtype=np.float64)
+            sums += block.sum(axis=0)
+            squares += np.einsum('ij,ij->j', block, block)
+    means = sums / n_rows
+    return means, np.maximum(squares / n_rows - means ** 2, 0.0)
+
+
+def correlated_features(X: Union[np.ndarray, sparse.spmatrix], threshold: float,
+                        candidates: Optional[np.ndarray] = None,
+                        block_size: int = CORRELATION_BLOCK_SIZE) -> Dict[int, Tuple[int, float]]:
+    """
+    Find features highly correlated with an earlier kept feature, greedily in column order.
+
+    Pearson correlations come from the Gram matrix X[:, block].T @ X[:, :block_end]
+    of one block of columns at a time, in X's dtype (sparse products stay sparse),
+    so memory is block_size x n_features rather than n_features squared.
+
+    Args:
+        X: Rows to correlate (typically a sample)
+        threshold: Absolute correlation above which the later feature is dropped
+        candidates: Boolean mask of the features to consider (default all)
+        block_size: Features per block
+
+    Returns:
+        Mapping of dropped column index to (index of the kept feature it duplicates, correlation)
+    """
+    n_rows, n_features = X.shape
+    kept = np.ones(n_features, dtype=bool) if candidates is None else candidates.copy()
+    dropped = {}
+    if n_rows < 2:
+        return dropped
+    means, variances = column_moments(X)
+    stds = np.sqrt(variances)
+    # Constant features correlate with nothing
+    kept &= stds > 0
+    X = X.tocsc() if sparse.issparse(X) else X
+    for start in range(0, n_features, block_size):
+        end = min(start + block_size, n_features)
+        if not kept[start:end].any():
+            continue
+        gram = X[:, start:end].T @ X[:, :end]
+        gram = gram.toarray() if sparse.issparse(gram) else np.asarray(gram)
+        covariance = gram.astype(np.float64) / n_rows - np.outer(means[start:end], means[:end])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(stds[start:end], stds[:end])
+        correlation = np.abs(np.nan_to_num(correlation, nan=0.0, posinf=0.0, neginf=0.0))
+        for j in range(start, end):
+            if not kept[j]:
+                continue
+            # Earlier features still kept, including those kept earlier in this block
+            earlier = np.flatnonzero(kept[:j])
+            if not len(earlier):
+                continue
+            row = correlation[j - start, earlier]
+            best = int(row.argmax())
+            if row[best] > threshold:
+                kept[j] = False
+                dropped[j] = (int(earlier[best]), float(row[best]))
+    return dropped
+
+
+class FeatureSelector:
+    """
+    Post-encoding stage that removes uninformative features and optionally projects the rest.
+
+    Fitted on the output of the ColumnTransformer, it drops features with a
+    variance at or below variance_threshold (e.g. one-hot levels seen in a
+    handful of rows), then features whose absolute correlation with an
+    earlier kept feature exceeds correlation_threshold, and finally applies
+    a randomized TruncatedSVD with n_components when set, which accepts
+    sparse input. Dropped features are remembered by name, so the selection
+    can be re-applied after partial_fit adds one-hot columns.
+    """
+
+    def __init__(self, variance_threshold: Optional[float] = None, correlation_threshold: Optional[float] = None,
+                 n_components: Optional[int] = None, sample_rows: int = CORRELATION_SAMPLE_ROWS,
+                 block_size: int = CORRELATION_BLOCK_SIZE, random_state: int = 0):
+        self.variance_threshold = variance_threshold
+        self.correlation_threshold = correlation_threshold
+        self.n_components = n_components
+        self.sample_rows = sample_rows
+        self.block_size = block_size
+        self.random_state = random_state
+        self.input_features = None
+        self.feature_names_out = None
+        self.keep = None
+        self.svd = None
+        self.low_variance = []
+        self.correlated = []
+
+    def fit(self, X: Union[np.ndarray, sparse.spmatrix], feature_names: Sequence[str]) -> 'FeatureSelector':
+        """
+        Decide which features to keep (and fit the projection) from transformed rows.
+
+        Args:
+            X: Output of the fitted ColumnTransformer
+            feature_names: Names of its columns
+        """
+        self.fit_transform(X, feature_names)
+        return self
+
+    def fit_transform(self, X: Union[np.ndarray, sparse.spmatrix],
+                      feature_names: Sequence[str]) -> Union[np.ndarray, sparse.spmatrix]:
+        """Fit on X and return it with the selection (and projection) applied."""
+        self.input_features = [str(name) for name in feature_names]
+        n_features = X.shape[1]
+        kept = np.ones(n_features, dtype=bool)
+        self.low_variance = []
+        self.correlated = []
+
+        if self.variance_threshold is not None:
+            _, variances = column_moments(X)
+            low = variances <= self.variance_threshold
+            # Always keep at least one feature
+            if low.all() and n_features:
+                low[int(variances.argmax())] = False
+            kept &= ~low
+            self.low_variance = [self.input_features[i] for i in np.flatnonzero(low)]
+
+        if self.correlation_threshold is not None and kept.sum() > 1:
+            sample = X
+            if X.shape[0] > self.sample_rows:
+                rng = np.random.default_rng(self.random_state)
+                sample = X[np.sort(rng.choice(X.shape[0], self.sample_rows, replace=False))]
+            dropped = correlated_features(sample, self.correlation_threshold, candidates=kept,
+                                          block_size=self.block_size)
+            for j, (k, correlation) in sorted(dropped.items()):
+                kept[j] = False
+                self.correlated.append({'feature': self.input_features[j], 'correlated_with': self.input_features[k],
+                                        'correlation': round(correlation, 4)})
+
+        self.keep = np.flatnonzero(kept)
+        X = self._select(X)
+        selected = [self.input_features[i] for i in self.keep]
+        self.svd = None
+        if self.n_components:
+            # scikit-learn is only imported when a projection is requested
+            from sklearn.decomposition import TruncatedSVD
+            n_components = min(self.n_components, len(selected) - 1, X.shape[0] - 1)
+            if n_components >= 1:
+                self.svd = TruncatedSVD(n_components=n_components, algorithm='randomized',
+                                        random_state=self.random_state)
+                X = self.svd.fit_transform(X).astype(X.dtype, copy=False)
+                selected = [f'svd_{i}' for i in range(n_components)]
+            else:
+                logger.warning(f"Too few features or rows for an SVD projection, keeping {len(selected)} features")
+        self.feature_names_out = selected
+        logger.info(f"Feature selection kept {len(self.keep)} of {n_features} features "
+                    f"({len(self.low_variance)} low-variance, {len(self.correlated)} correlated)"
+                    + (f", projected to {len(selected)} SVD components" if self.svd is not None else ''))
+        return X
+
+    def _select(self, X: Union[np.ndarray, sparse.spmatrix]) -> Union[np.ndarray, sparse.spmatrix]:
+        if len(self.keep) == X.shape[1]:
+            return X
+        if sparse.issparse(X):
+            return sparse.csr_matrix(X)[:, self.keep]
+        return X[:, self.keep]
+
+    def transform(self, X: Union[np.ndarray, sparse.spmatrix]) -> Union[np.ndarray, sparse.spmatrix]:
+        """Apply the fitted selection (and projection) to transformed rows."""
+        if self.keep is None:
+            raise ValueError("FeatureSelector has not been fitted")
+        if X.shape[1] != len(self.input_features):
+            raise ValueError(f"Expected {len(self.input_features)} features, got {X.shape[1]}")
+        X = self._select(X)
+        if self.svd is not None:
+            X = self.svd.transform(X).astype(X.dtype, copy=False)
+        return X
+
+    def realign(self, feature_names: Sequence[str]) -> None:
+        """
+        Re-apply the selection to a new feature layout (e.g. after one-hot columns were added).
+
+        Features that were dropped stay dropped, new ones are kept.
+
+        Raises:
+            ValueError: the selector projects onto SVD components, which are fitted to the old layout
+        """
+        if self.svd is not None:
+            raise ValueError("The SVD projection was fitted on the original features; fit the cleaner again "
+                             "instead of adding categories")
+        dropped = set(self.low_variance) | {item['feature'] for item in self.correlated}
+        self.input_features = [str(name) for name in feature_names]
+        self.keep = np.array([i for i, name in enumerate(self.input_features) if name not in dropped], dtype=np.intp)
+        self.feature_names_out = [self.input_features[i] for i in self.keep]
+
+    def summary(self) -> Dict[str, Any]:
+        """Report of the fitted selection, for preprocessing_summary."""
+        report = {
+            'features_in': len(self.input_features),
+            'features_out': len(self.feature_names_out),
+            'variance_threshold': self.variance_threshold,
+            'correlation_threshold': self.correlation_threshold,
+            'low_variance_features': list(self.low_variance),
+            'correlated_features': list(self.correlated)
+        }
+        if self.svd is not None:
+            report['svd_components'] = int(self.svd.n_components)
+            report['explained_variance_ratio'] = round(float(self.svd.explained_variance_ratio_.sum()), 6)
+        return report
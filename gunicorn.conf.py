@@ -0,0 +1,21 @@
+"""
+gunicorn settings for serving the app: gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master process (preload_app) and warmed up
+there before the workers are forked (app.warm_up), so every worker starts
+with pandas, NumPy and scikit-learn already imported. Set WARM_UP=0 to skip
+the warm-up, e.g. when workers are recycled often and memory matters more.
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first workers are forked
+    if os.environ.get('WARM_UP', '1') != '0':
+        from app import warm_up
+        timings = warm_up()
+        server.log.info(f"Warmed up in {sum(timings.values()):.2f}s")
@@ -0,0 +1,566 @@
+from __future__ import annotations
+
+import io
+import os
+import zlib
+import uuid
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, BinaryIO, Iterable, Tuple
+
+from lazy_imports import lazy_module
+
+from dataset_cache import ChunkProfiler, write_manifest
+from session_store import SessionStore
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads are only locked within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+COPY_BLOCK_SIZE = 1024 * 1024
+# Decompressed bytes collected before whole records are parsed into the profile
+PARSE_BLOCK_SIZE = 16 * 1024 * 1024
+QUOTE = ord('"')
+NEWLINE = ord('\n')
+
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """Return 'gzip' or 'zstd' if the first bytes of a file carry that magic number, else None."""
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return None
+
+
+def record_ends(buffer: bytes) -> np.ndarray:
+    """
+    Offsets just past each newline that ends a CSV record in buffer.
+
+    Newlines inside quoted fields are skipped: a newline ends a record only
+    after an even number of quote characters (escaped quotes come in pairs).
+    The buffer must start at a record boundary.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    newlines = np.flatnonzero(data == NEWLINE)
+    if len(newlines) and b'"' in buffer:
+        # Only the parity matters, so the count may wrap around in uint8
+        quotes = np.cumsum(data == QUOTE, dtype=np.uint8)
+        newlines = newlines[(quotes[newlines] & 1) == 0]
+    return newlines + 1
+
+
+class _GzipDecoder:
+    """Streaming gzip decompression, including files of several concatenated members."""
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    @property
+    def complete(self) -> bool:
+        return self._decompressor.eof
+
+    def decompress(self, data: bytes):
+        """Yield the decompressed bytes of data, in blocks of at most COPY_BLOCK_SIZE."""
+        while data:
+            if self._decompressor.eof:
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                # Bounded output per call keeps a small, highly compressed chunk from exhausting memory
+                yield self._decompressor.decompress(data, COPY_BLOCK_SIZE)
+            except zlib.error as e:
+                raise ValueError(f"Invalid gzip data: {e}") from None
+            data = self._decompressor.unconsumed_tail or self._decompressor.unused_data
+
+
+class _ZstdDecoder:
+    """Streaming zstd decompression (requires the zstandard package)."""
+
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    @property
+    def complete(self) -> bool:
+        return getattr(self._decompressor, 'eof', True)
+
+    def decompress(self, data: bytes):
+        """Yield the decompressed bytes of data."""
+        yield self._decompressor.decompress(data)
+
+
+class IngestStream:
+    """
+    Turns uploaded bytes, fed in arbitrary pieces, into a CSV file with its hashes and profile.
+
+    gzip uploads (and zstd ones when the zstandard package is installed) are
+    recognised by their magic number and decompressed as they arrive. The CSV
+    bytes are appended to output_path and hashed, and whole records are
+    parsed in blocks of PARSE_BLOCK_SIZE into a ChunkProfiler, so the profile
+    is complete as soon as the last byte is in and the file is never read
+    again for it.
+    """
+
+    def __init__(self, output_path: str, raw_path: Optional[str] = None, profile: bool = True,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            output_path: CSV file to write
+            raw_path: Where to keep the received bytes of compressed uploads, so the
+                stream can be rebuilt (see resume); None to discard them
+            profile: Whether to profile the CSV while it is written
+            max_bytes: Largest accepted CSV size after decompression
+        """
+        self.output_path = output_path
+        self.raw_path = raw_path
+        self.max_bytes = max_bytes
+        self.compression = None
+        self.raw_bytes = 0
+        self.content_bytes = 0
+        self.profiler = ChunkProfiler() if profile else None
+        self._started = False
+        self._replaying = False
+        # Set once a resumed stream replayed the bytes already in its files
+        self._resumed = False
+        self._decoder = None
+        self._raw_hash = hashlib.sha256()
+        self._content_hash = self._raw_hash
+        self._raw_file = None
+        self._content_file = None
+        self._header = None
+        self._pending = []
+        self._pending_bytes = 0
+
+    @classmethod
+    def resume(cls, output_path: str, raw_path: Optional[str], received: int, **kwargs) -> 'IngestStream':
+        """
+        Rebuild the stream of an upload from the first `received` bytes already on disk.
+
+        Bytes beyond `received` (from a chunk that failed half-way) are discarded.
+
+        Returns:
+            IngestStream ready for the byte at offset `received`
+        """
+        stream = cls(output_path, raw_path, **kwargs)
+        if not received:
+            for path in (output_path, raw_path):
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+            return stream
+        compressed = raw_path is not None and os.path.exists(raw_path)
+        source = raw_path if compressed else output_path
+        os.truncate(source, received)
+        stream._replaying = True
+        try:
+            with open(source, 'rb') as f:
+                for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                    stream.write(block)
+        except Exception:
+            stream.close()
+            raise
+        stream._replaying = False
+        stream._resumed = True
+        logger.info(f"Replayed {received} received bytes of {os.path.basename(output_path)}")
+        return stream
+
+    def _start(self, head: bytes) -> None:
+        self._started = True
+        self.compression = detect_compression(head)
+        if self.compression is None:
+            return
+        if self.compression == 'zstd' and not HAS_ZSTD:
+            raise ValueError("zstd-compressed uploads need the zstandard package; upload plain or gzip CSV instead")
+        self._decoder = _GzipDecoder() if self.compression == 'gzip' else _ZstdDecoder()
+        self._content_hash = hashlib.sha256()
+        # The CSV of a compressed upload is always regenerated from the raw bytes, also when replaying
+        self._content_file = open(self.output_path, 'wb')
+
+    def write(self, data: bytes) -> None:
+        """Add the next received bytes."""
+        if not data:
+            return
+        if not self._started:
+            self._start(data[:len(ZSTD_MAGIC)])
+        self.raw_bytes += len(data)
+        self._raw_hash.update(data)
+        if self._decoder is None:
+            self._consume(data)
+            return
+        if self.raw_path is not None and not self._replaying:
+            if self._raw_file is None:
+                self._raw_file = open(self.raw_path, 'ab' if self._resumed else 'wb')
+            self._raw_file.write(data)
+        for piece in self._decoder.decompress(data):
+            self._consume(piece)
+
+    def _consume(self, data: bytes) -> None:
+        """Write, hash and queue for profiling a piece of the CSV."""
+        if not data:
+            return
+        self.content_bytes += len(data)
+        if self.max_bytes is not None and self.content_bytes > self.max_bytes:
+            raise ValueError(f"CSV is larger than {self.max_bytes // 1024 ** 2}MB after decompression")
+        if self._decoder is not None:
+            self._content_hash.update(data)
+            self._content_file.write(data)
+        elif not self._replaying:
+            if self._content_file is None:
+                self._content_file = open(self.output_path, 'ab' if self._resumed else 'wb')
+            self._content_file.write(data)
+
+        if self.profiler is not None:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            if self._pending_bytes >= PARSE_BLOCK_SIZE:
+                self._parse(final=False)
+
+    def _parse(self, final: bool) -> None:
+        """Profile the whole records collected so far (all of them at the end of the file)."""
+        buffer = b''.join(self._pending)
+        if final:
+            end = len(buffer)
+        else:
+            ends = record_ends(buffer)
+            end = int(ends[-1]) if len(ends) else 0
+        block, rest = buffer[:end], buffer[end:]
+        self._pending = [rest] if rest else []
+        self._pending_bytes = len(rest)
+
+        if self._header is None and block:
+            ends = record_ends(block)
+            header_end = int(ends[0]) if len(ends) else len(block)
+            self._header, block = block[:header_end], block[header_end:]
+        if block.strip():
+            # Every block is parsed under the header so column names and dtype inference match pd.read_csv
+            self.profiler.update(pd.read_csv(io.BytesIO(self._header + block)))
+
+    def flush(self) -> None:
+        """Flush written bytes to disk."""
+        for f in (self._raw_file, self._content_file):
+            if f is not None:
+                f.flush()
+
+    def close(self) -> None:
+        """Close the files of the stream (after finish or to abandon it)."""
+        for f in (self._raw_file, self._content_file):
+            if f is not None:
+                f.close()
+        self._raw_file = self._content_file = None
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Complete the file once every byte was written.
+
+        Returns:
+            Dictionary with 'content_hash' (SHA-256 of the CSV), 'raw_sha256' (of the
+            received bytes), 'compression', 'bytes' (CSV size), 'raw_bytes' and
+            'profile' (None unless profiling)
+        """
+        try:
+            if self._decoder is not None and not self._decoder.complete:
+                raise ValueError(f"The {self.compression} stream ended early; the upload is truncated")
+            if self._content_file is None and self._decoder is None and not self._resumed:
+                # Empty upload
+                open(self.output_path, 'wb').close()
+            profile = None
+            if self.profiler is not None:
+                self._parse(final=True)
+                profile = self.profiler.result()
+                if not profile['column_names'] and self._header:
+                    profile['column_names'] = pd.read_csv(io.BytesIO(self._header), nrows=0).columns.tolist()
+                    profile['columns'] = len(profile['column_names'])
+        finally:
+            self.close()
+        return {
+            'content_hash': self._content_hash.hexdigest(),
+            'raw_sha256': self._raw_hash.hexdigest(),
+            'compression': self.compression,
+            'bytes': self.content_bytes,
+            'raw_bytes': self.raw_bytes,
+            'profile': profile
+        }
+
+
+def ingest_file(stream: BinaryIO, output_path: str, profile: bool = True,
+                max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Write an uploaded file stream to output_path as CSV, decompressing, hashing and profiling it on the way.
+
+    Args:
+        stream: Readable binary stream (e.g. werkzeug FileStorage.stream)
+        output_path: Destination of the CSV
+        profile: Whether to profile the CSV while it is written
+        max_bytes: Largest accepted CSV size after decompression
+
+    Returns:
+        IngestStream.finish result
+    """
+    # Written under a temporary name and renamed once complete, so a partial upload is never read
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    ingest = IngestStream(tmp_path, profile=profile, max_bytes=max_bytes)
+    try:
+        for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+            ingest.write(block)
+        result = ingest.finish()
+    except Exception:
+        ingest.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return result
+
+
+def ingest_shards(sources: Iterable[Tuple[str, BinaryIO]], directory: str,
+                  max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Write several CSV files (plain or compressed) into one sharded dataset folder.
+
+    Args:
+        sources: (client file name, readable binary stream) per shard, in the order of their rows
+        directory: Dataset folder to create
+        max_bytes: Largest accepted total CSV size after decompression
+
+    Returns:
+        Manifest of the folder (see dataset_cache.write_manifest)
+    """
+    os.makedirs(directory)
+    shards = []
+    received = 0
+    for name, stream in sources:
+        shard_file = f"part-{len(shards):05d}.csv"
+        result = ingest_file(stream, os.path.join(directory, shard_file), profile=False,
+                             max_bytes=None if max_bytes is None else max_bytes - received)
+        received += result['bytes']
+        shards.append({'file': shard_file, 'original_name': name, 'content_hash': result['content_hash'],
+                       'bytes': result['bytes']})
+    if not shards:
+        raise ValueError("No CSV files found in the upload")
+    return write_manifest(directory, shards)
+
+
+class UploadConflict(ValueError):
+    """A chunk sent for another offset than the next expected one."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class ResumableUploads:
+    """
+    Chunked uploads that survive dropped connections.
+
+    The state of each upload (owner, file name, expected size and checksum,
+    bytes received) lives in a SessionStore shared by all web workers and its
+    bytes in '<folder>/<upload_id>.csv' (plus '.raw' for compressed uploads).
+    Chunks are accepted only at the current offset, so a client that lost a
+    response asks for the offset and continues from there. Each worker keeps
+    the IngestStream of the uploads it receives, so decompression, hashing
+    and profiling progress with every chunk; a worker that gets a chunk for
+    an upload it has no current stream for rebuilds it from the bytes on disk.
+    """
+
+    def __init__(self, store: SessionStore, folder: str, max_bytes: Optional[int] = None, open_streams: int = 32):
+        self.store = store
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.open_streams = open_streams
+        self._streams = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, upload_id: str, extension: str) -> str:
+        return os.path.join(self.folder, f"{upload_id}.{extension}")
+
+    @contextmanager
+    def _locked(self, upload_id: str):
+        """Serialise work on one upload across threads and (where fcntl exists) processes."""
+        with self._lock:
+            lock = self._locks.setdefault(upload_id, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path(upload_id, 'lock'), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def create(self, owner: str, filename: str, size: Optional[int] = None,
+               checksum: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Start an upload.
+
+        Args:
+            owner: Session id of the uploader
+            filename: Client file name
+            size: Total bytes the client will send, if known
+            checksum: Hex SHA-256 of those bytes, if known (can also be given on completion)
+
+        Returns:
+            Upload state, with 'upload_id' and 'received'
+        """
+        upload_id = uuid.uuid4().hex
+        state = {'upload_id': upload_id, 'owner': owner, 'filename': filename, 'size': size,
+                 'checksum': checksum.lower() if checksum else None, 'received': 0, 'created_at': time.time()}
+        self.store.set(upload_id, state)
+        return state
+
+    def get(self, upload_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        """Return the state of an upload started by owner, or None."""
+        state = self.store.get(upload_id)
+        if not state or state.get('owner') != owner:
+            return None
+        return state
+
+    def _stream(self, state: Dict[str, Any]) -> IngestStream:
+        """Return the upload's stream, rebuilt from disk unless this worker holds an up-to-date one."""
+        upload_id = state['upload_id']
+        with self._lock:
+            stream = self._streams.pop(upload_id, None)
+        if stream is not None and stream.raw_bytes != state['received']:
+            # Chunks went to another worker meanwhile
+            stream.close()
+            stream = None
+        if stream is None:
+            stream = IngestStream.resume(self._path(upload_id, 'csv'), self._path(upload_id, 'raw'),
+                                         state['received'], max_bytes=self.max_bytes)
+        return stream
+
+    def _keep(self, upload_id: str, stream: IngestStream) -> None:
+        with self._lock:
+            self._streams[upload_id] = stream
+            while len(self._streams) > self.open_streams:
+                _, evicted = self._streams.popitem(last=False)
+                evicted.close()
+
+    def append(self, upload_id: str, offset: int, data: BinaryIO) -> Dict[str, Any]:
+        """
+        Add a chunk read from data at offset.
+
+        Raises:
+            UploadConflict: offset is not the number of bytes received so far
+            ValueError: the upload is unknown, too large or its data is not valid
+
+        Returns:
+            Updated upload state
+        """
+        with self._locked(upload_id):
+            state = self.store.get(upload_id)
+            if not state:
+                raise ValueError(f"Upload {upload_id} not found")
+            if offset != state['received']:
+                raise UploadConflict(f"Expected offset {state['received']}, got {offset}", state['received'])
+            stream = self._stream(state)
+            try:
+                for block in iter(lambda: data.read(COPY_BLOCK_SIZE), b''):
+                    if state['size'] is not None and stream.raw_bytes + len(block) > state['size']:
+                        raise ValueError(f"Upload is larger than the declared {state['size']} bytes")
+                    stream.write(block)
+                stream.flush()
+            except Exception:
+                # The received part is cut back to the last acknowledged offset when the stream is rebuilt
+                stream.close()
+                raise
+            self._keep(upload_id, stream)
+            return self.store.update(upload_id, received=stream.raw_bytes)
+
+    def complete(self, upload_id: str, destination: str, checksum: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Finish an upload: verify its size and checksum and move the CSV to destination.
+
+        Args:
+            upload_id: Upload to finish
+            destination: Path of the finished CSV
+            checksum: Hex SHA-256 of the uploaded bytes, overriding the one given on creation
+
+        Raises:
+            ValueError: the upload is unknown, incomplete, corrupt or does not match the checksum
+
+        Returns:
+            IngestStream.finish result for the whole file
+        """
+        with self._locked(upload_id):
+            state = self.store.get(upload_id)
+            if not state:
+                raise ValueError(f"Upload {upload_id} not found")
+            if state['size'] is not None and state['received'] != state['size']:
+                raise ValueError(f"Upload is incomplete: received {state['received']} of {state['size']} bytes")
+            result = self._stream(state).finish()
+            expected = (checksum or state['checksum'] or '').lower()
+            if expected and expected != result['raw_sha256']:
+                self._remove(upload_id)
+                raise ValueError("Checksum mismatch: the uploaded bytes differ from the file; upload it again")
+            os.replace(self._path(upload_id, 'csv'), destination)
+            self._remove(upload_id)
+        logger.info(f"Completed upload {upload_id} of {state['filename']} ({result['raw_bytes']} bytes received)")
+        return result
+
+    def abort(self, upload_id: str) -> None:
+        """Discard an upload and its received bytes."""
+        with self._locked(upload_id):
+            self._remove(upload_id)
+
+    def evict_expired(self, min_age: float = 0.0) -> int:
+        """
+        Forget uploads idle for longer than the store's TTL and delete received bytes no live upload owns.
+
+        Args:
+            min_age: Files modified within this many seconds are kept
+
+        Returns:
+            Number of files removed
+        """
+        self.store.evict_expired()
+        live = {upload_id for upload_id, _, _ in self.store.items()}
+        removed = 0
+        for entry in os.scandir(self.folder):
+            upload_id = entry.name.split('.', 1)[0]
+            try:
+                if upload_id in live or time.time() - entry.stat().st_mtime < min_age:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                stream = self._streams.pop(upload_id, None)
+                self._locks.pop(upload_id, None)
+            if stream is not None:
+                stream.close()
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} files of abandoned uploads")
+        return removed
+
+    def _remove(self, upload_id: str) -> None:
+        with self._lock:
+            stream = self._streams.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+        if stream is not None:
+            stream.close()
+        for extension in ('csv', 'raw', 'lock'):
+            path = self._path(upload_id, extension)
+            if os.path.exists(path):
+                os.remove(path)
+        self.store.delete(upload_id)
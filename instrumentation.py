@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterable
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Per-column debug messages go to this logger, which stays quiet unless opted in, so wide
+# datasets do not pay for formatting one message per column
+COLUMN_LOGGER_NAME = 'automl_engine.columns'
+column_logger = logging.getLogger(COLUMN_LOGGER_NAME)
+
+
+def configure_column_logging(enabled: Optional[bool] = None) -> None:
+    """
+    Enable or disable per-column debug logging.
+
+    Args:
+        enabled: True to log every column at DEBUG level; defaults to the
+            AUTOML_COLUMN_DEBUG environment variable
+    """
+    if enabled is None:
+        enabled = os.environ.get('AUTOML_COLUMN_DEBUG', '').lower() in ('1', 'true', 'yes')
+    column_logger.setLevel(logging.DEBUG if enabled else logging.INFO)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Return the peak resident set size of this process so far, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+class StageProfiler:
+    """
+    Collects wall time, rows, throughput and peak RSS per processing stage.
+
+    A stage entered several times (e.g. 'transform' once per chunk) is
+    aggregated into one record with a call count. Peak RSS is the process
+    high-water mark when the stage last finished.
+    """
+
+    def __init__(self):
+        self._stages = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None):
+        """
+        Time a block as a stage.
+
+        Yields:
+            Dictionary whose 'rows' and 'output_bytes' may be set inside the block
+        """
+        info = {'rows': rows}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(name, time.perf_counter() - start, rows=info.get('rows'),
+                        output_bytes=info.get('output_bytes'))
+
+    def record(self, name: str, seconds: float, rows: Optional[int] = None,
+               output_bytes: Optional[int] = None) -> None:
+        """Add a measurement to a stage."""
+        with self._lock:
+            entry = self._stages.setdefault(name, {'stage': name, 'calls': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            if rows is not None:
+                entry['rows'] = entry.get('rows', 0) + int(rows)
+            if output_bytes is not None:
+                entry['output_bytes'] = entry.get('output_bytes', 0) + int(output_bytes)
+            entry['peak_rss_bytes'] = peak_rss_bytes()
+
+    def merge(self, other: 'StageProfiler') -> None:
+        """Add the stages of another profiler (e.g. the cleaner's) to this one."""
+        with other._lock:
+            stages = [dict(entry) for entry in other._stages.values()]
+        with self._lock:
+            for stage in stages:
+                entry = self._stages.setdefault(stage['stage'], {'stage': stage['stage'], 'calls': 0, 'seconds': 0.0})
+                entry['calls'] += stage['calls']
+                entry['seconds'] += stage['seconds']
+                for key in ('rows', 'output_bytes'):
+                    if stage.get(key) is not None:
+                        entry[key] = entry.get(key, 0) + stage[key]
+                if stage.get('peak_rss_bytes') is not None:
+                    entry['peak_rss_bytes'] = max(entry.get('peak_rss_bytes') or 0, stage['peak_rss_bytes'])
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Return one JSON-serializable record per stage, in the order stages first ran."""
+        with self._lock:
+            stages = [dict(entry) for entry in self._stages.values()]
+        for entry in stages:
+            entry['seconds'] = round(entry['seconds'], 6)
+            if entry.get('rows') is not None:
+                entry['rows_per_sec'] = round(entry['rows'] / entry['seconds'], 1) if entry['seconds'] > 0 else None
+            if entry.get('peak_rss_bytes') is not None:
+                entry['peak_rss_mb'] = round(entry.pop('peak_rss_bytes') / 1024 ** 2, 1)
+        return stages
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters rendered in the Prometheus text exposition format.
+
+    Each web worker process has its own registry; stage timings measured in
+    job worker processes are added here when the job's result comes back.
+    """
+
+    def __init__(self, namespace: str = 'automl'):
+        self.namespace = namespace
+        self._counters = OrderedDict()
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Increase a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def record_stages(self, stages: Iterable[Dict[str, Any]]) -> None:
+        """Add the per-stage records of a StageProfiler summary."""
+        for stage in stages:
+            self.inc('stage_seconds_total', stage['seconds'], stage=stage['stage'])
+            self.inc('stage_calls_total', stage.get('calls', 1), stage=stage['stage'])
+            if stage.get('rows') is not None:
+                self.inc('stage_rows_total', stage['rows'], stage=stage['stage'])
+            if stage.get('output_bytes') is not None:
+                self.inc('stage_output_bytes_total', stage['output_bytes'], stage=stage['stage'])
+
+    def render(self) -> str:
+        """Return every counter, plus the process peak RSS gauge, as Prometheus text."""
+        with self._lock:
+            counters = list(self._counters.items())
+        lines = []
+        seen = set()
+        for (name, labels), value in sorted(counters, key=lambda item: item[0]):
+            full_name = f"{self.namespace}_{name}"
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+            lines.append(f"{full_name}{{{label_text}}} {value:g}" if label_text else f"{full_name} {value:g}")
+
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines.append(f"# HELP {self.namespace}_process_peak_rss_bytes Peak resident set size of this worker")
+            lines.append(f"# TYPE {self.namespace}_process_peak_rss_bytes gauge")
+            lines.append(f"{self.namespace}_process_peak_rss_bytes {peak}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Registry for the current process, shared by the app and the preprocessing jobs it runs inline
+metrics = MetricsRegistry()
+metrics.describe('stage_seconds_total', 'Wall time spent per processing stage')
+metrics.describe('stage_calls_total', 'Times each processing stage ran')
+metrics.describe('stage_rows_total', 'Rows handled per processing stage')
+metrics.describe('stage_output_bytes_total', 'Bytes written per output stage')
+metrics.describe('requests_total', 'Handled requests by endpoint and status')
+metrics.describe('jobs_total', 'Finished preprocessing jobs by status')
+metrics.describe('result_cache_total', 'Preprocessing result cache lookups by outcome')
+metrics.describe('uploads_deduplicated_total', 'Uploads whose content was already stored')
+
+configure_column_logging()
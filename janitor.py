@@ -0,0 +1,440 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from dataset_cache import release_upload
+from instrumentation import metrics
+from output_formats import output_files
+from artifact_store import ARTIFACT_ID_PATTERN
+from preview import preview_dir, remove_preview
+from session_store import SessionStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: passes are only serialised within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Suffixes of files being written (renamed into place when complete)
+TEMPORARY_SUFFIXES = ('.tmp', '.link')
+LOCK_FILENAME = '.janitor.lock'
+
+metrics.describe('janitor_removed_total', 'Files and folders removed by the disk janitor, by folder and reason')
+metrics.describe('janitor_bytes_freed_total', 'Bytes freed by the disk janitor, by folder')
+
+
+def session_outputs(state: Dict[str, Any]) -> List[Tuple[str, Optional[str]]]:
+    """Return (path, format) of the processed output of a session state and of its exports and shards."""
+    if not state.get('processed_filepath'):
+        return []
+    outputs = [(state['processed_filepath'], state.get('processed_format'))]
+    outputs += [(path, fmt) for fmt, path in (state.get('processed_exports') or {}).items()]
+    for key, paths in (state.get('processed_shards') or {}).items():
+        outputs += [(path, key.split(':')[0]) for path in paths]
+    return outputs
+
+
+def session_files(state: Dict[str, Any]) -> List[str]:
+    """Return every file and folder a session state refers to (upload, outputs, preview index)."""
+    paths = [state['filepath']] if state.get('filepath') else []
+    for path, fmt in session_outputs(state):
+        paths += output_files(path, fmt)
+    if state.get('processed_filepath'):
+        paths.append(preview_dir(state['processed_filepath']))
+    return paths
+
+
+def release_session_files(state: Dict[str, Any], blob_dir: str) -> None:
+    """Delete the upload, processed outputs and preview index of a session state."""
+    if state.get('filepath') and os.path.exists(state['filepath']):
+        release_upload(state['filepath'], state.get('content_hash'), blob_dir)
+        logger.info(f"Removed uploaded file: {state['filepath']}")
+    for path, fmt in session_outputs(state):
+        for output_file in output_files(path, fmt):
+            if os.path.exists(output_file):
+                os.remove(output_file)
+                logger.info(f"Removed processed file: {output_file}")
+    if state.get('processed_filepath'):
+        remove_preview(state['processed_filepath'])
+
+
+def _normalize(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _scan_entry(path: str) -> Dict[str, Any]:
+    """Return the last access time and the files (by inode) of a top-level file or folder."""
+    stat = os.stat(path)
+    last_access = max(stat.st_atime, stat.st_mtime)
+    inodes = {}
+    if os.path.isdir(path):
+        for directory, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    file_stat = os.stat(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    continue
+                last_access = max(last_access, file_stat.st_atime, file_stat.st_mtime)
+                inodes[(file_stat.st_dev, file_stat.st_ino)] = file_stat.st_size
+    else:
+        inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return {'path': path, 'last_access': last_access, 'inodes': inodes,
+            'temporary': path.endswith(TEMPORARY_SUFFIXES)}
+
+
+class Janitor:
+    """
+    Background eviction of uploads, processed outputs, cached datasets and artifacts.
+
+    Each pass evicts expired sessions (and abandoned resumable uploads), then
+    counts the references of live sessions to the files in the upload and
+    processed folders. Unreferenced files idle for longer than ttl_seconds are
+    deleted; while a folder is over its quota, the least recently accessed
+    unreferenced files go first, then the files of the least recently used
+    sessions, which are evicted with them. Disk usage counts each inode once,
+    so uploads deduplicated into blob_dir and outputs hard-linked into the
+    result cache are not charged twice, and a stored blob is deleted once no
+    upload links to it. Nothing accessed within grace_seconds is removed,
+    which covers files that are written but not yet recorded in a session.
+
+    Cached dataset profiles and copies (by content hash) and fitted artifacts
+    (by artifact id) are counted the same way, from live sessions and from the
+    entries of the result cache, and evicted by the same TTL and quota rules;
+    over quota, only unreferenced entries are removed.
+
+    Passes run every interval seconds in a daemon thread of each process that
+    calls start(); a lock file keeps processes sharing the folders from
+    running passes at the same time.
+    """
+
+    def __init__(self, session_store: SessionStore, upload_folder: str, processed_folder: str, blob_dir: str,
+                 ttl_seconds: float = 24 * 3600, upload_quota_bytes: Optional[int] = None,
+                 processed_quota_bytes: Optional[int] = None, grace_seconds: float = 600,
+                 interval: float = 600, exclude: Sequence[str] = (), expire_stores: Sequence[SessionStore] = (),
+                 resumable_uploads=None, dataset_cache=None, artifact_store=None, result_cache=None,
+                 cache_quota_bytes: Optional[int] = None, artifact_quota_bytes: Optional[int] = None):
+        self.session_store = session_store
+        self.upload_folder = upload_folder
+        self.processed_folder = processed_folder
+        self.blob_dir = blob_dir
+        self.ttl_seconds = ttl_seconds
+        self.quotas = {upload_folder: upload_quota_bytes, processed_folder: processed_quota_bytes}
+        self.grace_seconds = grace_seconds
+        self.interval = interval
+        self.exclude = {_normalize(path) for path in [blob_dir, *exclude]}
+        self.expire_stores = list(expire_stores)
+        self.resumable_uploads = resumable_uploads
+        self.dataset_cache = dataset_cache
+        self.artifact_store = artifact_store
+        self.result_cache = result_cache
+        self.cache_quota_bytes = cache_quota_bytes
+        self.artifact_quota_bytes = artifact_quota_bytes
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pass = threading.Lock()
+
+    def references(self, sessions: Optional[Dict[str, Tuple[Dict[str, Any], float]]] = None) -> Dict[str, List[Any]]:
+        """
+        Count the live sessions referring to each file.
+
+        Args:
+            sessions: (state, touched) by session id; read from the session store if not given
+
+        Returns:
+            Mapping of normalized path to [number of sessions, latest touched time, session ids]
+        """
+        if sessions is None:
+            sessions = {sid: (state, touched) for sid, state, touched in self.session_store.items()}
+        refs = {}
+        for sid, (state, touched) in sessions.items():
+            for path in session_files(state):
+                ref = refs.setdefault(_normalize(path), [0, 0.0, []])
+                ref[0] += 1
+                ref[1] = max(ref[1], touched)
+                ref[2].append(sid)
+        return refs
+
+    def store_references(self, sessions: Dict[str, Tuple[Dict[str, Any], float]]) -> Tuple[set, set]:
+        """
+        Collect the cached datasets and artifacts still in use.
+
+        Args:
+            sessions: (state, touched) by session id
+
+        Returns:
+            Content hashes and artifact ids referred to by live sessions or cached results
+        """
+        states = [state for state, _ in sessions.values()]
+        if self.result_cache is not None:
+            states += [result.get('session_updates', {}) for _, result in self.result_cache.results()]
+        hashes = {state['content_hash'] for state in states if state.get('content_hash')}
+        artifacts = {state['artifact_id'] for state in states if state.get('artifact_id')}
+        return hashes, artifacts
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Run one eviction pass now.
+
+        Returns:
+            Counts of 'sessions_expired', 'sessions_evicted', 'removed' entries and 'bytes_freed'
+            (all 0 when another process is running a pass)
+        """
+        stats = {'sessions_expired': 0, 'sessions_evicted': 0, 'removed': 0, 'bytes_freed': 0}
+        with self._pass, self._pass_lock() as acquired:
+            if not acquired:
+                return stats
+            stats['sessions_expired'] = self.session_store.evict_expired()
+            for store in self.expire_stores:
+                store.evict_expired()
+            if self.resumable_uploads is not None:
+                self.resumable_uploads.evict_expired(min_age=self.grace_seconds)
+
+            sessions = {sid: (state, touched) for sid, state, touched in self.session_store.items()}
+            refs = self.references(sessions)
+            for folder, quota in self.quotas.items():
+                self._clean_folder(folder, quota, sessions, refs, stats)
+            if self.dataset_cache is not None or self.artifact_store is not None:
+                hashes, artifacts = self.store_references(sessions)
+                if self.dataset_cache is not None:
+                    self._clean_store(self.dataset_cache.cache_dir, self.dataset_cache.entries(),
+                                      self.cache_quota_bytes, hashes, self.dataset_cache.remove, stats)
+                if self.artifact_store is not None:
+                    self._clean_store(self.artifact_store.root_dir, self._artifact_entries(),
+                                      self.artifact_quota_bytes, artifacts, self.artifact_store.delete, stats)
+        if stats['removed'] or stats['sessions_expired']:
+            logger.info(f"Janitor pass: {stats['sessions_expired']} sessions expired, {stats['sessions_evicted']} "
+                        f"evicted, {stats['removed']} entries removed, {stats['bytes_freed'] / 1024 ** 2:.1f}MB freed")
+        return stats
+
+    def _clean_folder(self, folder: str, quota: Optional[int], sessions: Dict[str, Tuple[Dict[str, Any], float]],
+                      refs: Dict[str, List[Any]], stats: Dict[str, int]) -> None:
+        entries = {}
+        for entry in os.scandir(folder):
+            path = _normalize(entry.path)
+            if entry.name.startswith('.') or path in self.exclude:
+                continue
+            try:
+                entries[path] = dict(_scan_entry(entry.path), key=path)
+            except FileNotFoundError:
+                continue
+        # Links per inode within the folder (blobs included), so shared files are charged once
+        blobs = self._scan_blobs() if folder == self.upload_folder else {}
+        links = Counter(inode for entry in entries.values() for inode in entry['inodes'])
+        links.update(blobs.keys())
+        sizes = {inode: size for entry in entries.values() for inode, size in entry['inodes'].items()}
+        sizes.update({inode: size for inode, (_, size) in blobs.items()})
+        usage = sum(sizes.values())
+        now = time.time()
+
+        def remove(entry: Dict[str, Any], reason: str) -> None:
+            nonlocal usage
+            if os.path.isdir(entry['path']):
+                shutil.rmtree(entry['path'], ignore_errors=True)
+            elif os.path.exists(entry['path']):
+                os.remove(entry['path'])
+            entries.pop(entry['key'], None)
+            freed = 0
+            for inode in entry['inodes']:
+                links[inode] -= 1
+                if links[inode] == 1 and inode in blobs:
+                    # Only the stored copy is left; release it like release_upload does
+                    blob_path = blobs.pop(inode)[0]
+                    try:
+                        if os.stat(blob_path).st_nlink == 1:
+                            os.remove(blob_path)
+                            links[inode] = 0
+                    except FileNotFoundError:
+                        links[inode] = 0
+                if links[inode] == 0:
+                    freed += sizes[inode]
+            usage -= freed
+            stats['removed'] += 1
+            stats['bytes_freed'] += freed
+            metrics.inc('janitor_removed_total', folder=folder, reason=reason)
+            metrics.inc('janitor_bytes_freed_total', freed, folder=folder)
+            logger.debug(f"Janitor removed {entry['path']} ({reason}, {freed} bytes freed)")
+
+        for inode, (blob_path, size) in list(blobs.items()):
+            # Stored copies no upload links to any more (e.g. left by a crash)
+            try:
+                stat = os.stat(blob_path)
+                if links[inode] > 1 or stat.st_nlink > 1 or now - stat.st_mtime <= self.grace_seconds:
+                    continue
+                os.remove(blob_path)
+            except FileNotFoundError:
+                pass
+            del blobs[inode]
+            links[inode] = 0
+            usage -= size
+            stats['removed'] += 1
+            stats['bytes_freed'] += size
+            metrics.inc('janitor_removed_total', folder=folder, reason='orphan')
+            metrics.inc('janitor_bytes_freed_total', size, folder=folder)
+
+        idle = sorted((entry for path, entry in entries.items()
+                       if path not in refs and now - entry['last_access'] > self.grace_seconds),
+                      key=lambda entry: entry['last_access'])
+        for entry in idle:
+            if now - entry['last_access'] > self.ttl_seconds:
+                remove(entry, 'ttl')
+        # Temporary files are only removed by age: a long write may not touch them for a while
+        idle = [entry for entry in idle if entry['key'] in entries and not entry['temporary']]
+        for entry in idle:
+            if quota is None or usage <= quota:
+                break
+            remove(entry, 'quota')
+        if quota is not None and usage > quota:
+            stats['sessions_evicted'] += self._evict_sessions(folder, quota, sessions, refs, entries, remove,
+                                                              lambda: usage)
+            if usage > quota:
+                logger.warning(f"{folder} uses {usage / 1024 ** 2:.1f}MB, over its quota of "
+                               f"{quota / 1024 ** 2:.1f}MB, with every file in recent use")
+
+    def _clean_store(self, folder: str, entries: Dict[str, Dict[str, Any]], quota: Optional[int],
+                     referenced: set, remove, stats: Dict[str, int]) -> None:
+        """Remove unreferenced store entries idle past the TTL, then least recently used ones while over quota."""
+        usage = sum(entry['bytes'] for entry in entries.values())
+        now = time.time()
+        idle = sorted((item for item in entries.items()
+                       if item[0] not in referenced and now - item[1]['last_access'] > self.grace_seconds),
+                      key=lambda item: item[1]['last_access'])
+        for key, entry in idle:
+            if now - entry['last_access'] > self.ttl_seconds:
+                reason = 'ttl'
+            elif quota is not None and usage > quota:
+                reason = 'quota'
+            else:
+                break
+            remove(key)
+            usage -= entry['bytes']
+            stats['removed'] += 1
+            stats['bytes_freed'] += entry['bytes']
+            metrics.inc('janitor_removed_total', folder=folder, reason=reason)
+            metrics.inc('janitor_bytes_freed_total', entry['bytes'], folder=folder)
+            logger.debug(f"Janitor removed {key} from {folder} ({reason}, {entry['bytes']} bytes freed)")
+        if quota is not None and usage > quota:
+            logger.warning(f"{folder} uses {usage / 1024 ** 2:.1f}MB, over its quota of "
+                           f"{quota / 1024 ** 2:.1f}MB, with every entry in use")
+
+    def _artifact_entries(self) -> Dict[str, Dict[str, Any]]:
+        """Return 'bytes' and 'last_access' of every artifact, by artifact id."""
+        entries = {}
+        for entry in os.scandir(self.artifact_store.root_dir):
+            if not entry.is_dir() or not ARTIFACT_ID_PATTERN.match(entry.name):
+                continue
+            try:
+                scanned = _scan_entry(entry.path)
+            except FileNotFoundError:
+                continue
+            entries[entry.name] = {'bytes': sum(scanned['inodes'].values()), 'last_access': scanned['last_access']}
+        return entries
+
+    def _evict_sessions(self, folder: str, quota: int, sessions: Dict[str, Tuple[Dict[str, Any], float]],
+                        refs: Dict[str, List[Any]], entries: Dict[str, Dict[str, Any]], remove, usage) -> int:
+        """Evict the least recently used sessions with files in folder until it fits its quota."""
+        candidates = sorted({sid for path, ref in refs.items() if path in entries for sid in ref[2]},
+                            key=lambda sid: sessions[sid][1])
+        now = time.time()
+        evicted = 0
+        for sid in candidates:
+            state, touched = sessions[sid]
+            if usage() <= quota or now - touched <= self.grace_seconds:
+                break
+            self.session_store.delete(sid)
+            evicted += 1
+            logger.info(f"Evicted session {sid[:8]} to bring {folder} within its quota")
+            for path in session_files(state):
+                ref = refs.get(_normalize(path))
+                if ref is None:
+                    continue
+                ref[0] -= 1
+                ref[2].remove(sid)
+                if ref[0]:
+                    # Still used by another session
+                    continue
+                del refs[_normalize(path)]
+                if _normalize(path) in entries:
+                    remove(entries[_normalize(path)], 'quota')
+                elif os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    os.remove(path)
+            if state.get('processed_filepath') and _normalize(preview_dir(state['processed_filepath'])) not in refs:
+                # Drop the open memory maps of the deleted index
+                remove_preview(state['processed_filepath'])
+        return evicted
+
+    def _scan_blobs(self) -> Dict[Tuple[int, int], Tuple[str, int]]:
+        """Return (path, size) of each stored upload copy by inode."""
+        blobs = {}
+        if not os.path.isdir(self.blob_dir):
+            return blobs
+        for entry in os.scandir(self.blob_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            blobs[(stat.st_dev, stat.st_ino)] = (entry.path, stat.st_size)
+        return blobs
+
+    def _pass_lock(self):
+        return _FileLock(os.path.join(self.upload_folder, LOCK_FILENAME))
+
+    def start(self) -> None:
+        """Start the background passes in this process (again after a fork); no-op if already running."""
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background passes."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Janitor pass failed: {e}")
+
+
+class _FileLock:
+    """Non-blocking exclusive lock on a file; the context value tells whether it was acquired."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self) -> bool:
+        if fcntl is None:
+            return True
+        self._file = open(self.path, 'a')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def __exit__(self, *exc) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
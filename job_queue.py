@@ -0,0 +1,137 @@
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Callable
+
+from session_store import SessionStore, MemorySessionStore
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+def _init_worker(log_level: int) -> None:
+    # Spawned workers start with unconfigured logging
+    logging.basicConfig(level=log_level)
+
+
+def _run_job(store: SessionStore, job_id: str, func: Callable, args: tuple,
+             progress_interval: float) -> Any:
+    """Run a job in a worker, recording its stage and row count in the shared store."""
+    store.update(job_id, status='running', stage='starting', started_at=time.time())
+    last = {'stage': None, 'time': 0.0}
+
+    def progress(stage: str, rows_processed: int = 0) -> None:
+        # Stage changes are always recorded; row counts within a stage are throttled
+        now = time.time()
+        if stage == last['stage'] and now - last['time'] < progress_interval:
+            return
+        last['stage'], last['time'] = stage, now
+        store.update(job_id, stage=stage, rows_processed=int(rows_processed))
+
+    return func(*args, progress=progress)
+
+
+class JobQueue:
+    """
+    Background queue for long-running requests, with progress visible to every web worker.
+
+    Jobs run in a process pool (or a thread pool) and report their stage and
+    rows processed to a job store shared across workers. The result is
+    handed to an optional on_done callback in the submitting process before the
+    job is marked done, so clients polling the status never see 'done' before
+    the side effects of the job are recorded.
+    """
+
+    def __init__(self, store: SessionStore, max_workers: int = 2, use_processes: bool = True,
+                 progress_interval: float = 0.5):
+        if use_processes and isinstance(store, MemorySessionStore):
+            logger.warning("In-memory job store is not visible to worker processes, using threads")
+            use_processes = False
+        self.store = store
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.progress_interval = progress_interval
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use, so web servers that fork workers never fork a running pool
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker, initargs=(logging.getLogger().level,))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='job')
+            return self._executor
+
+    def submit(self, func: Callable, *args, owner: Optional[str] = None,
+               on_done: Optional[Callable[[Any], None]] = None, **fields) -> str:
+        """
+        Queue func(*args, progress=callback) and return its job id immediately.
+
+        Args:
+            func: Picklable top-level function accepting a progress keyword argument
+            *args: Picklable positional arguments
+            owner: Session id allowed to read the job
+            on_done: Called with the result in this process before the job is marked done
+            **fields: Extra JSON-serializable fields stored with the job (e.g. total_rows)
+
+        Returns:
+            Job id
+        """
+        job_id = uuid.uuid4().hex
+        self.store.set(job_id, {
+            'job_id': job_id,
+            'status': 'queued',
+            'stage': 'queued',
+            'rows_processed': 0,
+            'owner': owner,
+            'submitted_at': time.time(),
+            **fields
+        })
+        try:
+            future = self._get_executor().submit(_run_job, self.store, job_id, func, args,
+                                                 self.progress_interval)
+        except BrokenProcessPool:
+            # A crashed worker breaks the whole pool; start a fresh one
+            with self._lock:
+                self._executor = None
+            future = self._get_executor().submit(_run_job, self.store, job_id, func, args,
+                                                 self.progress_interval)
+        future.add_done_callback(lambda f: self._finish(job_id, f, on_done))
+        logger.info(f"Queued job {job_id}")
+        return job_id
+
+    def _finish(self, job_id: str, future: Future, on_done: Optional[Callable[[Any], None]]) -> None:
+        try:
+            result = future.result()
+            if on_done is not None:
+                on_done(result)
+            self.store.update(job_id, status='done', stage='done', result=result, finished_at=time.time())
+            metrics.inc('jobs_total', status='done')
+            logger.info(f"Job {job_id} finished")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self.store.update(job_id, status='failed', error=str(e), error_type=type(e).__name__,
+                              finished_at=time.time())
+            metrics.inc('jobs_total', status='failed')
+
+    def get(self, job_id: str) -> Dict[str, Any]:
+        """Return the state of a job (empty dict if unknown or expired)."""
+        return self.store.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker pool."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -0,0 +1,69 @@
+import sys
+import time
+import logging
+import importlib
+import types
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Heavy dependencies the web app defers until first use; warm_up imports them ahead of time
+HEAVY_MODULES = ('numpy', 'pandas', 'scipy.sparse', 'joblib', 'sklearn.preprocessing', 'sklearn.compose',
+                 'sklearn.pipeline', 'sklearn.impute')
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Once imported, the module's attributes are copied onto the stand-in, so
+    later lookups cost the same as on the module itself. Concurrent first
+    accesses are serialised by the import system's module lock.
+    """
+
+    def _load(self) -> types.ModuleType:
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """
+    Return a module that is imported on first attribute access.
+
+    Modules that are already imported are returned as is. Type annotations
+    that name the module's attributes must not be evaluated at definition
+    time (use `from __future__ import annotations`), or they import it.
+
+    Args:
+        name: Absolute module name, e.g. 'pandas' or 'scipy.sparse'
+
+    Returns:
+        The module, or a LazyModule stand-in for it
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def import_modules(names: Iterable[str] = HEAVY_MODULES) -> Dict[str, float]:
+    """
+    Import modules now, e.g. before a server forks its workers.
+
+    Returns:
+        Mapping of module name to the seconds its import took (0 when already imported)
+    """
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = round(time.perf_counter() - start, 6)
+    logger.info(f"Imported {len(timings)} modules in {sum(timings.values()):.2f}s")
+    return timings
@@ -0,0 +1,451 @@
+from __future__ import annotations
+
+import os
+import json
+import zipfile
+import logging
+import threading
+import importlib.util
+from typing import List, Optional, Iterator, Sequence, Tuple
+
+from lazy_imports import lazy_module
+
+from automl_engine import load_sparse_output
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+joblib = lazy_module('joblib')
+
+# pyarrow is optional and slow to import, so it is only located here and imported on first use
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+pa = lazy_module('pyarrow')
+pa_ipc = lazy_module('pyarrow.ipc')
+pq = lazy_module('pyarrow.parquet')
+
+logger = logging.getLogger(__name__)
+
+# Output formats for processed data; Parquet and Feather need pyarrow
+OUTPUT_FORMATS = {
+    'csv': {'extension': '.csv', 'mimetype': 'text/csv', 'requires_pyarrow': False,
+            'label': 'CSV'},
+    'parquet': {'extension': '.parquet', 'mimetype': 'application/vnd.apache.parquet', 'requires_pyarrow': True,
+                'label': 'Parquet (compressed)'},
+    'feather': {'extension': '.feather', 'mimetype': 'application/vnd.apache.arrow.file', 'requires_pyarrow': True,
+                'label': 'Feather / Arrow IPC'},
+    'npy': {'extension': '.npy', 'mimetype': 'application/zip', 'requires_pyarrow': False,
+            'label': 'NumPy matrix + JSON sidecar'},
+    # Sparse results are always stored as CSR archives; it is never requested directly
+    'npz': {'extension': '.npz', 'mimetype': 'application/octet-stream', 'requires_pyarrow': False,
+            'label': 'Sparse NPZ'}
+}
+PARQUET_COMPRESSION = 'zstd'
+# Fixed .npy header size, so the row count can be filled in after streaming every chunk
+NPY_HEADER_SIZE = 128
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+
+def available_formats() -> List[str]:
+    """Return the output formats that can be written in this environment."""
+    return [fmt for fmt, spec in OUTPUT_FORMATS.items()
+            if fmt != 'npz' and (HAS_PYARROW or not spec['requires_pyarrow'])]
+
+
+def output_path(base_path: str, fmt: str) -> str:
+    """Return the path of an output file for a format, replacing the extension of base_path."""
+    return os.path.splitext(base_path)[0] + OUTPUT_FORMATS[fmt]['extension']
+
+
+def sidecar_path(path: str) -> str:
+    """Return the JSON sidecar path of a .npy output."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def passthrough_path(path: str) -> str:
+    """Return the CSV of passthrough (serial/target) columns next to a .npy output."""
+    return os.path.splitext(path)[0] + '.passthrough.csv'
+
+
+def output_files(path: str, fmt: str) -> List[str]:
+    """Return every file making up an output (the .npy matrix has a sidecar and a passthrough CSV)."""
+    return [path, sidecar_path(path), passthrough_path(path)] if fmt == 'npy' else [path]
+
+
+def npy_header(shape: tuple, dtype: np.dtype) -> bytes:
+    """Return a fixed-size (NPY_HEADER_SIZE) .npy header, so it can be rewritten once the row count is known."""
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': shape})
+    # magic string + version 1.0 + little-endian header length, then the padded dict
+    prefix = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+    body_size = NPY_HEADER_SIZE - len(prefix) - 2
+    body = header.ljust(body_size - 1) + '\n'
+    if len(body) != body_size:
+        raise ValueError(f"Shape {shape} does not fit in the .npy header")
+    return prefix + body_size.to_bytes(2, 'little') + body.encode('latin1')
+
+
+class OutputWriter:
+    """
+    Incremental writer of processed frames in one of OUTPUT_FORMATS.
+
+    Frames must share the same columns: passthrough columns (serial/target) plus
+    the transformed features. CSV, Parquet and Feather store every column;
+    the .npy format stores the float feature matrix, the passthrough columns
+    in a CSV next to it (both streamed chunk by chunk) and the feature names
+    in a JSON sidecar. The matrix keeps the dtype of the features (e.g. the
+    cleaner's float32 output) unless one is given. Files are written under a
+    temporary name and renamed on close.
+    """
+
+    def __init__(self, path: str, fmt: str, feature_names: Sequence[str], preview_rows: int = 10,
+                 dtype: Optional[str] = None):
+        if fmt not in OUTPUT_FORMATS or fmt == 'npz':
+            raise ValueError(f"Unsupported output format: {fmt!r}")
+        if OUTPUT_FORMATS[fmt]['requires_pyarrow'] and not HAS_PYARROW:
+            raise ValueError(f"Output format '{fmt}' requires pyarrow, which is not installed")
+        self.path = path
+        self.fmt = fmt
+        self.feature_names = [str(name) for name in feature_names]
+        self.preview_rows = preview_rows
+        # Dtype of the .npy matrix; None takes it from the features of the first frame
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self.rows = 0
+        self.columns = None
+        self.head = None
+        # Bytes of the CSV header record, so shards can be joined without re-parsing their headers
+        self.header_bytes = 0
+        self._tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._file = None
+        self._writer = None
+        self._schema = None
+        self._passthrough = []
+        self._passthrough_file = None
+        self._passthrough_tmp_path = f"{passthrough_path(path)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, frame: pd.DataFrame) -> None:
+        """Append a frame of processed rows."""
+        if self.columns is None:
+            self.columns = [str(col) for col in frame.columns]
+            self.head = frame.head(self.preview_rows)
+            self._open(frame)
+        elif len(self.head) < self.preview_rows:
+            self.head = pd.concat([self.head, frame.head(self.preview_rows - len(self.head))])
+
+        if self.fmt == 'csv':
+            frame.to_csv(self._file, header=False, index=False)
+        elif self.fmt == 'parquet' or self.fmt == 'feather':
+            table = pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            matrix = frame[self.feature_names].to_numpy(dtype=self.dtype)
+            np.ascontiguousarray(matrix).tofile(self._file)
+            if self._passthrough:
+                frame[self._passthrough].to_csv(self._passthrough_file, header=False, index=False)
+        self.rows += len(frame)
+
+    def _open(self, frame: pd.DataFrame) -> None:
+        if self.fmt == 'csv':
+            self._file = open(self._tmp_path, 'w', newline='', encoding='utf-8')
+            header = frame.head(0).to_csv(index=False)
+            self._file.write(header)
+            self.header_bytes = len(header.encode('utf-8'))
+        elif self.fmt == 'parquet':
+            self._schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression=PARQUET_COMPRESSION)
+        elif self.fmt == 'feather':
+            self._schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            self._writer = pa_ipc.new_file(self._tmp_path, self._schema)
+        else:
+            if self.dtype is None:
+                dtypes = frame[self.feature_names].dtypes.tolist()
+                dtype = np.result_type(*dtypes) if dtypes else np.dtype(np.float64)
+                self.dtype = dtype if dtype.kind == 'f' else np.dtype(np.float64)
+            self._file = open(self._tmp_path, 'wb')
+            self._file.write(npy_header((0, len(self.feature_names)), self.dtype))
+            self._passthrough = [col for col in self.columns if col not in self.feature_names]
+            # Written even without passthrough columns, so every .npy output has the same files
+            self._passthrough_file = open(self._passthrough_tmp_path, 'w', newline='', encoding='utf-8')
+            if self._passthrough:
+                frame[self._passthrough].head(0).to_csv(self._passthrough_file, index=False)
+
+    def close(self) -> int:
+        """Finish the output file and return the number of rows written."""
+        if self.columns is None:
+            # No rows: write an empty output with just the column layout
+            self.write(pd.DataFrame(columns=self.feature_names, dtype=self.dtype if self.dtype is not None else np.float64))
+        if self._writer is not None:
+            self._writer.close()
+        if self.fmt == 'npy':
+            self._file.seek(0)
+            self._file.write(npy_header((self.rows, len(self.feature_names)), self.dtype))
+            sidecar_tmp_path = f"{sidecar_path(self.path)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(sidecar_tmp_path, 'w') as f:
+                json.dump({
+                    'feature_names': self.feature_names,
+                    'columns': self.columns,
+                    'shape': [self.rows, len(self.feature_names)],
+                    'dtype': self.dtype.name,
+                    'passthrough_columns': self._passthrough
+                }, f)
+            os.replace(sidecar_tmp_path, sidecar_path(self.path))
+            self._passthrough_file.close()
+            os.replace(self._passthrough_tmp_path, passthrough_path(self.path))
+        if self._file is not None:
+            self._file.close()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Wrote {self.rows} rows to {self.path} ({self.fmt})")
+        return self.rows
+
+    def abort(self) -> None:
+        """Discard a partially written output."""
+        if self._writer is not None:
+            self._writer.close()
+        for file in (self._file, self._passthrough_file):
+            if file is not None:
+                file.close()
+        for tmp_path in (self._tmp_path, self._passthrough_tmp_path):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _trim_rows(frames: Iterator[pd.DataFrame], position: int, start: int,
+               stop: Optional[int]) -> Iterator[pd.DataFrame]:
+    """Cut frames read from row `position` on down to the rows [start, stop)."""
+    for frame in frames:
+        end = position + len(frame)
+        if stop is not None and position >= stop:
+            break
+        if end > start:
+            frame = frame.iloc[max(start - position, 0):(stop - position) if stop is not None else None]
+            yield frame.reset_index(drop=True)
+        position = end
+
+
+def iter_output_chunks(path: str, fmt: str, chunksize: int, prepend_columns: Sequence[str] = (),
+                       append_columns: Sequence[str] = (), start: int = 0,
+                       stop: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a processed output back in chunks of rows, e.g. to convert it to another format.
+
+    Args:
+        path: Output file
+        fmt: Format of the file
+        chunksize: Rows per chunk
+        prepend_columns: For 'npz' outputs, stored columns placed before the features
+        append_columns: For 'npz' outputs, stored columns placed after the features
+        start: First row to read
+        stop: Row to stop before (None for the end of the output)
+
+    Yields:
+        DataFrames with the output columns in their original order
+    """
+    if stop is not None and stop <= start:
+        return
+    if fmt == 'csv':
+        yield from pd.read_csv(path, chunksize=chunksize, skiprows=range(1, start + 1) if start else None,
+                               nrows=stop - start if stop is not None else None)
+    elif fmt == 'parquet':
+        parquet = pq.ParquetFile(path)
+        # Only the row groups overlapping the range are read
+        groups, first_row, position = [], None, 0
+        for i in range(parquet.num_row_groups):
+            rows = parquet.metadata.row_group(i).num_rows
+            if position + rows > start and (stop is None or position < stop):
+                groups.append(i)
+                first_row = position if first_row is None else first_row
+            position += rows
+        if groups:
+            batches = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=chunksize, row_groups=groups))
+            yield from _trim_rows(batches, first_row, start, stop)
+    elif fmt == 'feather':
+        reader = pa_ipc.open_file(path)
+        batches = (reader.get_batch(i).to_pandas() for i in range(reader.num_record_batches))
+        yield from _trim_rows(batches, 0, start, stop)
+    elif fmt == 'npy':
+        with open(sidecar_path(path)) as f:
+            sidecar = json.load(f)
+        matrix = np.load(path, mmap_mode='r')
+        stop = matrix.shape[0] if stop is None else min(stop, matrix.shape[0])
+        passthrough = None
+        if sidecar.get('passthrough_columns'):
+            passthrough = pd.read_csv(passthrough_path(path), chunksize=chunksize,
+                                      skiprows=range(1, start + 1) if start else None, nrows=stop - start)
+        for begin in range(start, stop, chunksize):
+            end = min(begin + chunksize, stop)
+            chunk = pd.DataFrame(np.asarray(matrix[begin:end]), columns=sidecar['feature_names'])
+            if passthrough is not None:
+                values = next(passthrough)
+                for col in sidecar['passthrough_columns']:
+                    chunk[col] = values[col].to_numpy()
+            # Outputs written before the passthrough CSV kept the values in the sidecar
+            for col, values in sidecar.get('passthrough', {}).items():
+                chunk[col] = values[begin:end]
+            yield chunk[sidecar['columns']]
+    elif fmt == 'npz':
+        X, feature_names, extra_columns = load_sparse_output(path)
+        stop = X.shape[0] if stop is None else min(stop, X.shape[0])
+        for begin in range(start, stop, chunksize):
+            end = min(begin + chunksize, stop)
+            chunk = pd.DataFrame(X[begin:end].toarray(), columns=feature_names)
+            for col in reversed(list(prepend_columns)):
+                chunk.insert(0, col, extra_columns[col][begin:end])
+            for col in append_columns:
+                chunk[col] = extra_columns[col][begin:end]
+            yield chunk
+    else:
+        raise ValueError(f"Unsupported output format: {fmt!r}")
+
+
+def output_rows(path: str, fmt: str) -> int:
+    """Return the number of rows of a processed output, from its metadata where the format has any."""
+    if fmt == 'csv':
+        return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], chunksize=1024 * 1024))
+    if fmt == 'parquet':
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt == 'feather':
+        reader = pa_ipc.open_file(path)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    if fmt == 'npy':
+        return np.load(path, mmap_mode='r').shape[0]
+    if fmt == 'npz':
+        return load_sparse_output(path)[0].shape[0]
+    raise ValueError(f"Unsupported output format: {fmt!r}")
+
+
+def convert_output(src_path: str, src_fmt: str, dst_path: str, dst_fmt: str, feature_names: Sequence[str],
+                   chunksize: int, prepend_columns: Sequence[str] = (),
+                   append_columns: Sequence[str] = (), start: int = 0, stop: Optional[int] = None,
+                   dtype: Optional[str] = None) -> int:
+    """
+    Rewrite a processed output (rows [start, stop)) in another format chunk by chunk; returns the rows written.
+
+    dtype is the feature dtype of a .npy destination (CSV sources read back as float64).
+    """
+    with OutputWriter(dst_path, dst_fmt, feature_names, dtype=dtype) as writer:
+        for chunk in iter_output_chunks(src_path, src_fmt, chunksize, prepend_columns, append_columns, start, stop):
+            writer.write(chunk)
+    return writer.rows
+
+
+def shard_paths(path: str, fmt: str, shards: int) -> List[str]:
+    """Return the files of an output split into shards, e.g. 'out.part-001-of-004.csv'."""
+    base = os.path.splitext(path)[0]
+    extension = OUTPUT_FORMATS[fmt]['extension']
+    return [f"{base}.part-{i + 1:03d}-of-{shards:03d}{extension}" for i in range(shards)]
+
+
+def write_output_shards(src_path: str, src_fmt: str, dst_fmt: str, feature_names: Sequence[str], shards: int,
+                        chunksize: int, prepend_columns: Sequence[str] = (), append_columns: Sequence[str] = (),
+                        n_jobs: Optional[int] = -1, backend: str = 'loky', dtype: Optional[str] = None) -> List[str]:
+    """
+    Split a processed output into files of consecutive rows, written concurrently.
+
+    Each joblib task reads only its own row range of the source (memory-mapped
+    for .npy, by row group for Parquet) and writes one shard.
+
+    Args:
+        src_path: Processed output
+        src_fmt: Its format
+        dst_fmt: Format of the shards
+        feature_names: Feature columns of the output
+        shards: Number of shards (fewer if the output has fewer rows)
+        chunksize: Rows per chunk while converting
+        prepend_columns: For 'npz' sources, stored columns placed before the features
+        append_columns: For 'npz' sources, stored columns placed after the features
+        n_jobs: joblib workers (-1 for all cores; at most one per shard)
+        backend: joblib backend, 'loky' (processes) or 'threading'
+        dtype: Feature dtype of .npy shards (None keeps the source's)
+
+    Returns:
+        Paths of the shards, in row order
+    """
+    total = output_rows(src_path, src_fmt)
+    shards = max(min(shards, total), 1)
+    bounds = [total * i // shards for i in range(shards + 1)]
+    paths = shard_paths(src_path, dst_fmt, shards)
+    tasks = [joblib.delayed(convert_output)(src_path, src_fmt, path, dst_fmt, feature_names, chunksize, prepend_columns,
+                                     append_columns, bounds[i], bounds[i + 1], dtype) for i, path in enumerate(paths)]
+    n_workers = min(joblib.effective_n_jobs(n_jobs), shards)
+    if n_workers <= 1:
+        for function, args, kwargs in tasks:
+            function(*args, **kwargs)
+    else:
+        joblib.Parallel(n_jobs=n_workers, backend=backend)(tasks)
+    logger.info(f"Split {src_path} into {shards} {dst_fmt} shards")
+    return paths
+
+
+class _ZipStream:
+    """Write-only, unseekable sink that hands out what zipfile has written so far."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def iter_file_blocks(path: str, block_size: int = STREAM_BLOCK_SIZE) -> Iterator[bytes]:
+    """Yield the bytes of a file in blocks."""
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+def iter_zip_bundle(entries: Sequence[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Stream files as an uncompressed zip archive, built on the fly.
+
+    Args:
+        entries: (file path, name inside the archive) pairs
+
+    Yields:
+        Blocks of the zip archive
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for source, name in entries:
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for block in iter_file_blocks(source):
+                    entry.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_npy_bundle(path: str, arcname: str) -> Iterator[bytes]:
+    """
+    Stream a .npy output, its sidecar and passthrough CSV as a zip archive (see iter_zip_bundle).
+
+    Args:
+        path: The .npy file
+        arcname: Base name of the entries inside the archive ('<arcname>.npy', '<arcname>.json'
+            and '<arcname>.passthrough.csv')
+
+    Yields:
+        Blocks of the zip archive
+    """
+    entries = [(path, f"{arcname}.npy"), (sidecar_path(path), f"{arcname}.json")]
+    if os.path.exists(passthrough_path(path)):
+        # Outputs written before the passthrough CSV have none
+        entries.append((passthrough_path(path), f"{arcname}.passthrough.csv"))
+    return iter_zip_bundle(entries)
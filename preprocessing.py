@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import os
+import time
+import logging
+from typing import Dict, Any, List, Optional, Callable
+
+from lazy_imports import lazy_module
+
+from automl_engine import DataCleaner, save_sparse_output
+from output_formats import OutputWriter, output_path, output_files
+from preview import remove_preview
+from dataset_cache import DatasetCache, column_summary, dataset_files, dataset_size, read_dataset, read_dtypes
+from artifact_store import ArtifactStore
+from result_cache import ResultCache, result_key
+from instrumentation import StageProfiler, metrics
+
+pd = lazy_module('pandas')
+sparse = lazy_module('scipy.sparse')
+
+logger = logging.getLogger(__name__)
+
+ALL_DROPPED_ERROR = ('All rows were dropped because every row had at least one missing value. '
+                     'Please choose imputation or upload a dataset with fewer missing values.')
+
+# Stores opened by job worker processes, keyed by their folders
+_worker_stores = {}
+
+
+class PreprocessingError(ValueError):
+    """A preprocessing request that cannot be satisfied; reported to the client as a 400."""
+
+
+def output_size(path: str, fmt: str) -> int:
+    """Return the bytes on disk of an output, including its sidecar."""
+    return sum(os.path.getsize(name) for name in output_files(path, fmt) if os.path.exists(name))
+
+
+def iter_csv_chunks(filepath: str, usecols: List[str], chunksize: int, dropna: bool = False,
+                    row_counter: Optional[List[int]] = None, dtype: Optional[Dict[str, str]] = None):
+    """
+    Yield chunks of the selected columns (read with the given dtypes), optionally dropping rows with any NaN.
+
+    The shards of a sharded dataset folder are read one after the other, as one sequence of rows.
+    """
+    for path in dataset_files(filepath):
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize, dtype=dtype):
+            chunk = chunk[usecols]
+            if dropna:
+                chunk = chunk.dropna()
+            if row_counter is not None:
+                row_counter[0] += len(chunk)
+            yield chunk
+
+
+def processed_base_path(file_info: Dict[str, Any], settings: Dict[str, Any]) -> str:
+    """Return the output path of an upload before the format's extension is applied."""
+    return os.path.join(settings['processed_folder'], f"processed_{file_info['filename']}")
+
+
+def cached_preprocessing(file_info: Dict[str, Any], options: Dict[str, Any], settings: Dict[str, Any],
+                         result_cache: ResultCache, artifact_store: ArtifactStore) -> Optional[Dict[str, Any]]:
+    """
+    Return the result of an identical earlier request (same content, options and engine version), if cached.
+
+    The cached output is linked to this upload's processed path and the
+    earlier fitted cleaner is reused (copied when another session owns it),
+    so nothing is parsed or fitted.
+
+    Returns:
+        Dictionary like run_preprocessing's, with 'cached' set in the response, or None on a miss
+    """
+    profiler = StageProfiler()
+    key = result_key(file_info['content_hash'], options)
+    with profiler.stage('cache_restore', file_info['rows']):
+        result = result_cache.restore(key, processed_base_path(file_info, settings))
+        if result is not None:
+            # The restored output replaced any earlier one of this upload
+            remove_preview(result['session_updates']['processed_filepath'])
+            try:
+                metadata = artifact_store.get_metadata(result['session_updates']['artifact_id'])
+            except (KeyError, OSError, ValueError):
+                logger.warning(f"Cached result {key[:12]} refers to a missing artifact, recomputing")
+                updates = result['session_updates']
+                for path in output_files(updates['processed_filepath'], updates['processed_format']):
+                    if os.path.exists(path):
+                        os.remove(path)
+                result = None
+            else:
+                if metadata.get('owner') != file_info.get('session_id'):
+                    # Fitted for another session: this one gets its own copy of the cleaner
+                    artifact = artifact_store.clone(metadata['artifact_id'], file_info.get('session_id'),
+                                                    metadata['version'])
+                    result['session_updates']['artifact_id'] = artifact['artifact_id']
+                    result['response']['artifact'] = {'artifact_id': artifact['artifact_id'],
+                                                      'version': artifact['version']}
+    metrics.inc('result_cache_total', result='hit' if result else 'miss')
+    if result is None:
+        return None
+
+    logger.info(f"Reusing cached preprocessing result {key[:12]} for {file_info['filename']}")
+    response = result['response']
+    response['cached'] = True
+    response['summary']['stage_metrics'] = profiler.summary()
+    return result
+
+
+def run_preprocessing(file_info: Dict[str, Any], options: Dict[str, Any], settings: Dict[str, Any],
+                      dataset_cache: DatasetCache, artifact_store: ArtifactStore,
+                      progress: Optional[Callable[[str, int], None]] = None,
+                      result_cache: Optional[ResultCache] = None) -> Dict[str, Any]:
+    """
+    Fit a cleaner on an uploaded dataset, write the processed file and store the fitted cleaner.
+
+    Args:
+        file_info: Session state of the upload (filepath, filename, content_hash, column_names, ...) and
+            the 'session_id' that owns the stored cleaner
+        options: 'nan_strategy', 'target_column', 'serial_column', 'output_format', 'output_dtype' and
+            the optional feature selection settings 'variance_threshold', 'correlation_threshold' and
+            'svd_components', as validated by the caller
+        settings: 'processed_folder', 'streaming_threshold', 'csv_chunk_size', 'n_jobs', 'parallel_backend'
+            and 'shard_n_jobs' (workers parsing the shards of a sharded dataset)
+        dataset_cache: Cache holding the profile and binary copy of the upload
+        artifact_store: Store the fitted cleaner is saved to
+        progress: Optional callback(stage, rows_processed)
+        result_cache: Optional cache the result is stored in for identical later requests
+
+    Returns:
+        Dictionary with the JSON 'response' for the client and the 'session_updates' to record
+    """
+    def report(stage: str, rows: int = 0) -> None:
+        if progress is not None:
+            progress(stage, rows)
+
+    nan_strategy = options['nan_strategy']
+    target_column = options.get('target_column')
+    serial_column = options.get('serial_column')
+    output_format = options.get('output_format', 'csv')
+    output_dtype = options.get('output_dtype', 'float32')
+    column_names = file_info['column_names']
+
+    # Remove target and serial columns from features to preprocess
+    exclude_cols = []
+    if target_column:
+        exclude_cols.append(target_column)
+    if serial_column:
+        exclude_cols.append(serial_column)
+    feature_cols = [col for col in column_names if col not in exclude_cols]
+
+    # The extension is set once the output format is known (sparse results are always .npz)
+    processed_filepath = processed_base_path(file_info, settings)
+    # The output of an earlier run on this upload is about to be replaced
+    remove_preview(processed_filepath)
+    chunksize = settings['csv_chunk_size']
+    cleaner_options = {'n_jobs': settings.get('n_jobs'), 'parallel_backend': settings.get('parallel_backend', 'loky'),
+                       'output_dtype': output_dtype, 'variance_threshold': options.get('variance_threshold'),
+                       'correlation_threshold': options.get('correlation_threshold'),
+                       'svd_components': options.get('svd_components')}
+    # Feature floats are read in the output dtype, so float64 copies of the input never exist
+    profile = dataset_cache.get_profile(file_info['content_hash']) or {}
+
+    profiler = StageProfiler()
+    report('load')
+    if dataset_size(file_info['filepath']) > settings['streaming_threshold']:
+        # Large file: fit in one pass over chunks, then stream transformed chunks to disk
+        logger.info("File exceeds streaming threshold, using chunked preprocessing")
+        filepath = file_info['filepath']
+        # Rows with NaN in any relevant column are dropped per chunk, before the cleaner sees them
+        drop_rows = nan_strategy == 'delete'
+        nan_strategy_for_cleaner = 'impute' if drop_rows else nan_strategy
+        rows_kept = [0]
+
+        data_cleaner = DataCleaner(nan_strategy=nan_strategy_for_cleaner, progress_callback=progress,
+                                   **cleaner_options)
+        # Categoricals would be chunk-local, so chunks downcast floats and pin string columns to str
+        dtypes = read_dtypes(profile, feature_cols, output_dtype, categories=False)
+        try:
+            nan_stats = data_cleaner.fit_stream(
+                chunk[feature_cols]
+                for chunk in iter_csv_chunks(filepath, column_names, chunksize,
+                                             dropna=drop_rows, row_counter=rows_kept, dtype=dtypes))
+        except ValueError:
+            if drop_rows and rows_kept[0] == 0:
+                raise PreprocessingError(ALL_DROPPED_ERROR)
+            raise
+
+        processed_filepath = output_path(processed_filepath, output_format)
+        write_seconds = 0.0
+        with OutputWriter(processed_filepath, output_format, data_cleaner.feature_names_out,
+                          dtype=data_cleaner._output_dtype()) as writer:
+            for out in data_cleaner.transform_chunks(
+                    iter_csv_chunks(filepath, column_names, chunksize, dropna=drop_rows, dtype=dtypes),
+                    prepend_columns=[serial_column] if serial_column else [],
+                    append_columns=[target_column] if target_column else []):
+                start = time.perf_counter()
+                writer.write(out)
+                write_seconds += time.perf_counter() - start
+                report('transform', writer.rows)
+        total_rows = writer.rows
+        profiler.merge(data_cleaner.profiler)
+        profiler.record('write', write_seconds, rows=total_rows,
+                        output_bytes=output_size(processed_filepath, output_format))
+        preview_df = writer.head
+        processed_columns = writer.columns
+    else:
+        # Load the binary copy cached at upload time, falling back to the CSV; feature floats
+        # are downcast and repetitive strings become categoricals
+        dtypes = read_dtypes(profile, feature_cols, output_dtype)
+        with profiler.stage('load') as stage:
+            df = dataset_cache.load_frame(file_info['content_hash'])
+            if df is None:
+                df = read_dataset(file_info['filepath'], dtype=dtypes, n_jobs=settings.get('shard_n_jobs', -1),
+                                  backend=settings.get('parallel_backend', 'loky'))
+            elif dtypes:
+                df = df.astype(dtypes)
+            stage['rows'] = len(df)
+        df_features = df[feature_cols]
+
+        # If deleting NaN rows, drop from features, target, and serial columns, and keep all aligned
+        if nan_strategy == 'delete':
+            # Build a DataFrame with all relevant columns for row alignment
+            cols_to_check = feature_cols[:]
+            if target_column:
+                cols_to_check.append(target_column)
+            if serial_column:
+                cols_to_check.append(serial_column)
+            df_all = df[cols_to_check]
+            # Drop rows with any NaN in any relevant column
+            df_all = df_all.dropna()
+            # Split back into features, target, serial
+            df_features = df_all[feature_cols]
+            df_target = df_all[target_column] if target_column else None
+            df_serial = df_all[serial_column] if serial_column else None
+            # After dropping, if no rows remain, return error
+            if len(df_features) == 0:
+                raise PreprocessingError(ALL_DROPPED_ERROR)
+            # Set nan_strategy to 'impute' for DataCleaner (since we've already deleted NaNs)
+            nan_strategy_for_cleaner = 'impute'
+        else:
+            df_target = df[target_column] if target_column else None
+            df_serial = df[serial_column] if serial_column else None
+            nan_strategy_for_cleaner = nan_strategy
+
+        # Initialize data cleaner and process the data
+        data_cleaner = DataCleaner(nan_strategy=nan_strategy_for_cleaner, progress_callback=progress,
+                                   **cleaner_options)
+        # The cached profile describes every row, so it only applies when no rows are deleted
+        X_transformed, feature_names, nan_stats = data_cleaner.fit_transform(
+            df_features, return_nan_stats=True, profile=(profile or None) if nan_strategy == 'impute' else None)
+        total_rows = X_transformed.shape[0]
+        # Keep only the passthrough values, so the input frame can be freed before the output is built
+        serial_values = df_serial.to_numpy(copy=True) if serial_column and df_serial is not None else None
+        target_values = df_target.to_numpy(copy=True) if target_column and df_target is not None else None
+        del df, df_features, df_serial, df_target
+        if nan_strategy == 'delete':
+            del df_all
+        report('write', total_rows)
+        profiler.merge(data_cleaner.profiler)
+
+        with profiler.stage('write', total_rows) as stage:
+            if sparse.issparse(X_transformed):
+                # High-cardinality output: keep it sparse on disk, densify only the preview rows
+                output_format = 'npz'
+                processed_filepath = output_path(processed_filepath, output_format)
+                extra_columns = {}
+                if serial_values is not None:
+                    extra_columns[serial_column] = serial_values
+                if target_values is not None:
+                    extra_columns[target_column] = target_values
+                save_sparse_output(processed_filepath, X_transformed, feature_names, extra_columns)
+
+                preview_df = pd.DataFrame(X_transformed[:10].toarray(), columns=feature_names)
+                if serial_values is not None:
+                    preview_df.insert(0, serial_column, serial_values[:10])
+                if target_values is not None:
+                    preview_df[target_column] = target_values[:10]
+                processed_columns = preview_df.columns.tolist()
+            else:
+                # Wrap the transformed array without copying it; passthrough columns become their own blocks
+                processed_df = pd.DataFrame(X_transformed, columns=feature_names, copy=False)
+
+                # Add back serial and target columns as-is (if present)
+                if serial_values is not None:
+                    processed_df.insert(0, serial_column, serial_values)
+                if target_values is not None:
+                    processed_df[target_column] = target_values
+
+                # Save processed data
+                processed_filepath = output_path(processed_filepath, output_format)
+                with OutputWriter(processed_filepath, output_format, feature_names,
+                                  dtype=data_cleaner._output_dtype()) as writer:
+                    writer.write(processed_df)
+                preview_df = processed_df.head(10)
+                processed_columns = processed_df.columns.tolist()
+            stage['output_bytes'] = output_size(processed_filepath, output_format)
+
+    # Persist the fitted cleaner so new batches can be transformed without refitting
+    report('save_artifact', total_rows)
+    with profiler.stage('save_artifact'):
+        artifact = artifact_store.save(data_cleaner, extra_metadata={
+            'source_file': file_info['original_name'],
+            'content_hash': file_info.get('content_hash'),
+            'serial_column': serial_column,
+            'target_column': target_column
+        }, owner=file_info.get('session_id'))
+
+    # Get preprocessing summary
+    summary = data_cleaner.get_preprocessing_summary()
+
+    # Prepare preview data (first 10 rows)
+    preview_data = preview_df.round(4)  # Round to 4 decimal places
+    preview_dict = preview_data.to_dict('records')
+
+    response_data = {
+        'success': True,
+        'message': 'Data preprocessing completed successfully!',
+        'output_format': output_format,
+        'artifact': {
+            'artifact_id': artifact['artifact_id'],
+            'version': artifact['version']
+        },
+        'preview': {
+            'columns': processed_columns,
+            'data': preview_dict,
+            'total_rows': total_rows
+        },
+        'summary': {
+            'original_shape': [file_info['rows'], file_info['columns']],
+            'processed_shape': [total_rows, len(processed_columns)],
+            'column_types': summary['column_types'],
+            'dropped_columns': summary['dropped_columns'],
+            'preprocessing_stats': summary['preprocessing_summary'],
+            'nan_stats': nan_stats,
+            'column_stats': column_summary(profile, feature_cols),
+            'distinct_exact': profile.get('nunique_exact', True),
+            'stage_metrics': profiler.summary()
+        }
+    }
+
+    logger.info(f"Preprocessing completed. Original shape: ({file_info['rows']}, {file_info['columns']}), "
+                f"Processed shape: ({total_rows}, {len(processed_columns)})")
+
+    result = {
+        'response': response_data,
+        'session_updates': {
+            'processed_filename': os.path.basename(processed_filepath),
+            'processed_filepath': processed_filepath,
+            'processed_format': output_format,
+            'processed_dtype': data_cleaner._output_dtype().name,
+            'processed_feature_names': [str(name) for name in data_cleaner.feature_names_out],
+            'serial_column': serial_column,
+            'target_column': target_column,
+            'processed_exports': {},
+            'processed_shards': {},
+            'artifact_id': artifact['artifact_id']
+        }
+    }
+    if result_cache is not None:
+        result_cache.put(result_key(file_info['content_hash'], options), result)
+    return result
+
+
+def preprocessing_job(file_info: Dict[str, Any], options: Dict[str, Any], settings: Dict[str, Any],
+                      progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+    """
+    Job queue entry point for run_preprocessing.
+
+    Worker processes cannot share the web worker's stores, so each one opens its
+    own from the 'cache_folder', 'artifact_folder' and 'result_cache_folder'
+    settings and reuses them for later jobs.
+    """
+    key = (settings['cache_folder'], settings['artifact_folder'], settings.get('result_cache_folder'))
+    if key not in _worker_stores:
+        result_cache = None
+        if settings.get('result_cache_folder'):
+            # Results are only written here; lookups happen in the web worker before queueing
+            result_cache = ResultCache(settings['result_cache_folder'], max_bytes=settings['result_cache_bytes'],
+                                       memory_entries=0)
+        _worker_stores[key] = (DatasetCache(settings['cache_folder'], max_bytes=settings.get('dataset_cache_bytes')),
+                               ArtifactStore(settings['artifact_folder'], cache_size=1), result_cache)
+    dataset_cache, artifact_store, result_cache = _worker_stores[key]
+    return run_preprocessing(file_info, options, settings, dataset_cache, artifact_store, progress, result_cache)
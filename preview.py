@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence
+
+from lazy_imports import lazy_module
+
+from automl_engine import load_sparse_output
+from output_formats import iter_output_chunks, npy_header
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+sparse = lazy_module('scipy.sparse')
+
+logger = logging.getLogger(__name__)
+
+META_FILENAME = 'preview.json'
+FEATURES_FILENAME = 'features.npy'
+# Preview values are float32: they are shown rounded, and it halves the index size
+PREVIEW_DTYPE = 'float32'
+PREVIEW_DECIMALS = 4
+# Opened indexes kept per process, so paging does not reopen the memory maps
+OPEN_INDEXES = 16
+
+_open_indexes = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def preview_dir(processed_filepath: str) -> str:
+    """Return the folder of the preview index of a processed output."""
+    return os.path.splitext(processed_filepath)[0] + '.preview'
+
+
+def _source_signature(source_path: str) -> Dict[str, Any]:
+    """Identify the processed output an index was built from, so a rewritten output is not served stale."""
+    stat = os.stat(source_path)
+    return {'source': os.path.basename(source_path), 'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns, 'source_inode': stat.st_ino}
+
+
+def _save_array(path: str, values: np.ndarray) -> None:
+    np.save(path, values, allow_pickle=False)
+
+
+class PreviewIndex:
+    """
+    Memory-mapped copy of a processed output for paging through it.
+
+    Built once per output (see open_preview), in one pass over its chunks:
+
+    - dense outputs: the features as a row-major float32 .npy matrix, so a page of
+      rows is a contiguous read
+    - sparse (npz) outputs: the CSR components as separate .npy files, so a page
+      of rows is a slice of indptr and nothing is densified beyond the page
+    - passthrough columns (serial/target): one .npy array each, strings as
+      fixed-width unicode with a separate missing-value mask
+
+    The row order of a column is computed on its first sort and kept as
+    'sort_<i>.npy'. Only the requested rows and columns are ever read.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILENAME)) as f:
+            self.meta = json.load(f)
+        self.columns = [column['name'] for column in self.meta['columns']]
+        self.n_rows = self.meta['rows']
+        self._position = {name: i for i, name in enumerate(self.columns)}
+        self._features = None
+        self._passthrough = {}
+        self._sort_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, directory: str, source_path: str, fmt: str, feature_names: Sequence[str], chunksize: int,
+              prepend_columns: Sequence[str] = (), append_columns: Sequence[str] = ()) -> 'PreviewIndex':
+        """
+        Build the preview index of a processed output.
+
+        The index is written to a temporary folder and renamed into place, so a
+        concurrent build of the same output just uses whichever finished first.
+
+        Args:
+            directory: Folder of the index (see preview_dir)
+            source_path: Processed output file
+            fmt: Its format
+            feature_names: Feature columns of the output
+            chunksize: Rows read per chunk
+            prepend_columns: Passthrough columns before the features ('npz' outputs)
+            append_columns: Passthrough columns after the features ('npz' outputs)
+
+        Returns:
+            The opened index
+        """
+        tmp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # Taken before reading, so an output replaced during the build is detected on the next open
+        signature = _source_signature(source_path)
+        os.makedirs(tmp_dir)
+        try:
+            if fmt == 'npz':
+                meta = cls._build_sparse(tmp_dir, source_path, feature_names, prepend_columns, append_columns)
+            else:
+                meta = cls._build_dense(tmp_dir, source_path, fmt, feature_names, chunksize)
+            meta.update(signature)
+            with open(os.path.join(tmp_dir, META_FILENAME), 'w') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp_dir, directory)
+            except OSError:
+                # Another request built it first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.info(f"Built preview index of {source_path} ({meta['rows']} rows, {len(meta['columns'])} columns)")
+        return cls(directory)
+
+    @staticmethod
+    def _build_dense(tmp_dir: str, source_path: str, fmt: str, feature_names: Sequence[str],
+                     chunksize: int) -> Dict[str, Any]:
+        feature_names = [str(name) for name in feature_names]
+        feature_set = set(feature_names)
+        columns = None
+        passthrough = {}
+        missing = np.zeros(len(feature_names), dtype=np.int64)
+        rows = 0
+        features_path = os.path.join(tmp_dir, FEATURES_FILENAME)
+        with open(features_path, 'wb') as f:
+            # The header is rewritten with the row count once every chunk is in
+            f.write(npy_header((0, len(feature_names)), PREVIEW_DTYPE))
+            for chunk in iter_output_chunks(source_path, fmt, chunksize):
+                if columns is None:
+                    columns = [str(col) for col in chunk.columns]
+                    passthrough = {col: [] for col in columns if col not in feature_set}
+                chunk.columns = columns
+                matrix = np.ascontiguousarray(chunk[feature_names].to_numpy(dtype=PREVIEW_DTYPE))
+                missing += np.isnan(matrix).sum(axis=0)
+                matrix.tofile(f)
+                for col, parts in passthrough.items():
+                    parts.append(chunk[col])
+                rows += len(chunk)
+            f.seek(0)
+            f.write(npy_header((rows, len(feature_names)), PREVIEW_DTYPE))
+
+        if columns is None:
+            columns = feature_names
+        feature_index = {name: i for i, name in enumerate(feature_names)}
+        meta_columns = []
+        for col in columns:
+            if col in feature_index:
+                meta_columns.append({'name': col, 'kind': 'feature', 'index': feature_index[col],
+                                     'missing': int(missing[feature_index[col]])})
+            else:
+                meta_columns.append(PreviewIndex._save_passthrough(tmp_dir, len(meta_columns), col,
+                                                                   pd.concat(passthrough[col], ignore_index=True)))
+        return {'layout': 'dense', 'rows': rows, 'columns': meta_columns}
+
+    @staticmethod
+    def _build_sparse(tmp_dir: str, source_path: str, feature_names: Sequence[str],
+                      prepend_columns: Sequence[str], append_columns: Sequence[str]) -> Dict[str, Any]:
+        X, stored_names, extra_columns = load_sparse_output(source_path)
+        X = X.astype(PREVIEW_DTYPE)
+        for name in ('data', 'indices', 'indptr'):
+            _save_array(os.path.join(tmp_dir, f'{name}.npy'), getattr(X, name))
+        column_missing = np.bincount(X.indices[np.isnan(X.data)], minlength=X.shape[1])
+
+        meta_columns = []
+        for col in prepend_columns:
+            meta_columns.append(PreviewIndex._save_passthrough(tmp_dir, len(meta_columns), col,
+                                                               pd.Series(extra_columns[col])))
+        for i, name in enumerate(stored_names):
+            meta_columns.append({'name': str(name), 'kind': 'feature', 'index': i,
+                                 'missing': int(column_missing[i])})
+        for col in append_columns:
+            meta_columns.append(PreviewIndex._save_passthrough(tmp_dir, len(meta_columns), col,
+                                                               pd.Series(extra_columns[col])))
+        return {'layout': 'sparse', 'rows': int(X.shape[0]), 'n_features': int(X.shape[1]), 'columns': meta_columns}
+
+    @staticmethod
+    def _save_passthrough(tmp_dir: str, position: int, name: str, values: pd.Series) -> Dict[str, Any]:
+        """Store a passthrough column as a memory-mappable array; returns its metadata."""
+        mask = values.isna().to_numpy()
+        if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+            array, kind = values.to_numpy(dtype=np.int64), 'int'
+        elif pd.api.types.is_numeric_dtype(values):
+            array, kind = values.to_numpy(dtype=np.float64), 'float'
+        else:
+            array, kind = values.astype(object).where(~mask, '').astype(str).to_numpy(dtype=str), 'str'
+        filename = f'column_{position}.npy'
+        _save_array(os.path.join(tmp_dir, filename), array)
+        meta = {'name': str(name), 'kind': 'passthrough', 'dtype': kind, 'file': filename,
+                'missing': int(mask.sum())}
+        if kind == 'str' and meta['missing']:
+            meta['mask'] = f'column_{position}.mask.npy'
+            _save_array(os.path.join(tmp_dir, meta['mask']), mask)
+        return meta
+
+    def matches(self, signature: Dict[str, Any]) -> bool:
+        """Whether the index was built from the output file with this signature (see _source_signature)."""
+        return all(self.meta.get(key) == value for key, value in signature.items())
+
+    def _load(self, filename: str) -> np.ndarray:
+        return np.load(os.path.join(self.directory, filename), mmap_mode='r')
+
+    def _feature_matrix(self):
+        if self._features is None:
+            if self.meta['layout'] == 'sparse':
+                arrays = [self._load(f'{name}.npy') for name in ('data', 'indices', 'indptr')]
+                self._features = sparse.csr_matrix(tuple(arrays), shape=(self.n_rows, self.meta['n_features']),
+                                                   copy=False)
+            else:
+                self._features = self._load(FEATURES_FILENAME)
+        return self._features
+
+    def _passthrough_values(self, column: Dict[str, Any]):
+        if column['name'] not in self._passthrough:
+            mask = self._load(column['mask']) if column.get('mask') else None
+            self._passthrough[column['name']] = (self._load(column['file']), mask)
+        return self._passthrough[column['name']]
+
+    def _column_values(self, column: Dict[str, Any]) -> np.ndarray:
+        """Every value of one column, for sorting."""
+        if column['kind'] == 'passthrough':
+            return np.asarray(self._passthrough_values(column)[0])
+        features = self._feature_matrix()
+        if sparse.issparse(features):
+            return features[:, column['index']].toarray().ravel()
+        return np.asarray(features[:, column['index']])
+
+    def sort_order(self, name: str) -> np.ndarray:
+        """
+        Return the row order of a column, ascending with missing values last.
+
+        Computed on first use and stored next to the index.
+        """
+        position = self._position[name]
+        column = self.meta['columns'][position]
+        path = os.path.join(self.directory, f'sort_{position}.npy')
+        with self._sort_lock:
+            if not os.path.exists(path):
+                values = self._column_values(column)
+                if column.get('mask'):
+                    # Missing strings are stored empty; order by the mask first so they come last
+                    order = np.lexsort((values, np.asarray(self._passthrough_values(column)[1])))
+                else:
+                    order = np.argsort(values, kind='stable')
+                index_dtype = np.int32 if self.n_rows < 2 ** 31 else np.int64
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+                _save_array(tmp_path, order.astype(index_dtype))
+                os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    def page(self, offset: int = 0, limit: int = 100, columns: Optional[Sequence[str]] = None,
+             sort: Optional[str] = None, descending: bool = False) -> Dict[str, Any]:
+        """
+        Read a window of rows and columns.
+
+        Args:
+            offset: First row of the window (in sorted order if sort is given)
+            limit: Number of rows
+            columns: Columns to return, in this order; all if omitted
+            sort: Column to order the rows by
+            descending: Sort descending (missing values stay last)
+
+        Returns:
+            Dictionary with 'columns', 'rows' (lists of values, floats rounded and
+            missing values as None), 'offset', 'total_rows' and, for sorted pages,
+            the source 'row_numbers'
+        """
+        columns = list(self.columns) if columns is None else list(columns)
+        unknown = [name for name in columns + ([sort] if sort else []) if name not in self._position]
+        if unknown:
+            raise KeyError(f"Unknown preview columns: {unknown}")
+
+        offset = max(0, min(int(offset), self.n_rows))
+        positions = np.arange(offset, min(offset + max(0, int(limit)), self.n_rows))
+        if sort:
+            order = self.sort_order(sort)
+            if descending:
+                # Reverse the present values only, keeping missing ones at the end
+                n_present = self.n_rows - self.meta['columns'][self._position[sort]]['missing']
+                positions = np.where(positions < n_present, n_present - 1 - positions, positions)
+            rows = np.asarray(order[positions], dtype=np.int64)
+        else:
+            rows = positions
+
+        selected = [self.meta['columns'][self._position[name]] for name in columns]
+        feature_columns = [column['index'] for column in selected if column['kind'] == 'feature']
+        block = None
+        if feature_columns and len(rows):
+            features = self._feature_matrix()
+            if sparse.issparse(features):
+                block = features[rows][:, feature_columns].toarray()
+            elif sort:
+                block = np.asarray(features[rows][:, feature_columns])
+            else:
+                # Unsorted pages are a contiguous range of rows
+                block = np.asarray(features[rows[0]:rows[-1] + 1, feature_columns])
+            block = np.round(block.astype(np.float64), PREVIEW_DECIMALS)
+
+        values = []
+        feature_position = 0
+        for column in selected:
+            if column['kind'] == 'feature':
+                col_values = block[:, feature_position] if block is not None else np.empty(0)
+                feature_position += 1
+                values.append(self._to_json(col_values, np.isnan(col_values)))
+            else:
+                array, mask = self._passthrough_values(column)
+                col_values = np.asarray(array[rows])
+                if column['dtype'] == 'float':
+                    mask = np.isnan(col_values)
+                elif mask is not None:
+                    mask = np.asarray(mask[rows])
+                values.append(self._to_json(col_values, mask))
+
+        page = {
+            'columns': columns,
+            'rows': [list(row) for row in zip(*values)] if values else [[] for _ in rows],
+            'offset': offset,
+            'total_rows': self.n_rows,
+            'total_columns': len(self.columns)
+        }
+        if sort:
+            page['row_numbers'] = rows.tolist()
+        return page
+
+    @staticmethod
+    def _to_json(values: np.ndarray, mask: Optional[np.ndarray]) -> List[Any]:
+        result = values.tolist()
+        if mask is not None and mask.any():
+            for i in np.flatnonzero(mask):
+                result[i] = None
+        return result
+
+
+def open_preview(processed_filepath: str, fmt: str, feature_names: Sequence[str], chunksize: int,
+                 prepend_columns: Sequence[str] = (), append_columns: Sequence[str] = ()) -> PreviewIndex:
+    """
+    Return the preview index of a processed output, building it on first use.
+
+    Opened indexes are kept per process (up to OPEN_INDEXES), and dropped once
+    their folder is removed (e.g. by /reset). An index built from an earlier
+    version of the output (another /preprocess run or format writing the same
+    base path) is rebuilt.
+
+    Args:
+        processed_filepath: Processed output file
+        fmt: Its format
+        feature_names: Feature columns of the output
+        chunksize: Rows read per chunk while building
+        prepend_columns: Passthrough columns before the features ('npz' outputs)
+        append_columns: Passthrough columns after the features ('npz' outputs)
+    """
+    directory = preview_dir(processed_filepath)
+    signature = _source_signature(processed_filepath)
+    with _open_lock:
+        index = _open_indexes.get(directory)
+        if index is not None and os.path.isdir(directory) and index.matches(signature):
+            _open_indexes.move_to_end(directory)
+            return index
+        _open_indexes.pop(directory, None)
+
+    index = PreviewIndex(directory) if os.path.exists(os.path.join(directory, META_FILENAME)) else None
+    if index is not None and not index.matches(signature):
+        logger.info(f"Preview index of {processed_filepath} is stale, rebuilding")
+        remove_preview(processed_filepath)
+        index = None
+    if index is None:
+        index = PreviewIndex.build(directory, processed_filepath, fmt, feature_names, chunksize,
+                                   prepend_columns, append_columns)
+    with _open_lock:
+        _open_indexes[directory] = index
+        while len(_open_indexes) > OPEN_INDEXES:
+            _open_indexes.popitem(last=False)
+    return index
+
+
+def remove_preview(processed_filepath: str) -> None:
+    """Delete the preview index of a processed output, if it was built."""
+    directory = preview_dir(processed_filepath)
+    with _open_lock:
+        _open_indexes.pop(directory, None)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory, ignore_errors=True)
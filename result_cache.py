@@ -0,0 +1,237 @@
+import os
+import copy
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from automl_engine import ENGINE_VERSION
+from output_formats import output_path, output_files
+
+logger = logging.getLogger(__name__)
+
+RESULT_FILENAME = 'result.json'
+
+
+def result_key(content_hash: str, options: Dict[str, Any]) -> str:
+    """
+    Return the cache key of a preprocessing request.
+
+    Args:
+        content_hash: SHA-256 of the uploaded file
+        options: 'nan_strategy', 'target_column', 'serial_column', 'output_format', 'output_dtype'
+            and the feature selection settings
+
+    Returns:
+        Hex digest identifying the request under the current engine version
+    """
+    parts = [content_hash, options.get('nan_strategy'), options.get('target_column'),
+             options.get('serial_column'), options.get('output_format', 'csv'),
+             options.get('output_dtype', 'float32'), ENGINE_VERSION]
+    selection = [options.get(name) for name in ('variance_threshold', 'correlation_threshold', 'svd_components')]
+    if any(value is not None for value in selection):
+        # Only requests with feature selection carry its settings, so earlier keys stay valid
+        parts.append(selection)
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    """
+    Hard-link a file to destination, replacing it if present.
+
+    Falls back to a copy where links are unsupported (e.g. across filesystems).
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        # Already linked; renaming a link onto another link of the same file is a no-op
+        return
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError as e:
+        if not os.path.exists(source):
+            raise
+        logger.debug(f"Copying {source} instead of linking: {e}")
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+class ResultCache:
+    """
+    Size-bounded cache of finished preprocessing results, keyed by result_key.
+
+    Layout: '<root>/<key>/result.json' (client response and session updates)
+    next to hard links of the processed output files. The fitted cleaner is
+    referenced by artifact id, since the ArtifactStore already keeps it.
+    Entries are evicted least recently used first once the folder exceeds
+    max_bytes; the results of recently used entries are also kept in memory.
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 2 * 1024 ** 3, memory_entries: int = 32):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root_dir, key)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        result = self._read(key)
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._entry_dir(key), RESULT_FILENAME)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cached result {path}: {e}")
+            return None
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def restore(self, key: str, processed_base: str) -> Optional[Dict[str, Any]]:
+        """
+        Materialise a cached result for a new session.
+
+        Args:
+            key: Cache key from result_key
+            processed_base: Output path of the session without extension; the
+                cached output files are linked there
+
+        Returns:
+            Dictionary with 'response' and 'session_updates' like run_preprocessing, or None on a miss
+        """
+        result = self._load(key)
+        if result is None:
+            return None
+
+        entry_dir = self._entry_dir(key)
+        output_format = result['session_updates']['processed_format']
+        processed_filepath = output_path(processed_base, output_format)
+        linked = []
+        try:
+            for cached_name, destination in zip(result['output_files'], output_files(processed_filepath, output_format)):
+                link_or_copy(os.path.join(entry_dir, cached_name), destination)
+                linked.append(destination)
+            # Bump the entry's recency for eviction
+            os.utime(os.path.join(entry_dir, RESULT_FILENAME))
+        except OSError as e:
+            # Evicted by another process between the lookup and the link
+            logger.info(f"Cached result {key[:12]} vanished: {e}")
+            for path in linked:
+                os.remove(path)
+            with self._lock:
+                self._memory.pop(key, None)
+            return None
+
+        result = copy.deepcopy(result)
+        result['session_updates'].update(processed_filename=os.path.basename(processed_filepath),
+                                         processed_filepath=processed_filepath, processed_exports={},
+                                         processed_shards={})
+        return {'response': result['response'], 'session_updates': result['session_updates']}
+
+    def results(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (key, stored result) of every complete entry, e.g. to find the artifacts they refer to."""
+        for name in os.listdir(self.root_dir):
+            if name.endswith('.tmp'):
+                continue
+            # Read from disk without promoting every entry in the memory cache
+            result = self._read(name)
+            if result is not None:
+                yield name, result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store a run_preprocessing result and evict old entries beyond max_bytes.
+
+        Args:
+            key: Cache key from result_key
+            result: Dictionary with 'response' and 'session_updates'
+        """
+        updates = result['session_updates']
+        files = output_files(updates['processed_filepath'], updates['processed_format'])
+        entry_dir = self._entry_dir(key)
+        # Entries are built under a temporary name and renamed into place, so readers
+        # never see one without its output files
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(tmp_dir)
+            for path in files:
+                link_or_copy(path, os.path.join(tmp_dir, os.path.basename(path)))
+            entry = {'response': result['response'], 'session_updates': dict(updates),
+                     'output_files': [os.path.basename(path) for path in files]}
+            with open(os.path.join(tmp_dir, RESULT_FILENAME), 'w') as f:
+                json.dump(entry, f)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker cached the same request first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return
+        except OSError as e:
+            logger.warning(f"Could not cache result {key[:12]}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        self._remember(key, entry)
+        logger.info(f"Cached preprocessing result {key[:12]}")
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+
+        Args:
+            keep: Key that is never evicted (the entry just written)
+
+        Returns:
+            Number of entries removed
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.root_dir):
+            entry_dir = os.path.join(self.root_dir, name)
+            result_path = os.path.join(entry_dir, RESULT_FILENAME)
+            if name.endswith('.tmp') or not os.path.exists(result_path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+                entries.append((os.path.getmtime(result_path), size, name))
+            except OSError:
+                continue
+            total += size
+
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.root_dir, name), ignore_errors=True)
+            with self._lock:
+                self._memory.pop(name, None)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} cached results, {total / 1024 ** 2:.1f}MB remain")
+        return removed
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """
+    Interface for per-session state (upload info, processed file, fitted artifact id).
+
+    State is a JSON-serializable dict per session id. Sessions idle for longer
+    than ttl_seconds are evicted.
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """Return the state of a session (empty dict if unknown or expired)."""
+
+    @abstractmethod
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        """Replace the state of a session."""
+
+    @abstractmethod
+    def update(self, session_id: str, **fields) -> Dict[str, Any]:
+        """Atomically merge fields into the state of a session and return the new state."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session."""
+
+    @abstractmethod
+    def evict_expired(self) -> int:
+        """Remove sessions idle for longer than the TTL; returns how many were removed."""
+
+    @abstractmethod
+    def items(self) -> List[Tuple[str, Dict[str, Any], float]]:
+        """Return (session id, state, last touched time) of every live session, without touching them."""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store for a single worker (threaded servers are fine).
+
+    Besides the TTL, at most max_sessions are kept; the least recently used
+    session is evicted first.
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_sessions: int = 1000):
+        super().__init__(ttl_seconds)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, touched: float) -> bool:
+        return time.time() - touched > self.ttl_seconds
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return {}
+            if self._expired(entry[1]):
+                del self._sessions[session_id]
+                return {}
+            self._sessions[session_id] = (entry[0], time.time())
+            self._sessions.move_to_end(session_id)
+            return dict(entry[0])
+
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store(session_id, dict(state))
+
+    def update(self, session_id: str, **fields) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            state = dict(entry[0]) if entry and not self._expired(entry[1]) else {}
+            state.update(fields)
+            self._store(session_id, state)
+            return dict(state)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            expired = [sid for sid, (_, touched) in self._sessions.items() if self._expired(touched)]
+            for sid in expired:
+                del self._sessions[sid]
+            return len(expired)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any], float]]:
+        with self._lock:
+            return [(sid, dict(state), touched) for sid, (state, touched) in self._sessions.items()
+                    if not self._expired(touched)]
+
+    def _store(self, session_id: str, state: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        self._sessions[session_id] = (state, time.time())
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store backed by a local SQLite file, shared by every worker process.
+
+    Each thread uses its own connection. Writes run in IMMEDIATE transactions,
+    so read-modify-write updates are atomic across threads and processes, and
+    WAL mode lets readers proceed while another worker writes.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 24 * 3600, busy_timeout: float = 30.0):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                         'session_id TEXT PRIMARY KEY, state TEXT NOT NULL, touched REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched)')
+
+    def __getstate__(self):
+        # Connections are per thread and process; a copy sent to a worker process reconnects lazily
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not cross a fork, so reopen in each worker process
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        conn = self._connection()
+        row = conn.execute('SELECT state, touched FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        if row is None:
+            return {}
+        if time.time() - row[1] > self.ttl_seconds:
+            self.delete(session_id)
+            return {}
+        conn.execute('UPDATE sessions SET touched = ? WHERE session_id = ?', (time.time(), session_id))
+        return json.loads(row[0])
+
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        self._connection().execute(
+            'INSERT OR REPLACE INTO sessions (session_id, state, touched) VALUES (?, ?, ?)',
+            (session_id, json.dumps(state), time.time()))
+
+    def update(self, session_id: str, **fields) -> Dict[str, Any]:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT state, touched FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+            state = json.loads(row[0]) if row and time.time() - row[1] <= self.ttl_seconds else {}
+            state.update(fields)
+            conn.execute('INSERT OR REPLACE INTO sessions (session_id, state, touched) VALUES (?, ?, ?)',
+                         (session_id, json.dumps(state), time.time()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return state
+
+    def delete(self, session_id: str) -> None:
+        self._connection().execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def evict_expired(self) -> int:
+        cursor = self._connection().execute('DELETE FROM sessions WHERE touched < ?',
+                                            (time.time() - self.ttl_seconds,))
+        return cursor.rowcount
+
+    def items(self) -> List[Tuple[str, Dict[str, Any], float]]:
+        rows = self._connection().execute('SELECT session_id, state, touched FROM sessions WHERE touched >= ?',
+                                          (time.time() - self.ttl_seconds,))
+        return [(sid, json.loads(state), touched) for sid, state, touched in rows]
+
+
+def create_session_store(url: str, ttl_seconds: float = 24 * 3600) -> SessionStore:
+    """
+    Build a session store from a URL-like spec.
+
+    Args:
+        url: 'memory' for the in-process store, or 'sqlite:///<path>' for the shared SQLite store
+        ttl_seconds: Idle time after which sessions are evicted
+
+    Returns:
+        SessionStore instance
+    """
+    if url == 'memory':
+        return MemorySessionStore(ttl_seconds)
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(url[len('sqlite:///'):], ttl_seconds)
+    raise ValueError(f"Unsupported session store: {url!r}")
@@ -1,5 +1,205 @@
 // Smart Data Preprocessor JavaScript
 
+// Virtualized preview of the processed output: only the rows in view are in the DOM, and they
+// are fetched from /preview one page at a time, so million-row outputs never load in full
+class VirtualPreview {
+    static ROW_HEIGHT = 32;
+    static PAGE_SIZE = 200;
+    static COLUMN_WINDOW = 50;
+    static MAX_CACHED_PAGES = 50;
+    // Browsers cap element heights (~17M px in Firefox); beyond this the scroll position is scaled
+    static MAX_SCROLL_HEIGHT = 8000000;
+
+    constructor(container, totalRows, escapeHtml) {
+        this.container = container;
+        this.totalRows = totalRows;
+        this.escapeHtml = escapeHtml;
+        this.totalColumns = 0;
+        this.columns = [];
+        this.colOffset = 0;
+        this.sort = null;
+        this.order = 'asc';
+        this.pages = new Map();  // page index -> rows, or the pending request
+        this.generation = 0;     // bumped when sort or columns change, so stale responses are dropped
+        this.frame = null;
+        this.build();
+    }
+
+    build() {
+        this.container.innerHTML = `
+            <div class="d-flex justify-content-between align-items-center mb-2">
+                <small class="text-muted preview-status">Loading preview...</small>
+                <div class="btn-group btn-group-sm">
+                    <button type="button" class="btn btn-outline-secondary preview-prev-columns">&laquo; Columns</button>
+                    <button type="button" class="btn btn-outline-secondary preview-next-columns">Columns &raquo;</button>
+                </div>
+            </div>
+            <div class="preview-viewport">
+                <div class="preview-spacer"></div>
+                <table class="table table-striped table-hover table-sm preview-table">
+                    <thead></thead>
+                    <tbody></tbody>
+                </table>
+            </div>
+        `;
+        this.status = this.container.querySelector('.preview-status');
+        this.viewport = this.container.querySelector('.preview-viewport');
+        this.spacer = this.container.querySelector('.preview-spacer');
+        this.table = this.container.querySelector('.preview-table');
+        this.thead = this.table.querySelector('thead');
+        this.tbody = this.table.querySelector('tbody');
+        this.prevColumns = this.container.querySelector('.preview-prev-columns');
+        this.nextColumns = this.container.querySelector('.preview-next-columns');
+
+        this.viewport.addEventListener('scroll', () => this.scheduleRender());
+        window.addEventListener('resize', () => this.scheduleRender());
+        this.prevColumns.addEventListener('click', () => {
+            this.colOffset = Math.max(0, this.colOffset - VirtualPreview.COLUMN_WINDOW);
+            this.reload(false);
+        });
+        this.nextColumns.addEventListener('click', () => {
+            this.colOffset += VirtualPreview.COLUMN_WINDOW;
+            this.reload(false);
+        });
+        this.thead.addEventListener('click', (e) => {
+            const th = e.target.closest('th[data-index]');
+            if (th) this.toggleSort(this.columns[parseInt(th.dataset.index, 10)]);
+        });
+    }
+
+    // Cycle a column through ascending, descending and unsorted
+    toggleSort(column) {
+        if (this.sort !== column) {
+            this.sort = column;
+            this.order = 'asc';
+        } else if (this.order === 'asc') {
+            this.order = 'desc';
+        } else {
+            this.sort = null;
+            this.order = 'asc';
+        }
+        this.reload(true);
+    }
+
+    async load() {
+        await this.fetchPage(0);
+        this.renderHeader();
+        this.render();
+    }
+
+    reload(toTop) {
+        this.generation++;
+        this.pages.clear();
+        if (toTop) this.viewport.scrollTop = 0;
+        this.load().catch(error => this.showError(error));
+    }
+
+    fetchPage(index) {
+        if (this.pages.has(index)) return Promise.resolve(this.pages.get(index));
+        const generation = this.generation;
+        const params = new URLSearchParams({
+            offset: index * VirtualPreview.PAGE_SIZE,
+            limit: VirtualPreview.PAGE_SIZE,
+            col_offset: this.colOffset,
+            col_limit: VirtualPreview.COLUMN_WINDOW
+        });
+        if (this.sort !== null) {
+            params.set('sort', this.sort);
+            params.set('order', this.order);
+        }
+        const request = fetch(`/preview?${params}`)
+            .then(response => response.json().then(page => {
+                if (!response.ok) throw new Error(page.error || 'Preview failed');
+                return page;
+            }))
+            .then(page => {
+                if (generation !== this.generation) return null;
+                this.columns = page.columns;
+                this.totalRows = page.total_rows;
+                this.totalColumns = page.total_columns;
+                this.pages.set(index, page.rows);
+                // Keep memory bounded: forget the pages fetched longest ago
+                while (this.pages.size > VirtualPreview.MAX_CACHED_PAGES) {
+                    this.pages.delete(this.pages.keys().next().value);
+                }
+                return page.rows;
+            })
+            .catch(error => {
+                if (generation === this.generation) this.pages.delete(index);
+                throw error;
+            });
+        this.pages.set(index, request);
+        return request;
+    }
+
+    scheduleRender() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    renderHeader() {
+        this.thead.innerHTML = '<tr>' + this.columns.map((col, i) => {
+            const indicator = col === this.sort ? (this.order === 'asc' ? ' &#9650;' : ' &#9660;') : '';
+            return `<th data-index="${i}" title="Sort by ${this.escapeHtml(String(col))}">${this.escapeHtml(String(col))}${indicator}</th>`;
+        }).join('') + '</tr>';
+        const lastColumn = Math.min(this.colOffset + this.columns.length, this.totalColumns);
+        this.prevColumns.disabled = this.colOffset === 0;
+        this.nextColumns.disabled = lastColumn >= this.totalColumns;
+        this.spacer.style.height = `${Math.min(this.totalRows * VirtualPreview.ROW_HEIGHT + this.thead.offsetHeight,
+                                              VirtualPreview.MAX_SCROLL_HEIGHT)}px`;
+    }
+
+    formatValue(value) {
+        if (value === null || value === undefined) return '<span class="text-muted">&mdash;</span>';
+        if (typeof value === 'number') return value % 1 === 0 ? value : value.toFixed(4);
+        return this.escapeHtml(String(value));
+    }
+
+    render() {
+        const visible = Math.max(1, Math.floor((this.viewport.clientHeight - this.thead.offsetHeight) / VirtualPreview.ROW_HEIGHT));
+        const maxFirst = Math.max(0, this.totalRows - visible);
+        const maxScroll = this.viewport.scrollHeight - this.viewport.clientHeight;
+        const first = maxScroll > 0 ? Math.min(maxFirst, Math.round(this.viewport.scrollTop / maxScroll * maxFirst)) : 0;
+        const last = Math.min(this.totalRows, first + visible);
+
+        // The table follows the scroll position; only its rows change
+        this.table.style.transform = `translateY(${this.viewport.scrollTop}px)`;
+        const missing = new Set();
+        let html = '';
+        for (let row = first; row < last; row++) {
+            const pageIndex = Math.floor(row / VirtualPreview.PAGE_SIZE);
+            const rows = this.pages.get(pageIndex);
+            if (Array.isArray(rows)) {
+                html += '<tr>' + rows[row - pageIndex * VirtualPreview.PAGE_SIZE].map(value => `<td>${this.formatValue(value)}</td>`).join('') + '</tr>';
+            } else {
+                html += `<tr><td colspan="${this.columns.length}" class="text-muted">Loading...</td></tr>`;
+                missing.add(pageIndex);
+            }
+        }
+        this.tbody.innerHTML = html;
+
+        const lastColumn = Math.min(this.colOffset + this.columns.length, this.totalColumns);
+        this.status.textContent = this.totalRows === 0 ? 'No rows' :
+            `Rows ${(first + 1).toLocaleString()}-${last.toLocaleString()} of ${this.totalRows.toLocaleString()}, ` +
+            `columns ${this.colOffset + 1}-${lastColumn} of ${this.totalColumns}`;
+
+        missing.forEach(pageIndex => {
+            this.fetchPage(pageIndex)
+                .then(rows => { if (rows) this.scheduleRender(); })
+                .catch(error => this.showError(error));
+        });
+    }
+
+    showError(error) {
+        console.error('Preview error:', error);
+        this.status.textContent = `Preview failed: ${error.message}`;
+    }
+}
+
 class DataPreprocessor {
     constructor() {
         this.initializeEventListeners();
@@ -35,19 +235,22 @@ class DataPreprocessor {
     }
 
     validateFileInput(input) {
-        const file = input.files[0];
-        if (!file) return;
+        const files = Array.from(input.files);
+        if (!files.length) return;
 
-        // Check file type
-        if (!file.name.toLowerCase().endsWith('.csv')) {
-            this.showAlert('Please select a CSV file.', 'warning');
+        // Check file types (plain or compressed CSV, or a zip of CSV files)
+        if (!files.every(file => /\.(csv(\.gz|\.zst)?|zip)$/i.test(file.name))) {
+            this.showAlert('Please select CSV files (optionally .csv.gz or .csv.zst) or a zip of them.', 'warning');
             input.value = '';
             return;
         }
 
-        // Check file size (16MB limit)
-        if (file.size > 16 * 1024 * 1024) {
-            this.showAlert('File size must be less than 16MB.', 'warning');
+        // Check file size against the server-side upload limits; only a single CSV is sent in chunks
+        const chunked = files.length === 1 && !/\.zip$/i.test(files[0].name);
+        const maxMb = parseInt((chunked ? input.dataset.maxMb : input.dataset.requestMb) || '16', 10);
+        const totalSize = files.reduce((total, file) => total + file.size, 0);
+        if (totalSize > maxMb * 1024 * 1024) {
+            this.showAlert(`File size must be less than ${maxMb}MB.`, 'warning');
             input.value = '';
             return;
         }
@@ -70,18 +273,32 @@ class DataPreprocessor {
         this.hideSection('resultsSection');
 
         try {
-            const formData = new FormData();
-            formData.append('file', fileInput.files[0]);
-
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
-
-            const result = await response.json();
+            const files = Array.from(fileInput.files);
+            const file = files[0];
+            const chunkBytes = parseInt(fileInput.dataset.chunkMb || '8', 10) * 1024 * 1024;
+            let result;
+            if (files.length === 1 && file.size > chunkBytes && !/\.zip$/i.test(file.name)) {
+                result = await this.uploadInChunks(file, uploadBtn);
+            } else {
+                // Several files (or a zip of them) are loaded as one dataset
+                const formData = new FormData();
+                files.forEach(shard => formData.append('file', shard));
+
+                const response = await fetch('/upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                result = await response.json();
+            }
 
             if (result.success) {
-                this.showAlert(result.message, 'success');
+                const warnings = result.file_info.schema_warnings || [];
+                if (warnings.length) {
+                    // Shards that disagree on a column's type
+                    this.showAlert([result.message, ...warnings.map(warning => this.escapeHtml(warning))].join('<br>'), 'warning');
+                } else {
+                    this.showAlert(result.message, 'success');
+                }
                 this.displayFileInfo(result.file_info);
                 this.displayNanStats(result.file_info);
                 this.currentState = 'uploaded';
@@ -98,6 +315,56 @@ class DataPreprocessor {
         }
     }
 
+    async uploadInChunks(file, uploadBtn) {
+        // Resumable upload: each chunk is sent at the server's current offset, and a
+        // failed chunk is retried from whatever offset the server reports
+        const start = await fetch('/uploads', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        });
+        const upload = await start.json();
+        if (!start.ok) {
+            return upload;
+        }
+
+        let offset = 0;
+        let failures = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + upload.chunk_size);
+            try {
+                const response = await fetch(upload.upload_url, {
+                    method: 'PUT',
+                    headers: {'Upload-Offset': String(offset), 'Content-Type': 'application/octet-stream'},
+                    body: chunk
+                });
+                const state = await response.json();
+                if (response.ok || response.status === 409) {
+                    offset = state.offset;
+                    failures = 0;
+                } else if (response.status < 500) {
+                    return state;
+                } else {
+                    throw new Error(state.error);
+                }
+            } catch (error) {
+                if (++failures > 5) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                const status = await fetch(upload.upload_url);
+                if (status.ok) {
+                    offset = (await status.json()).offset;
+                }
+            }
+            const percent = Math.floor(100 * offset / file.size);
+            uploadBtn.innerHTML = `<span class="spinner-border spinner-border-sm me-2"></span>Uploading ${percent}%`;
+        }
+
+        const response = await fetch(`/uploads/${upload.upload_id}/complete`, {method: 'POST'});
+        return response.json();
+    }
+
     displayFileInfo(fileInfo) {
         const content = document.getElementById('fileInfoContent');
         const columnsPreview = fileInfo.column_names.length > 10 
@@ -184,13 +451,31 @@ class DataPreprocessor {
             const nanStrategy = document.getElementById('nanStrategy')?.value || 'impute';
             const targetColumn = document.getElementById('targetColumn')?.value || '';
             const serialColumn = document.getElementById('serialColumn')?.value || '';
+            const outputFormat = document.getElementById('outputFormat')?.value || 'csv';
+            const featureSelection = document.getElementById('featureSelection')?.checked || false;
+            const svdComponents = document.getElementById('svdComponents')?.value || '';
             const response = await fetch('/preprocess', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ nan_strategy: nanStrategy, target_column: targetColumn, serial_column: serialColumn })
+                body: JSON.stringify({
+                    nan_strategy: nanStrategy,
+                    target_column: targetColumn,
+                    serial_column: serialColumn,
+                    output_format: outputFormat,
+                    feature_selection: featureSelection,
+                    svd_components: svdComponents
+                })
             });
 
-            const result = await response.json();
+            const submitted = await response.json();
+            if (!submitted.success) {
+                this.showAlert(submitted.error || 'Preprocessing failed', 'danger');
+                return;
+            }
+
+            // The server queues the work and we poll until the job finishes, unless an
+            // identical earlier request was answered from the result cache
+            const result = submitted.status_url ? await this.pollJob(submitted.status_url) : submitted;
 
             if (result.success) {
                 this.showAlert(result.message, 'success');
@@ -209,6 +494,30 @@ class DataPreprocessor {
         }
     }
 
+    async pollJob(statusUrl, intervalMs = 1000) {
+        const statusText = document.getElementById('processingStatusText');
+        while (true) {
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+            if (!response.ok) {
+                return { success: false, error: job.error };
+            }
+            if (job.status === 'done') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                return { success: false, error: job.error };
+            }
+
+            if (statusText) {
+                const stage = job.stage.replace(/_/g, ' ');
+                const rows = job.rows_processed ? ` (${job.rows_processed.toLocaleString()} rows)` : '';
+                statusText.textContent = `Processing your data... ${stage}${rows}`;
+            }
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+
     displayResults(result) {
         // Display summary
         this.displaySummary(result.summary);
@@ -226,6 +535,16 @@ class DataPreprocessor {
     displaySummary(summary) {
         const content = document.getElementById('summaryContent');
         const stats = summary.preprocessing_stats;
+        const selection = stats.feature_selection;
+        let selectionText = '';
+        if (selection) {
+            selectionText = ` Feature selection removed ${selection.low_variance_features.length} near-constant and
+                ${selection.correlated_features.length} highly correlated features`;
+            selectionText += selection.svd_components
+                ? ` and projected the rest onto ${selection.svd_components} SVD components
+                    (${(selection.explained_variance_ratio * 100).toFixed(1)}% of the variance).`
+                : '.';
+        }
         
         content.innerHTML = `
             <div class="row mb-3">
@@ -260,7 +579,7 @@ class DataPreprocessor {
                         <i class="fas fa-info-circle me-2"></i>
                         <strong>Processing Complete!</strong> Your dataset has been automatically cleaned and prepared for machine learning.
                         ${stats.numerical_features} numerical features were scaled, ${stats.categorical_features} categorical features were encoded,
-                        and ${stats.features_dropped} constant/problematic features were removed.
+                        and ${stats.features_dropped} constant/problematic features were removed.${selectionText}
                     </div>
                 </div>
             </div>
@@ -269,6 +588,21 @@ class DataPreprocessor {
 
     displayPreview(preview) {
         const content = document.getElementById('previewContent');
+        if (!preview.total_rows) {
+            content.innerHTML = '<p class="text-muted">No preview data available.</p>';
+            return;
+        }
+
+        // Page through the whole output on the server; fall back to the rows sent with the result
+        const virtualPreview = new VirtualPreview(content, preview.total_rows, text => this.escapeHtml(text));
+        virtualPreview.load().catch(error => {
+            console.error('Preview error:', error);
+            this.displayStaticPreview(preview);
+        });
+    }
+
+    displayStaticPreview(preview) {
+        const content = document.getElementById('previewContent');
         
         if (!preview.data || preview.data.length === 0) {
             content.innerHTML = '<p class="text-muted">No preview data available.</p>';
@@ -277,6 +611,7 @@ class DataPreprocessor {
 
         // Create table
         let tableHTML = `
+            <div class="table-responsive">
             <table class="table table-striped table-hover">
                 <thead>
                     <tr>
@@ -309,8 +644,9 @@ class DataPreprocessor {
         tableHTML += `
                 </tbody>
             </table>
+            </div>
             <div class="mt-2 text-muted">
-                <small>Showing 10 of ${preview.total_rows.toLocaleString()} rows</small>
+                <small>Showing ${preview.data.length} of ${preview.total_rows.toLocaleString()} rows</small>
             </div>
         `;
         
@@ -371,7 +707,30 @@ class DataPreprocessor {
         `;
         
         detailsHTML += '</div>';
-        
+
+        // Per-column statistics from the dataset profile
+        const columnStats = Object.entries(summary.column_stats || {});
+        if (columnStats.length > 0) {
+            const format = value => value === undefined || value === null ? '' :
+                (value % 1 === 0 ? value.toLocaleString() : value.toFixed(4));
+            detailsHTML += `
+                <h6><i class="fas fa-chart-bar me-2"></i>Column Statistics</h6>
+                <div class="table-responsive">
+                    <table class="table table-sm table-striped">
+                        <thead><tr><th>Column</th><th>Missing</th><th>Distinct${summary.distinct_exact ? '' : ' (approx.)'}</th>
+                            <th>Min</th><th>Max</th><th>Mean</th><th>Std</th></tr></thead>
+                        <tbody>
+                            ${columnStats.map(([col, stats]) => `
+                                <tr><td>${this.escapeHtml(col)}</td><td>${format(stats.missing)}</td><td>${format(stats.distinct)}</td>
+                                    <td>${format(stats.min)}</td><td>${format(stats.max)}</td>
+                                    <td>${format(stats.mean)}</td><td>${format(stats.std)}</td></tr>
+                            `).join('')}
+                        </tbody>
+                    </table>
+                </div>
+            `;
+        }
+
         content.innerHTML = detailsHTML;
     }
 
@@ -409,7 +768,7 @@ class DataPreprocessor {
                 const url = window.URL.createObjectURL(blob);
                 const a = document.createElement('a');
                 a.href = url;
-                a.download = 'processed_dataset.csv';
+                a.download = this.getDownloadName(response, 'processed_dataset.csv');
                 document.body.appendChild(a);
                 a.click();
                 window.URL.revokeObjectURL(url);
@@ -524,6 +883,13 @@ class DataPreprocessor {
         section.classList.remove('fade-in');
     }
 
+    getDownloadName(response, fallback) {
+        // Use the server-provided filename so non-CSV formats keep their extension
+        const disposition = response.headers.get('Content-Disposition') || '';
+        const match = disposition.match(/filename\*?=(?:UTF-8'')?"?([^";]+)"?/i);
+        return match ? decodeURIComponent(match[1]) : fallback;
+    }
+
     formatFileSize(bytes) {
         if (bytes === 0) return '0 B';
         const k = 1024;
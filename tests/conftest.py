@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to app.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.datasets import generate_frame  # noqa: E402
+
+
+def split_chunks(frame, size):
+    """Split frame into consecutive chunks of size rows, as pd.read_csv(chunksize=size) yields them."""
+    return [frame.iloc[start:start + size] for start in range(0, len(frame), size)]
+
+
+@pytest.fixture
+def frame():
+    """A small synthetic dataset with numerical, categorical and datetime columns and missing values."""
+    return generate_frame(2000, numerical=4, categorical=2, cardinality=6, datetimes=1, nan_density=0.05)
+
+
+@pytest.fixture
+def features(frame):
+    """The feature columns of frame (without the id serial and the target)."""
+    return frame.drop(columns=['id', 'target'])
@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from automl_engine import DataCleaner
+from batch_transform import split_csv, transform_file
+
+
+def _serial_output(cleaner, frame, prepend, append):
+    return pd.concat(list(cleaner.transform_chunks([frame], prepend, append)), ignore_index=True)
+
+
+@pytest.mark.parametrize('n_jobs,start_method', [(1, None), (2, 'fork'), (2, 'spawn')])
+def test_transform_file_matches_serial_transform(tmp_path, frame, features, n_jobs, start_method):
+    cleaner = DataCleaner()
+    cleaner.fit_transform(features)
+    src = tmp_path / 'batch.csv'
+    frame.to_csv(src, index=False)
+
+    result = transform_file(cleaner, str(src), str(tmp_path / 'out.csv'), n_jobs=n_jobs, chunk_bytes=16 * 1024,
+                            prepend_columns=['id'], append_columns=['target'], start_method=start_method)
+
+    assert result['chunks'] > 1
+    assert result['rows'] == len(frame)
+    expected = _serial_output(cleaner, pd.read_csv(src), ['id'], ['target'])
+    # Compared through CSV, as the output file stores the features as text
+    expected = pd.read_csv(io.StringIO(expected.to_csv(index=False)))
+    pd.testing.assert_frame_equal(pd.read_csv(result['paths'][0]), expected)
+    assert result['drift']['rows'] == len(frame)
+
+
+def test_numeric_looking_categories_match_full_transform(tmp_path, frame):
+    # Only the first rows hold a non-digit level, so later byte ranges look numeric on their own
+    positions = np.arange(len(frame))
+    codes = np.where(positions < 100, 'x', (positions % 3 + 1).astype(str)).astype(object)
+    codes[positions % 97 == 5] = None
+    frame = frame.assign(code=codes)
+    features = frame.drop(columns=['id', 'target'])
+    cleaner = DataCleaner()
+    cleaner.fit_transform(features)
+    src = tmp_path / 'batch.csv'
+    frame.to_csv(src, index=False)
+
+    result = transform_file(cleaner, str(src), str(tmp_path / 'out.csv'), n_jobs=1, chunk_bytes=16 * 1024,
+                            chunksize=300)
+
+    assert result['chunks'] > 1
+    expected = cleaner.transform(pd.read_csv(src).drop(columns=['id', 'target']))
+    out = pd.read_csv(result['paths'][0])
+    np.testing.assert_allclose(out[cleaner.feature_names_out].to_numpy(), expected, atol=1e-6)
+
+
+def test_concatenated_header_with_quoted_commas_and_newlines(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = 20000
+    frame = pd.DataFrame({
+        'row, "id"\nkey': np.arange(rows),
+        'x,\n"y"': rng.normal(size=rows),
+        'plain': rng.normal(size=rows),
+        'label\n,"z"': rng.integers(0, 2, size=rows),
+    })
+    cleaner = DataCleaner()
+    cleaner.fit_transform(frame[['x,\n"y"', 'plain']])
+    src = tmp_path / 'batch.csv'
+    frame.to_csv(src, index=False)
+
+    result = transform_file(cleaner, str(src), str(tmp_path / 'out.csv'), n_jobs=1, chunk_bytes=64 * 1024,
+                            prepend_columns=['row, "id"\nkey'], append_columns=['label\n,"z"'])
+
+    assert result['chunks'] > 1
+    out = pd.read_csv(result['paths'][0])
+    assert len(out) == rows
+    assert list(out.columns) == ['row, "id"\nkey', *cleaner.feature_names_out, 'label\n,"z"']
+    np.testing.assert_array_equal(out['row, "id"\nkey'].to_numpy(), np.arange(rows))
+
+
+def test_split_csv_respects_quoted_newlines(tmp_path):
+    frame = pd.DataFrame({'text': [f'line {i}\nsecond, "quoted"' for i in range(5000)], 'value': range(5000)})
+    src = tmp_path / 'quoted.csv'
+    frame.to_csv(src, index=False)
+
+    header_end, ranges = split_csv(str(src), 8)
+
+    data = src.read_bytes()
+    header = data[:header_end]
+    parts = [pd.read_csv(io.BytesIO(header + data[start:end])) for start, end in ranges]
+    assert len(ranges) == 8
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), frame)
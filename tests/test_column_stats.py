@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from column_stats import HLL_PRECISION, NUNIQUE_CAP, ColumnStats, HyperLogLog, hash_values
+
+# Four standard errors of a sketch at the default precision
+TOLERANCE = 4 * 1.04 / np.sqrt(2 ** HLL_PRECISION)
+
+
+@pytest.mark.parametrize('distinct', [50, 5000, 200000])
+def test_hyperloglog_estimate_within_error_bound(distinct):
+    sketch = HyperLogLog()
+    values = pd.Series(np.random.default_rng(distinct).permutation(distinct * 3) % distinct)
+    sketch.add(hash_values(values))
+
+    assert abs(sketch.estimate() - distinct) <= TOLERANCE * distinct
+
+
+def test_hyperloglog_merge_equals_one_sketch_of_the_union():
+    values = pd.Series(np.arange(60000))
+    whole, left, right = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    whole.add(hash_values(values))
+    # Overlapping halves: values in both are counted once
+    left.add(hash_values(values.iloc[:40000]))
+    right.add(hash_values(values.iloc[20000:]))
+    left.merge(right)
+
+    np.testing.assert_array_equal(left.registers, whole.registers)
+    assert abs(left.estimate() - 60000) <= TOLERANCE * 60000
+
+
+def test_column_stats_merged_over_chunks_equal_one_pass(frame):
+    frame = frame.assign(wide=np.arange(len(frame)) * 7)
+    single = ColumnStats()
+    single.update(frame)
+    merged = ColumnStats()
+    for start in range(0, len(frame), 300):
+        chunk = ColumnStats()
+        chunk.update(frame.iloc[start:start + 300])
+        merged.merge(chunk)
+
+    assert merged.result()['nunique'] == single.result()['nunique']
+    for col, count in frame.nunique().items():
+        if count < NUNIQUE_CAP:
+            assert merged.result()['nunique'][col] == count
+        else:
+            assert abs(merged.result()['nunique'][col] - count) <= TOLERANCE * count
+    assert merged.nan_stats() == single.nan_stats()
+    for col, stats in single.numeric_stats().items():
+        assert merged.numeric_stats()[col] == pytest.approx(stats)
+
+
+def test_distinct_count_switches_to_the_sketch_beyond_the_cap():
+    # Integers in one chunk and floats in another hash alike
+    stats = ColumnStats(moments=False)
+    stats.update(pd.DataFrame({'x': np.arange(3000)}))
+    stats.update(pd.DataFrame({'x': np.arange(1000, 4000, dtype=np.float64)}))
+
+    result = stats.result()
+    assert not result['nunique_exact']
+    assert result['nunique']['x'] >= NUNIQUE_CAP
+    assert abs(result['nunique']['x'] - 4000) <= TOLERANCE * 4000
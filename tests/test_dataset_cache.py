@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from dataset_cache import DatasetCache, deduplicate_upload, release_upload
+
+
+def _build(cache, tmp_path, frame, key):
+    src = tmp_path / f'{key}.csv'
+    frame.to_csv(src, index=False)
+    return cache.build(key, str(src))
+
+
+def test_least_recently_used_datasets_are_evicted(tmp_path, frame):
+    cache = DatasetCache(str(tmp_path / 'cache'))
+    _build(cache, tmp_path, frame, 'a')
+    entry_bytes = cache.entries()['a']['bytes']
+    cache.max_bytes = 2 * entry_bytes + entry_bytes // 2
+    _build(cache, tmp_path, frame.iloc[::-1], 'b')
+    # Reading 'a' makes 'b' the least recently used entry
+    for key, age in (('a', 30), ('b', 20)):
+        for path in cache.entries()[key]['paths']:
+            os.utime(path, (os.path.getmtime(path) - age,) * 2)
+    assert cache.load_frame('a') is not None
+
+    _build(cache, tmp_path, frame.sample(frac=1, random_state=0), 'c')
+
+    assert sorted(cache.entries()) == ['a', 'c']
+    assert cache.get_profile('b') is None and cache.load_frame('b') is None
+    assert sum(info['bytes'] for info in cache.entries().values()) <= cache.max_bytes
+
+
+def test_identical_uploads_share_one_stored_copy(tmp_path, frame):
+    blob_dir = tmp_path / 'blobs'
+    blob_dir.mkdir()
+    paths = [tmp_path / name for name in ('first.csv', 'second.csv')]
+    for path in paths:
+        frame.to_csv(path, index=False)
+    content_hash = hashlib.sha256(paths[0].read_bytes()).hexdigest()
+
+    assert [deduplicate_upload(str(path), content_hash, str(blob_dir)) for path in paths] == [False, True]
+    assert os.listdir(blob_dir) == [f'{content_hash}.csv']
+    assert os.path.samefile(paths[0], paths[1])
+
+    # The stored copy outlives the first release and goes with the last one
+    release_upload(str(paths[0]), content_hash, str(blob_dir))
+    assert os.listdir(blob_dir) == [f'{content_hash}.csv'] and paths[1].exists()
+    release_upload(str(paths[1]), content_hash, str(blob_dir))
+    assert os.listdir(blob_dir) == []
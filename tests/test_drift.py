@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from drift import PSI_ALERT, PSI_WARNING, DriftMonitor
+
+
+def _frame(rows, seed, shift=0.0, unseen=0.0, null_rate=0.0):
+    rng = np.random.default_rng(seed)
+    levels = rng.choice(['a', 'b', 'c'], size=rows, p=[0.5, 0.3, 0.2]).astype(object)
+    levels[rng.random(rows) < unseen] = 'z'
+    y = rng.uniform(size=rows)
+    y[rng.random(rows) < null_rate] = np.nan
+    return pd.DataFrame({'x': rng.normal(loc=shift, size=rows), 'y': y, 'c': levels})
+
+
+@pytest.fixture
+def monitor():
+    return DriftMonitor(batch_sample_rows=None).fit(_frame(20000, 0), ['x', 'y'], ['c'])
+
+
+def test_psi_separates_shifted_from_unshifted_batches(monitor):
+    same = monitor.observe(_frame(5000, 1)).report()
+    shifted = monitor.observe(_frame(5000, 1, shift=1.0)).report()
+
+    assert same['max_psi'] < PSI_WARNING
+    assert same['drifted_columns'] == []
+    assert shifted['columns']['x']['psi'] > PSI_ALERT
+    assert shifted['columns']['y']['psi'] < PSI_WARNING
+    assert shifted['drifted_columns'] == ['x']
+
+
+def test_unseen_levels_and_null_rates_raise_alerts(monitor):
+    report = monitor.observe(_frame(5000, 1, unseen=0.1, null_rate=0.3)).report()
+
+    assert report['columns']['c']['unseen_rate'] == pytest.approx(0.1, abs=0.02)
+    assert report['columns']['c']['unseen_examples'] == ['z']
+    assert report['columns']['y']['reference_null_rate'] == 0
+    assert report['columns']['y']['null_rate_change'] == pytest.approx(0.3, abs=0.03)
+    assert sorted(report['drifted_columns']) == ['c', 'y']
+
+
+def test_merged_chunk_batches_equal_one_pass(monitor):
+    frame = _frame(5000, 2, shift=0.3, unseen=0.05, null_rate=0.1)
+    merged = monitor.observe(frame.iloc[:1700])
+    for start in (1700, 3400):
+        merged.merge(monitor.observe(frame.iloc[start:start + 1700]))
+
+    assert merged.report() == monitor.observe(frame).report()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from automl_engine import DataCleaner
+
+
+def _records(frame):
+    return [{col: (None if value != value else value) for col, value in row.items()}
+            for row in frame.to_dict(orient='records')]
+
+
+# transform casts inputs to float32 before scaling, the fast path scales in float64
+TOLERANCE = {'rtol': 1e-5, 'atol': 1e-4}
+
+
+def test_transform_records_matches_transform(features):
+    cleaner = DataCleaner()
+    cleaner.fit_transform(features)
+    batch = features.iloc[:200]
+
+    np.testing.assert_allclose(cleaner.transform_records(_records(batch)), cleaner.transform(batch),
+                               **TOLERANCE)
+
+
+def test_transform_records_handles_unseen_and_missing_values(features):
+    cleaner = DataCleaner()
+    cleaner.fit_transform(features)
+    batch = features.iloc[:20].copy()
+    batch['cat_0'] = ['unseen'] * 10 + [None] * 10
+    batch.iloc[::3, 0] = np.nan
+
+    np.testing.assert_allclose(cleaner.transform_records(_records(batch)), cleaner.transform(batch),
+                               **TOLERANCE)
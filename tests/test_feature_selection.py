@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from automl_engine import DataCleaner
+from feature_selection import FeatureSelector
+
+
+def _matrix(rows=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(rows, 3))
+    rare = np.zeros(rows)
+    rare[:2] = 1.0
+    duplicate = 2 * base[:, 0] + rng.normal(scale=1e-3, size=rows)
+    return np.column_stack([base, rare, duplicate]), ['a', 'b', 'c', 'rare', 'a_twice']
+
+
+@pytest.mark.parametrize('to_sparse', [False, True])
+def test_low_variance_and_correlated_features_are_dropped(to_sparse):
+    X, names = _matrix()
+    X = sparse.csr_matrix(X) if to_sparse else X
+    selector = FeatureSelector(variance_threshold=1e-3, correlation_threshold=0.95)
+
+    out = selector.fit_transform(X, names)
+
+    assert selector.feature_names_out == ['a', 'b', 'c']
+    assert selector.low_variance == ['rare']
+    assert [(item['feature'], item['correlated_with']) for item in selector.correlated] == [('a_twice', 'a')]
+    dense = out.toarray() if sparse.issparse(out) else out
+    np.testing.assert_array_equal(dense, _matrix()[0][:, :3])
+    transformed = selector.transform(X)
+    np.testing.assert_array_equal(transformed.toarray() if sparse.issparse(transformed) else transformed, dense)
+
+
+def test_selection_survives_new_one_hot_columns(features):
+    features = features.assign(num_twice=features['num_0'] * 2)
+    new_rows = features.iloc[:200].copy()
+    new_rows['cat_0'] = 'level_new'
+    cleaner = DataCleaner(correlation_threshold=0.95)
+    cleaner.fit_transform(features)
+    assert 'num_twice' not in cleaner.feature_names_out
+
+    cleaner.partial_fit(new_rows, new_categories='extend')
+
+    assert 'num_twice' not in cleaner.feature_names_out
+    assert 'cat_0_level_new' in cleaner.feature_names_out
+    X = cleaner.transform(new_rows)
+    assert X.shape[1] == len(cleaner.feature_names_out)
+    assert (X[:, cleaner.feature_names_out.index('cat_0_level_new')] == 1).all()
+
+
+def test_svd_projection_refuses_new_categories(features):
+    new_rows = features.iloc[:200].copy()
+    new_rows['cat_0'] = 'level_new'
+    cleaner = DataCleaner(svd_components=3)
+    cleaner.fit_transform(features)
+    assert cleaner.feature_names_out == ['svd_0', 'svd_1', 'svd_2']
+
+    with pytest.raises(ValueError, match='SVD'):
+        cleaner.partial_fit(new_rows, new_categories='extend')
+    # Frozen categories keep the fitted layout, so the projection still applies
+    cleaner.partial_fit(new_rows, new_categories='freeze')
+    assert cleaner.transform(new_rows).shape == (200, 3)
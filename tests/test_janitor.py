@@ -0,0 +1,54 @@
+import os
+import time
+
+from artifact_store import ArtifactStore
+from automl_engine import DataCleaner
+from dataset_cache import DatasetCache
+from janitor import Janitor
+from session_store import MemorySessionStore
+
+
+def _age(path, seconds):
+    paths = [path]
+    for directory, dirnames, filenames in os.walk(path):
+        paths += [os.path.join(directory, name) for name in dirnames + filenames]
+    for path in paths:
+        os.utime(path, (time.time() - seconds,) * 2)
+
+
+def test_unreferenced_datasets_and_artifacts_are_evicted(tmp_path, frame, features):
+    folders = {name: tmp_path / name for name in ('uploads', 'processed', 'blobs', 'cache', 'artifacts')}
+    for folder in folders.values():
+        folder.mkdir()
+    dataset_cache = DatasetCache(str(folders['cache']))
+    artifact_store = ArtifactStore(str(folders['artifacts']))
+    src = tmp_path / 'train.csv'
+    frame.to_csv(src, index=False)
+    for key in ('live', 'stale'):
+        dataset_cache.build(key, str(src))
+    cleaner = DataCleaner()
+    cleaner.fit_transform(features)
+    live = artifact_store.save(cleaner)['artifact_id']
+    stale = artifact_store.save(cleaner)['artifact_id']
+    sessions = MemorySessionStore()
+    sessions.set('session', {'content_hash': 'live', 'artifact_id': live})
+    janitor = Janitor(sessions, str(folders['uploads']), str(folders['processed']), str(folders['blobs']),
+                      ttl_seconds=3600, grace_seconds=60, interval=0, dataset_cache=dataset_cache,
+                      artifact_store=artifact_store)
+    for folder in ('cache', 'artifacts'):
+        for entry in folders[folder].iterdir():
+            _age(str(entry), 2 * 3600)
+
+    stats = janitor.run_once()
+
+    assert stats['removed'] == 2
+    assert sorted(dataset_cache.entries()) == ['live']
+    assert [artifact['artifact_id'] for artifact in artifact_store.list_artifacts()] == [live]
+
+    # Over quota, unreferenced entries go even before their TTL; referenced ones stay
+    dataset_cache.build('recent', str(src))
+    for path in dataset_cache.entries()['recent']['paths']:
+        _age(path, 120)
+    janitor.cache_quota_bytes = 1
+    janitor.run_once()
+    assert sorted(dataset_cache.entries()) == ['live']
@@ -0,0 +1,51 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from output_formats import OutputWriter, convert_output, iter_output_chunks, output_files, sidecar_path
+
+
+@pytest.fixture
+def frames():
+    frames = [pd.DataFrame({'id': [f'row_{i}' for i in range(start, start + 50)],
+                            'f1': np.arange(start, start + 50, dtype=np.float32),
+                            'f2': np.ones(50, dtype=np.float32),
+                            'target': np.arange(start, start + 50) % 2})
+              for start in range(0, 200, 50)]
+    frames[2].loc[3, 'target'] = np.nan
+    return frames
+
+
+def test_npy_output_round_trips_passthrough_columns(tmp_path, frames):
+    path = str(tmp_path / 'out.npy')
+    with OutputWriter(path, 'npy', ['f1', 'f2']) as writer:
+        for frame in frames:
+            writer.write(frame)
+
+    assert all(os.path.exists(name) for name in output_files(path, 'npy'))
+    out = pd.concat(iter_output_chunks(path, 'npy', 30, start=17, stop=163), ignore_index=True)
+    expected = pd.concat(frames, ignore_index=True).iloc[17:163].reset_index(drop=True)
+    assert list(out.columns) == ['id', 'f1', 'f2', 'target']
+    pd.testing.assert_series_equal(out['id'], expected['id'], check_dtype=False)
+    np.testing.assert_array_equal(out['f1'].to_numpy(), expected['f1'].to_numpy())
+    np.testing.assert_array_equal(out['target'].to_numpy(), expected['target'].to_numpy())
+
+
+def test_npy_output_keeps_the_feature_dtype(tmp_path, frames):
+    path = str(tmp_path / 'out.npy')
+    with OutputWriter(path, 'npy', ['f1', 'f2']) as writer:
+        for frame in frames:
+            writer.write(frame)
+    # CSV reads the features back as float64; the cleaner's dtype is passed on conversion
+    csv_path = str(tmp_path / 'out.csv')
+    convert_output(path, 'npy', csv_path, 'csv', ['f1', 'f2'], 64)
+    converted_path = str(tmp_path / 'converted.npy')
+    convert_output(csv_path, 'csv', converted_path, 'npy', ['f1', 'f2'], 64, dtype='float32')
+
+    for npy_path in (path, converted_path):
+        assert np.load(npy_path).dtype == np.float32
+        with open(sidecar_path(npy_path)) as f:
+            assert json.load(f)['dtype'] == 'float32'
@@ -0,0 +1,35 @@
+import numpy as np
+
+from automl_engine import DataCleaner
+from conftest import split_chunks
+
+
+def test_partial_fit_matches_a_single_streaming_fit(features):
+    full = DataCleaner()
+    full.fit_stream(split_chunks(features, 500))
+    incremental = DataCleaner()
+    incremental.fit_stream(split_chunks(features.iloc[:1000], 500))
+
+    incremental.partial_fit(split_chunks(features.iloc[1000:], 500))
+
+    assert incremental.feature_names_out == full.feature_names_out
+    assert incremental.running_stats['n_rows'] == len(features)
+    np.testing.assert_allclose(incremental.transform(features), full.transform(features), rtol=1e-5, atol=1e-6)
+
+
+def test_partial_fit_extends_categories_only_when_asked(features):
+    new_rows = features.iloc[:200].copy()
+    # Sorts after the fitted levels, so it is not the dropped first category
+    new_rows['cat_0'] = 'level_new'
+    frozen = DataCleaner()
+    frozen.fit_transform(features)
+    names = list(frozen.feature_names_out)
+    extended = DataCleaner()
+    extended.fit_transform(features)
+
+    frozen.partial_fit(new_rows, new_categories='freeze')
+    extended.partial_fit(new_rows, new_categories='extend')
+
+    assert frozen.feature_names_out == names
+    assert len(extended.feature_names_out) == len(names) + 1
+    assert 'cat_0_level_new' in extended.feature_names_out
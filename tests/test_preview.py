@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from preview import open_preview, remove_preview
+
+
+def test_rewritten_output_rebuilds_the_preview_index(tmp_path):
+    path = str(tmp_path / 'processed.csv')
+    pd.DataFrame({'f1': np.arange(200, dtype=float), 'f2': np.ones(200)}).to_csv(path, index=False)
+    try:
+        first = open_preview(path, 'csv', ['f1', 'f2'], 64)
+        assert first.n_rows == 200
+
+        pd.DataFrame({'f1': -np.arange(150, dtype=float), 'f2': np.zeros(150)}).to_csv(path, index=False)
+        second = open_preview(path, 'csv', ['f1', 'f2'], 64)
+
+        assert second.n_rows == 150
+        page = second.page(0, 3, sort='f1')
+        assert page['total_rows'] == 150
+        assert [row[0] for row in page['rows']] == [-149.0, -148.0, -147.0]
+    finally:
+        remove_preview(path)
@@ -0,0 +1,86 @@
+import hashlib
+import os
+
+import pytest
+
+from artifact_store import ArtifactStore
+from automl_engine import DataCleaner
+from dataset_cache import DatasetCache
+from preprocessing import cached_preprocessing, run_preprocessing
+from result_cache import ResultCache
+
+OPTIONS = {'nan_strategy': 'impute', 'target_column': 'target', 'serial_column': 'id', 'output_format': 'csv',
+           'output_dtype': 'float32'}
+
+
+@pytest.fixture
+def stores(tmp_path):
+    folders = {name: tmp_path / name for name in ('processed', 'cache', 'artifacts', 'results')}
+    for folder in folders.values():
+        folder.mkdir()
+    settings = {'processed_folder': str(folders['processed']), 'cache_folder': str(folders['cache']),
+                'artifact_folder': str(folders['artifacts']), 'result_cache_folder': str(folders['results']),
+                'result_cache_bytes': 1 << 30, 'streaming_threshold': 1 << 30, 'csv_chunk_size': 500, 'n_jobs': 1}
+    return (settings, DatasetCache(settings['cache_folder']), ArtifactStore(settings['artifact_folder']),
+            ResultCache(settings['result_cache_folder']))
+
+
+def _file_info(tmp_path, frame, dataset_cache, name, session_id):
+    path = tmp_path / name
+    frame.to_csv(path, index=False)
+    content_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+    profile = dataset_cache.get_profile(content_hash) or dataset_cache.build(content_hash, str(path))
+    return {'filename': name, 'filepath': str(path), 'original_name': name, 'content_hash': content_hash,
+            'rows': profile['rows'], 'columns': profile['columns'], 'column_names': profile['column_names'],
+            'session_id': session_id}
+
+
+def test_repeated_request_is_restored_without_refitting(tmp_path, frame, stores, monkeypatch):
+    settings, dataset_cache, artifact_store, result_cache = stores
+    first = run_preprocessing(_file_info(tmp_path, frame, dataset_cache, 'a.csv', 'session-a'), OPTIONS, settings,
+                              dataset_cache, artifact_store, result_cache=result_cache)
+
+    def refit(*args, **kwargs):
+        raise AssertionError("a cached request was fitted again")
+
+    monkeypatch.setattr(DataCleaner, 'fit_transform', refit)
+    monkeypatch.setattr(DataCleaner, 'fit_stream', refit)
+    file_info = _file_info(tmp_path, frame, dataset_cache, 'b.csv', 'session-b')
+    second = cached_preprocessing(file_info, OPTIONS, settings, result_cache, artifact_store)
+
+    assert second['response']['cached'] is True
+    updates = second['session_updates']
+    with open(updates['processed_filepath'], 'rb') as restored, \
+            open(first['session_updates']['processed_filepath'], 'rb') as fitted:
+        assert restored.read() == fitted.read()
+    # The cleaner fitted for the other session is copied, not shared
+    assert updates['artifact_id'] != first['session_updates']['artifact_id']
+    assert artifact_store.get_metadata(updates['artifact_id'], owner='session-b')
+    assert cached_preprocessing(file_info, dict(OPTIONS, nan_strategy='delete'), settings, result_cache,
+                                artifact_store) is None
+
+
+def test_eviction_keeps_recently_used_results_within_budget(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'), memory_entries=0)
+    outputs = tmp_path / 'outputs'
+    outputs.mkdir()
+
+    def put(key):
+        path = outputs / f'{key}.csv'
+        path.write_bytes(b'x' * 10000)
+        updates = {'processed_filepath': str(path), 'processed_format': 'csv'}
+        cache.put(key, {'response': {}, 'session_updates': updates})
+        os.remove(path)
+
+    put('a')
+    cache.max_bytes = 25000
+    put('b')
+    for key, age in (('a', 30), ('b', 20)):
+        result_path = tmp_path / 'results' / key / 'result.json'
+        os.utime(result_path, (os.path.getmtime(result_path) - age,) * 2)
+    # Restoring 'a' makes 'b' the least recently used entry
+    assert cache.restore('a', str(outputs / 'restored')) is not None
+    put('c')
+
+    assert sorted(os.listdir(tmp_path / 'results')) == ['a', 'c']
+    assert cache.restore('b', str(outputs / 'missing')) is None
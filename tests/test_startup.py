@@ -0,0 +1,10 @@
+from benchmarks.bench_startup import measure_startup, DEFAULT_IMPORT_BUDGET, DEFERRED_MODULES
+
+
+def test_import_app_defers_heavy_dependencies_within_budget():
+    # Each run imports the app in a fresh interpreter; the best of three absorbs scheduling noise
+    result = measure_startup('app', repeat=3, deferred=DEFERRED_MODULES)
+
+    assert result['loaded'] == [], f"import app loaded deferred dependencies: {result['loaded']}"
+    assert result['import_seconds'] < DEFAULT_IMPORT_BUDGET, (
+        f"import app took {result['import_seconds']:.3f}s, budget {DEFAULT_IMPORT_BUDGET:.3f}s")
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from automl_engine import DataCleaner
+from conftest import split_chunks
+
+
+def test_fit_stream_matches_fit_transform(features):
+    batch = DataCleaner()
+    X_batch, names_batch = batch.fit_transform(features)
+    stream = DataCleaner()
+    stream.fit_stream(split_chunks(features, 500))
+
+    assert stream.feature_names_out == names_batch
+    np.testing.assert_allclose(stream.transform(features), X_batch, rtol=1e-5, atol=1e-5)
+
+
+def test_transform_chunks_matches_transform(features):
+    cleaner = DataCleaner()
+    cleaner.fit_transform(features)
+
+    out = pd.concat(list(cleaner.transform_chunks(split_chunks(features, 300))), ignore_index=True)
+
+    assert list(out.columns) == cleaner.feature_names_out
+    np.testing.assert_array_equal(out.to_numpy(), cleaner.transform(features))
+
+
+def test_chunks_disagreeing_on_categorical_dtype(features):
+    # Digit-only chunks of a CSV column holding '1', '2', 'x' are inferred as integers
+    codes = np.where(np.arange(len(features)) < 100, 'x', (np.arange(len(features)) % 3 + 1).astype(str))
+    features = features.assign(code=codes)
+    chunks = split_chunks(features, 500)
+    chunks = chunks[:1] + [chunk.assign(code=chunk['code'].astype(np.int64)) for chunk in chunks[1:]]
+
+    batch = DataCleaner()
+    X_batch, names_batch = batch.fit_transform(features)
+    stream = DataCleaner()
+    stream.fit_stream(chunks)
+
+    assert stream.feature_names_out == names_batch
+    assert set(stream.running_stats['value_counts']['code']) == {'1', '2', '3', 'x'}
+    out = pd.concat(list(stream.transform_chunks(chunks)), ignore_index=True)
+    np.testing.assert_allclose(out.to_numpy(), X_batch, rtol=1e-5, atol=1e-5)